@@ -0,0 +1,320 @@
+"""Synthetic ArUco benchmark and accuracy suite for the TrackerGame stages.
+
+Renders frames with markers at known field positions and headings, runs preprocess, detect_markers,
+get_mass_center and track headlessly and reports per-stage latency percentiles, frames per second, detection rate
+and position/heading error against ground truth. Results are written as JSON. When a baseline results file is given,
+the suite exits with status 1 if any scenario regressed by more than the allowed fraction.
+
+Usage:
+    python benchmarks/aruco_benchmark.py [--scenarios NAME ...] [--frames 200] [--output results.json]
+                                         [--baseline baseline.json] [--max-regression 0.15]
+                                         [--set detection.mode=roi ...]
+"""
+import argparse
+import json
+import os
+import pickle
+import sys
+import tempfile
+from timeit import default_timer as timer
+
+import cv2
+import cv2.aruco as aruco
+import numpy as np
+import yaml
+
+from sledilnik.TrackerGame import TrackerGame
+from sledilnik.classes.Field import Field
+from sledilnik.classes.Point import Point
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tracker_config.yaml')
+
+# name: (width, height, markers, blur sigma, noise std, motion px/frame)
+SCENARIOS = {
+    'baseline_1080p_5': (1920, 1080, 5, 0.0, 0.0, 3.0),
+    'many_1080p_20': (1920, 1080, 20, 0.0, 0.0, 3.0),
+    'crowd_1080p_50': (1920, 1080, 50, 0.0, 0.0, 3.0),
+    'static_1080p_10': (1920, 1080, 10, 0.0, 0.0, 0.0),
+    'fast_1080p_10': (1920, 1080, 10, 0.0, 0.0, 12.0),
+    'blur_1080p_10': (1920, 1080, 10, 1.2, 0.0, 3.0),
+    'noise_1080p_10': (1920, 1080, 10, 0.0, 8.0, 3.0),
+    'small_720p_5': (1280, 720, 5, 0.0, 0.0, 2.0),
+    'large_4k_10': (3840, 2160, 10, 0.0, 0.0, 6.0),
+}
+
+STAGES = ('preprocess', 'detect_markers', 'get_mass_center', 'track')
+
+# Relative regression allowed on top of max-regression for metrics close to zero
+ERROR_TOLERANCE_MM = 0.5
+ERROR_TOLERANCE_DEG = 0.5
+
+
+class SyntheticScene:
+    """Markers moving on circles inside their own grid cells, so they never overlap"""
+
+    def __init__(self, width, height, markers, blur, noise, motion, seed=0):
+        self.width = width
+        self.height = height
+        self.blur = blur
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.dictionary = aruco.getPredefinedDictionary(aruco.DICT_4X4_100)
+
+        # Marker side between the default min and max perimeter rates
+        self.side = int(round(0.018 * max(width, height)))
+        self.ids = np.arange(markers)
+        cols = int(np.ceil(np.sqrt(markers * width / height)))
+        rows = int(np.ceil(markers / cols))
+        cell_w = width / cols
+        cell_h = height / rows
+        cells = np.array([((i % cols + 0.5) * cell_w, (i // cols + 0.5) * cell_h) for i in range(markers)])
+        self.radius = max(min(cell_w, cell_h) / 2 - self.side, 0)
+        self.origins = cells
+        self.phases = self.rng.uniform(0, 2 * np.pi, markers)
+        self.angular_speed = motion / self.radius if self.radius > 0 else 0
+        self.headings = self.rng.uniform(-np.pi, np.pi, markers)
+        self.turn_rates = self.rng.uniform(-0.03, 0.03, markers)
+
+        # Marker images with a white quiet zone
+        border = self.side // 3
+        self.patches = [
+            np.pad(aruco.generateImageMarker(self.dictionary, int(i), self.side), border, constant_values=255)
+            for i in self.ids
+        ]
+
+    def state(self, frame_index):
+        """Returns marker centers and top edge midpoints in frame coordinates and headings in radians"""
+        angle = self.phases + self.angular_speed * frame_index
+        centers = self.origins + self.radius * np.stack((np.cos(angle), np.sin(angle)), axis=1)
+        headings = self.headings + self.turn_rates * frame_index
+        tops = centers + self.side / 2 * np.stack((np.cos(headings), np.sin(headings)), axis=1)
+        return centers, tops, headings
+
+    def corners(self, frame_index):
+        """Returns marker corners with shape (N, 4, 2) in the order of aruco.detectMarkers, with pixel centers at
+        integer coordinates like detected corners"""
+        centers, _, headings = self.state(frame_index)
+        half = self.side / 2
+        square = np.array([[-half, -half], [half, -half], [half, half], [-half, half]])
+        angle = headings + np.pi / 2
+        cos, sin = np.cos(angle), np.sin(angle)
+        rotation = np.stack((np.stack((cos, -sin), axis=1), np.stack((sin, cos), axis=1)), axis=1)
+        # Patches are rotated around size / 2, marker pixels are centered on (size - 1) / 2
+        return centers[:, None, :] + np.einsum('nij,kj->nki', rotation, square - 0.5)
+
+    def render(self, frame_index):
+        centers, _, headings = self.state(frame_index)
+        frame = np.full((self.height, self.width), 255, np.uint8)
+        for patch, center, heading in zip(self.patches, centers, headings):
+            size = patch.shape[0]
+            region = int(np.ceil(size * 1.5))
+            x0 = int(center[0]) - region // 2
+            y0 = int(center[1]) - region // 2
+            # Unrotated marker has its top edge towards -y, so heading -pi/2 means no rotation
+            rotation = cv2.getRotationMatrix2D((size / 2, size / 2), -np.degrees(heading + np.pi / 2), 1.0)
+            rotation[:, 2] += (center[0] - x0 - size / 2, center[1] - y0 - size / 2)
+            warped = cv2.warpAffine(patch, rotation, (region, region), flags=cv2.INTER_LINEAR, borderValue=255)
+
+            # Clip to frame
+            fx0, fy0 = max(x0, 0), max(y0, 0)
+            fx1, fy1 = min(x0 + region, self.width), min(y0 + region, self.height)
+            target = frame[fy0:fy1, fx0:fx1]
+            np.minimum(target, warped[fy0 - y0:fy1 - y0, fx0 - x0:fx1 - x0], out=target)
+
+        if self.blur > 0:
+            frame = cv2.GaussianBlur(frame, (0, 0), self.blur)
+        if self.noise > 0:
+            frame = np.clip(frame + self.rng.normal(0, self.noise, frame.shape), 0, 255).astype(np.uint8)
+        return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+
+def create_tracker(work_dir, base_config, width, height, overrides):
+    """Creates TrackerGame with a field that covers the whole synthetic frame and no lens correction"""
+    with open(base_config, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config['debug'] = False
+    config['undistort'] = False
+    config['camera']['scale0'] = 1.0
+    config['camera']['scale1'] = 0.0
+    config['fields_path'] = os.path.join(work_dir, 'fields.pickle')
+    for key, value in overrides:
+        section = config
+        keys = key.split('.')
+        for k in keys[:-1]:
+            section = section.setdefault(k, {})
+        section[keys[-1]] = value
+
+    corners = np.array(config['map_virtual_corners'], np.float32)
+    transformation_matrix = cv2.getPerspectiveTransform(
+        np.array([[0, 0], [width, 0], [width, height], [0, height]], np.float32),
+        corners
+    )
+    with open(config['fields_path'], 'wb') as f:
+        pickle.dump(
+            {
+                'transformation_matrix': transformation_matrix,
+                'fields_corners': [],
+                'fields': {'game_field': Field(*[Point(*c) for c in corners.tolist()])}
+            },
+            f,
+            pickle.HIGHEST_PROTOCOL
+        )
+
+    config_path = os.path.join(work_dir, 'tracker_config.yaml')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f)
+    return TrackerGame(config_path), transformation_matrix
+
+
+def percentiles(values):
+    values = np.asarray(values)
+    if len(values) == 0:
+        return {'p50': None, 'p95': None, 'p99': None, 'mean': None}
+    return {
+        'p50': float(np.percentile(values, 50)),
+        'p95': float(np.percentile(values, 95)),
+        'p99': float(np.percentile(values, 99)),
+        'mean': float(values.mean())
+    }
+
+
+def run_scenario(name, frames, base_config, overrides, warmup=10):
+    width, height, markers, blur, noise, motion = SCENARIOS[name]
+    scene = SyntheticScene(width, height, markers, blur, noise, motion)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        tracker, transformation_matrix = create_tracker(work_dir, base_config, width, height, overrides)
+        times = {stage: [] for stage in STAGES}
+        totals = []
+        detected = 0
+        expected = 0
+        position_errors = []
+        heading_errors = []
+
+        for frame_index in range(frames + warmup):
+            frame = scene.render(frame_index)
+            centers, tops, _ = scene.state(frame_index)
+
+            tracker.frame_counter += 1
+            ts = timer()
+            gray = tracker.preprocess(frame)
+            t1 = timer()
+            corners, ids = tracker.detect_markers(gray)
+            t2 = timer()
+            ids_tracked, points_tracked = tracker.get_mass_center(corners, ids, gray)
+            t3 = timer()
+            tracker.track(ids_tracked, points_tracked)
+            t4 = timer()
+
+            if frame_index < warmup:
+                continue
+            for stage, duration in zip(STAGES, (t1 - ts, t2 - t1, t3 - t2, t4 - t3)):
+                times[stage].append(duration * 1000)
+            totals.append((t4 - ts) * 1000)
+
+            # Ground truth in field coordinates
+            truth = tracker.move_origin_points(np.vstack((centers, tops)), transformation_matrix)
+            truth_centers = truth[:markers]
+            truth_tops = truth[markers:]
+            expected += markers
+            detected += len(np.intersect1d(ids_tracked, scene.ids))
+            for i, object_id in enumerate(scene.ids.tolist()):
+                obj = tracker.data.objects.get(object_id)
+                if obj is None:
+                    continue
+                box = obj.bounding_box
+                position_errors.append(np.hypot(box[0] - truth_centers[i, 0], box[1] - truth_centers[i, 1]))
+                true_heading = np.arctan2(truth_tops[i, 1] - truth_centers[i, 1], truth_tops[i, 0] - truth_centers[i, 0])
+                heading_errors.append(abs(np.degrees(np.angle(np.exp(1j * (obj.direction - true_heading))))))
+
+    total_seconds = sum(totals) / 1000
+    return {
+        'resolution': [width, height],
+        'markers': markers,
+        'blur': blur,
+        'noise': noise,
+        'motion': motion,
+        'frames': frames,
+        'fps': frames / total_seconds if total_seconds > 0 else None,
+        'latency_ms': {'total': percentiles(totals), **{stage: percentiles(times[stage]) for stage in STAGES}},
+        'detection_rate': detected / expected if expected else None,
+        'position_error_mm': percentiles(position_errors),
+        'heading_error_deg': percentiles(heading_errors),
+    }
+
+
+def compare(results, baseline, max_regression):
+    """Returns list of regressions of results against baseline"""
+    failures = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if base['fps'] and result['fps'] < base['fps'] * (1 - max_regression):
+            failures.append(f'{name}: fps {result["fps"]:.1f} < {base["fps"]:.1f}')
+        p95 = result['latency_ms']['total']['p95']
+        base_p95 = base['latency_ms']['total']['p95']
+        if base_p95 and p95 > base_p95 * (1 + max_regression):
+            failures.append(f'{name}: total p95 {p95:.2f} ms > {base_p95:.2f} ms')
+        if base['detection_rate'] and result['detection_rate'] < base['detection_rate'] * (1 - max_regression):
+            failures.append(
+                f'{name}: detection rate {result["detection_rate"]:.3f} < {base["detection_rate"]:.3f}'
+            )
+        for metric, tolerance in (('position_error_mm', ERROR_TOLERANCE_MM), ('heading_error_deg', ERROR_TOLERANCE_DEG)):
+            value = result[metric]['p95']
+            base_value = base[metric]['p95']
+            if value is not None and base_value is not None and \
+                    value > base_value * (1 + max_regression) + tolerance:
+                failures.append(f'{name}: {metric} p95 {value:.2f} > {base_value:.2f}')
+    return failures
+
+
+def print_result(name, result):
+    latency = result['latency_ms']
+    stages = ' '.join(f'{stage} {latency[stage]["p50"]:.2f}/{latency[stage]["p95"]:.2f}' for stage in STAGES)
+    print(
+        f'{name:<18} {result["fps"]:7.1f} fps  total p50/p95/p99 {latency["total"]["p50"]:.2f}/'
+        f'{latency["total"]["p95"]:.2f}/{latency["total"]["p99"]:.2f} ms  detected {result["detection_rate"]:.3f}  '
+        f'pos p95 {result["position_error_mm"]["p95"]:.1f} mm  dir p95 {result["heading_error_deg"]["p95"]:.1f} deg'
+    )
+    print(f'{"":<18} p50/p95 ms: {stages}')
+
+
+def parse_override(text):
+    key, value = text.split('=', 1)
+    return key, yaml.safe_load(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--tracker-config', default=DEFAULT_CONFIG)
+    parser.add_argument('--set', type=parse_override, action='append', default=[], metavar='KEY=VALUE',
+                        help='override tracker config value, e.g. detection.mode=roi')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.15,
+                        help='allowed relative regression against baseline')
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.scenarios:
+        results[name] = run_scenario(name, args.frames, args.tracker_config, args.set)
+        print_result(name, results[name])
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            failures = compare(results, json.load(f), args.max_regression)
+        for failure in failures:
+            print(f'REGRESSION {failure}')
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""Parameter sweep of aruco_detector settings on a recorded video.
+
+Decodes and preprocesses frames of the video once, then detects markers on them with every configuration of a grid
+or random search space, in a process pool. There is no ground truth, so a marker is expected in a frame if at least
+a given fraction of configurations detected it there. Each configuration is scored by:
+
+    detection rate - share of expected markers that were detected
+    unstable       - expected markers lost from one frame to the next plus unexpected ids, per 1000 expected markers
+    duplicates     - extra detections of an id already detected in the same frame, per frame
+    ms/frame       - mean time of aruco.detectMarkers
+
+and the Pareto-optimal configurations (no other one is at least as good in all four and better in one) are listed.
+The best configuration has the highest detection rate among Pareto-optimal ones within --max-ms, ties broken by
+stability, duplicates and time, and can be written as an aruco_detector snippet for tracker_config.yaml.
+
+The search space is a YAML file mapping aruco_detector keys to a list of values, or to {min: a, max: b} for random
+search, where integer bounds give integer values. Keys that are not in the space keep their config value. The
+current config is always evaluated as well. Time is measured per process, so use at most as many jobs as cores.
+
+Usage:
+    python benchmarks/aruco_sweep.py video.mp4 [--tracker-config tracker_config.yaml] [--space space.yaml]
+                                     [--search random] [--samples 50] [--frames 300] [--jobs 4]
+                                     [--consensus 0.25] [--max-ms 10] [--output results.json]
+                                     [--write best.yaml]
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+from timeit import default_timer as timer
+
+import cv2
+import numpy as np
+import yaml
+
+from sledilnik.Tracker import Tracker
+from sledilnik.classes.FramePreprocessor import FramePreprocessor
+from sledilnik.classes.MarkerDetector import MarkerDetector
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tracker_config.yaml')
+
+# Values around the defaults of every field used by MarkerDetector.create_parameters
+DEFAULT_SPACE = {
+    'adaptive_thresh_win_size_min': [3, 5, 10],
+    'adaptive_thresh_win_size_max': [15, 23, 33],
+    'adaptive_thresh_constant': [5, 7, 10],
+    'min_marker_perimeter_rate': [0.02, 0.03, 0.04, 0.06],
+    'max_marker_perimeter_rate': [0.1, 0.2, 4.0],
+    'perspective_remove_pixel_per_cell': [4, 8, 30],
+    'perspective_remove_ignored_margin_per_cell': [0.13, 0.3],
+    'min_marker_distance_rate': [0.001, 0.05],
+}
+
+# Frames shared with worker processes
+_frames = None
+
+
+def read_frames(tracker_config, video, max_frames):
+    """Reads and preprocesses frames like the tracker does (grayscale and undistortion if enabled)"""
+    tracker = Tracker(tracker_config, None)
+    preprocessor = FramePreprocessor(tracker.undistorter)
+    cap = cv2.VideoCapture(video)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(preprocessor(frame))
+    cap.release()
+    if not frames:
+        raise ValueError(f'No frames could be read from {video}.')
+    return np.stack(frames), tracker.tracker_config['aruco_detector']
+
+
+def configurations(base, space, search, samples, seed=0):
+    """Returns the base config followed by configs of the grid or random samples of the space"""
+    keys = list(space)
+    if search == 'grid':
+        for key in keys:
+            if not isinstance(space[key], list):
+                raise ValueError(f'Grid search needs a list of values for {key}.')
+        candidates = (dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys)))
+    else:
+        rng = random.Random(seed)
+
+        def sample(values):
+            if isinstance(values, list):
+                return rng.choice(values)
+            low, high = values['min'], values['max']
+            if isinstance(low, int) and isinstance(high, int):
+                return rng.randint(low, high)
+            return rng.uniform(low, high)
+
+        candidates = ({key: sample(space[key]) for key in keys} for _ in itertools.count())
+
+    configs = [dict(base)]
+    seen = {tuple(sorted(base.items()))}
+    # Random search gives up after many duplicates, a small space may have fewer distinct configs than samples
+    attempts = 0
+    for overrides in candidates:
+        if search == 'random' and (len(configs) > samples or attempts > 100 * samples):
+            break
+        attempts += 1
+        config = {**base, **overrides}
+        if config['adaptive_thresh_win_size_min'] > config['adaptive_thresh_win_size_max'] or \
+                config['min_marker_perimeter_rate'] >= config['max_marker_perimeter_rate']:
+            continue
+        key = tuple(sorted(config.items()))
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+    return configs
+
+
+def _init_worker(frames_path):
+    global _frames
+    _frames = np.load(frames_path, mmap_mode='r')
+
+
+def _evaluate(task):
+    """Detects markers on all frames with one config, returns ids of each frame and detection times in ms"""
+    index, config = task
+    detector = MarkerDetector(config)
+    # Warm up caches and lazy initialization of OpenCV
+    detector.detect(np.ascontiguousarray(_frames[0]))
+    ids_per_frame = []
+    times = []
+    for frame in _frames:
+        frame = np.ascontiguousarray(frame)
+        ts = timer()
+        _, ids = detector.detect(frame)
+        times.append((timer() - ts) * 1000)
+        ids_per_frame.append([] if ids is None else ids.reshape(-1).tolist())
+    return index, ids_per_frame, times
+
+
+def score(results, consensus):
+    """Computes metrics of every config against markers expected by consensus"""
+    n_frames = len(next(iter(results.values()))[0])
+    n_configs = len(results)
+    expected = []
+    for f in range(n_frames):
+        counts = {}
+        for ids_per_frame, _ in results.values():
+            for object_id in set(ids_per_frame[f]):
+                counts[object_id] = counts.get(object_id, 0) + 1
+        expected.append({object_id for object_id, count in counts.items() if count >= consensus * n_configs})
+    n_expected = max(sum(len(ids) for ids in expected), 1)
+
+    metrics = {}
+    for index, (ids_per_frame, times) in results.items():
+        detected = 0
+        unstable = 0
+        duplicates = 0
+        previous = set()
+        for f, ids in enumerate(ids_per_frame):
+            unique = set(ids)
+            duplicates += len(ids) - len(unique)
+            detected += len(unique & expected[f])
+            # Lost although still expected, or not expected at all
+            unstable += len((previous & expected[f]) - unique) + len(unique - expected[f])
+            previous = unique
+        metrics[index] = {
+            'detection_rate': detected / n_expected,
+            'unstable': unstable / n_expected * 1000,
+            'duplicates': duplicates / n_frames,
+            'ms_per_frame': float(np.mean(times)),
+            'ms_p95': float(np.percentile(times, 95)),
+        }
+    return metrics
+
+
+def dominates(a, b):
+    """Whether metrics a are at least as good as b in all objectives and better in one"""
+    better_or_equal = a['detection_rate'] >= b['detection_rate'] and a['unstable'] <= b['unstable'] and \
+        a['duplicates'] <= b['duplicates'] and a['ms_per_frame'] <= b['ms_per_frame']
+    better = a['detection_rate'] > b['detection_rate'] or a['unstable'] < b['unstable'] or \
+        a['duplicates'] < b['duplicates'] or a['ms_per_frame'] < b['ms_per_frame']
+    return better_or_equal and better
+
+
+def pareto(metrics):
+    return [i for i, m in metrics.items() if not any(dominates(other, m) for other in metrics.values())]
+
+
+def best(metrics, front, max_ms=None):
+    candidates = [i for i in front if max_ms is None or metrics[i]['ms_per_frame'] <= max_ms] or front
+    return min(candidates, key=lambda i: (
+        -metrics[i]['detection_rate'], metrics[i]['unstable'], metrics[i]['duplicates'], metrics[i]['ms_per_frame']
+    ))
+
+
+def format_changes(config, base):
+    changes = [f'{key}={value}' for key, value in config.items() if base.get(key) != value]
+    return ' '.join(changes) or '(current config)'
+
+
+def write_snippet(path, config, metrics, video):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'# Best aruco_detector settings found by benchmarks/aruco_sweep.py on {os.path.basename(video)}\n')
+        f.write(
+            f'# detection rate {metrics["detection_rate"]:.4f}, unstable {metrics["unstable"]:.1f} per 1000, '
+            f'duplicates {metrics["duplicates"]:.3f} per frame, {metrics["ms_per_frame"]:.2f} ms/frame\n'
+        )
+        yaml.safe_dump({'aruco_detector': config}, f, sort_keys=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('--tracker-config', default=DEFAULT_CONFIG)
+    parser.add_argument('--space', help='YAML file with the search space, a built-in space around defaults if not set')
+    parser.add_argument('--search', choices=('grid', 'random'), default='random')
+    parser.add_argument('--samples', type=int, default=50, help='number of random configurations')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--frames', type=int, default=300, help='largest number of frames read from the video')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count())
+    parser.add_argument('--consensus', type=float, default=0.25,
+                        help='share of configurations that must detect a marker in a frame for it to be expected')
+    parser.add_argument('--max-ms', type=float, help='largest ms/frame of the best configuration')
+    parser.add_argument('--output', help='write all results as JSON to this file')
+    parser.add_argument('--write', help='write aruco_detector snippet of the best configuration to this file')
+    args = parser.parse_args()
+
+    frames, base = read_frames(args.tracker_config, args.video, args.frames)
+    space = DEFAULT_SPACE
+    if args.space:
+        with open(args.space, 'r', encoding='utf-8') as f:
+            space = yaml.safe_load(f)
+    configs = configurations(base, space, args.search, args.samples, args.seed)
+    print(f'Evaluating {len(configs)} configurations on {len(frames)} frames of {frames.shape[2]}x{frames.shape[1]} '
+          f'with {args.jobs} processes')
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Workers map the frames instead of receiving a copy
+        frames_path = os.path.join(work_dir, 'frames.npy')
+        np.save(frames_path, frames)
+        del frames
+        results = {}
+        with multiprocessing.Pool(args.jobs, _init_worker, (frames_path,)) as pool:
+            for index, ids_per_frame, times in pool.imap_unordered(_evaluate, enumerate(configs)):
+                results[index] = (ids_per_frame, times)
+                print(f'\r{len(results)}/{len(configs)}', end='', flush=True)
+        print()
+
+    metrics = score(results, args.consensus)
+    front = sorted(pareto(metrics), key=lambda i: -metrics[i]['detection_rate'])
+    chosen = best(metrics, front, args.max_ms)
+
+    print(f'{"":>4} {"detected":>9} {"unstable":>9} {"dupl":>6} {"ms":>7} {"p95 ms":>7}  settings')
+    for i in [0] + [i for i in front if i != 0]:
+        m = metrics[i]
+        mark = '*' if i == chosen else ('P' if i in front else ' ')
+        print(f'{mark}{i:>3} {m["detection_rate"]:9.4f} {m["unstable"]:9.1f} {m["duplicates"]:6.3f} '
+              f'{m["ms_per_frame"]:7.2f} {m["ms_p95"]:7.2f}  {format_changes(configs[i], base)}')
+    print('* best, P Pareto-optimal, 0 is the current config')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump([
+                {'config': configs[i], **metrics[i], 'pareto': i in front, 'best': i == chosen}
+                for i in sorted(metrics)
+            ], f, indent=2)
+    if args.write:
+        write_snippet(args.write, configs[chosen], metrics[chosen], args.video)
+        print(f'Wrote {args.write}')
+
+
+if __name__ == '__main__':
+    main()
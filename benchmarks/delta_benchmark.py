@@ -0,0 +1,102 @@
+"""Compares full snapshots with delta encoding on recorded matches.
+
+Replays trajectory files written by TrackerBatch (--batch) frame by frame and reports bytes and encode/decode time
+per frame of JSON, full binary snapshots and keyframes with deltas, and checks that decoded states match.
+
+Usage:
+    python benchmarks/delta_benchmark.py match1.npz [match2.npz ...] [--keyframe-interval 60]
+        [--position-threshold 1] [--direction-threshold 1]
+"""
+import argparse
+import json
+from math import pi
+from timeit import default_timer as timer
+
+import numpy as np
+
+from sledilnik.classes.SnapshotDelta import DeltaDecoder, DeltaEncoder
+from sledilnik.classes.TrackerSnapshot import SNAPSHOT_DTYPE, TrackerSnapshot
+
+
+def load_snapshots(path):
+    """Rebuilds one snapshot per frame from a trajectory file"""
+    columns = np.load(path)
+    frame = columns['frame']
+    table = np.empty(len(frame), SNAPSHOT_DTYPE)
+    for name in SNAPSHOT_DTYPE.names:
+        table[name] = columns[name]
+    order = np.argsort(frame, kind='stable')
+    frame = frame[order]
+    table = table[order]
+
+    snapshots = []
+    _, starts = np.unique(frame, return_index=True)
+    for seq, rows in enumerate(np.split(table, starts[1:]), 1):
+        timestamp = float(rows['timestamp'][0]) if len(rows) else None
+        snapshots.append(TrackerSnapshot(rows, timestamp, 0.0, seq))
+    # Frames without objects are not stored, so gaps in frame numbers are left out
+    return snapshots
+
+
+def measure(fn, items):
+    ts = timer()
+    results = [fn(item) for item in items]
+    return results, (timer() - ts) / len(items) * 1e6
+
+
+def compare(snapshots, decoded):
+    """Returns largest position and direction difference, and whether ids always matched"""
+    position_error = 0.0
+    direction_error = 0.0
+    ids_match = True
+    for snapshot, state in zip(snapshots, decoded):
+        expected = snapshot.objects[np.argsort(snapshot.objects['id'], kind='stable')]
+        objects = state.objects
+        if len(expected) != len(objects) or np.any(expected['id'] != objects['id']):
+            ids_match = False
+            continue
+        if len(objects):
+            error = np.hypot(expected['x'] - objects['x'], expected['y'] - objects['y'])
+            position_error = max(position_error, float(error.max()))
+            turn = np.abs((expected['dir'] - objects['dir'] + pi) % (2 * pi) - pi)
+            direction_error = max(direction_error, float(turn.max()) * 180 / pi)
+    return position_error, direction_error, ids_match
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+', help='trajectory files written by TrackerBatch')
+    parser.add_argument('--keyframe-interval', type=int, default=60)
+    parser.add_argument('--position-threshold', type=float, default=1.0)
+    parser.add_argument('--direction-threshold', type=float, default=1.0)
+    args = parser.parse_args()
+
+    for path in args.files:
+        snapshots = load_snapshots(path)
+        n = len(snapshots)
+        objects = sum(len(snapshot) for snapshot in snapshots) / max(n, 1)
+
+        json_messages, json_time = measure(lambda s: json.dumps(s.to_json()).encode('utf-8'), snapshots)
+        full_messages, full_time = measure(TrackerSnapshot.encode, snapshots)
+        encoder = DeltaEncoder(args.keyframe_interval, args.position_threshold, args.direction_threshold)
+        delta_messages, delta_time = measure(encoder.encode, snapshots)
+        decoder = DeltaDecoder()
+        decoded, decode_time = measure(decoder.decode, delta_messages)
+        _, full_decode_time = measure(TrackerSnapshot.decode, full_messages)
+
+        position_error, direction_error, ids_match = compare(snapshots, decoded)
+        print(f'{path}: {n} frames, {objects:.1f} objects per frame, {encoder.keyframes} keyframes')
+        for name, messages, encode, decode in (
+            ('JSON', json_messages, json_time, None),
+            ('full snapshot', full_messages, full_time, full_decode_time),
+            ('delta', delta_messages, delta_time, decode_time),
+        ):
+            size = sum(len(message) for message in messages) / n
+            decode = f'{decode:8.1f} us' if decode is not None else '       -   '
+            print(f'  {name:<14} {size:8.1f} B/frame  encode {encode:8.1f} us  decode {decode}')
+        print(f'  decoded state: ids {"match" if ids_match else "DIFFER"}, '
+              f'max position error {position_error:.3f}, max direction error {direction_error:.3f} deg')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Compares detection on downscaled frames with corner refinement against detection on full frames.
+
+Renders the synthetic scenes of aruco_benchmark.py and detects markers on every frame with each combination of
+aruco_detector.downscale and corner_refine_window, the full-frame path (downscale 1.0) always being the first one.
+Reports time of MarkerDetector.detect, detection rate and the error of corners and marker centers (mean of corners,
+like get_mass_center) in full-frame pixels against ground truth.
+
+Usage:
+    python benchmarks/pyramid_benchmark.py [--scenarios NAME ...] [--frames 60] [--downscale 0.5 ...]
+                                           [--refine-window 0 3 ...] [--output results.json]
+"""
+import argparse
+import json
+import os
+from timeit import default_timer as timer
+
+import cv2
+import numpy as np
+import yaml
+
+from aruco_benchmark import SCENARIOS, SyntheticScene
+from sledilnik.classes.MarkerDetector import MarkerDetector
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tracker_config.yaml')
+DEFAULT_SCENARIOS = ['baseline_1080p_5', 'many_1080p_20', 'blur_1080p_10', 'noise_1080p_10', 'large_4k_10']
+
+
+def run_scenario(name, frames, aruco_config, variants, warmup=5):
+    scene = SyntheticScene(*SCENARIOS[name])
+    detectors = [
+        MarkerDetector({**aruco_config, 'downscale': downscale, 'corner_refine_window': window})
+        for downscale, window in variants
+    ]
+    times = [[] for _ in variants]
+    detected = [0 for _ in variants]
+    corner_errors = [[] for _ in variants]
+    center_errors = [[] for _ in variants]
+
+    for frame_index in range(frames + warmup):
+        gray = cv2.cvtColor(scene.render(frame_index), cv2.COLOR_BGR2GRAY)
+        truth = scene.corners(frame_index)
+        for i, detector in enumerate(detectors):
+            ts = timer()
+            corners, ids = detector.detect(gray)
+            duration = timer() - ts
+            if frame_index < warmup:
+                continue
+            times[i].append(duration * 1000)
+            if ids is None:
+                continue
+            ids = ids.reshape(-1)
+            corners = np.asarray(corners, np.float64).reshape(-1, 4, 2)
+            known = np.isin(ids, scene.ids)
+            ids, corners = ids[known], corners[known]
+            detected[i] += len(np.unique(ids))
+            errors = np.linalg.norm(corners - truth[ids], axis=2)
+            corner_errors[i].extend(errors.reshape(-1).tolist())
+            center_errors[i].extend(np.linalg.norm(corners.mean(axis=1) - truth[ids].mean(axis=1), axis=1).tolist())
+
+    expected = frames * len(scene.ids)
+    return [
+        {
+            'downscale': downscale,
+            'corner_refine_window': window,
+            'detect_ms_p50': float(np.percentile(times[i], 50)),
+            'detect_ms_p95': float(np.percentile(times[i], 95)),
+            'detection_rate': detected[i] / expected,
+            'corner_error_px_p50': float(np.percentile(corner_errors[i], 50)) if corner_errors[i] else None,
+            'corner_error_px_p95': float(np.percentile(corner_errors[i], 95)) if corner_errors[i] else None,
+            'center_error_px_p95': float(np.percentile(center_errors[i], 95)) if center_errors[i] else None,
+        }
+        for i, (downscale, window) in enumerate(variants)
+    ]
+
+
+def format_error(value):
+    return f'{value:6.3f}' if value is not None else f'{"-":>6}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=DEFAULT_SCENARIOS)
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--tracker-config', default=DEFAULT_CONFIG)
+    parser.add_argument('--downscale', type=float, nargs='+', default=[0.5])
+    parser.add_argument('--refine-window', type=int, nargs='+', default=[0, 3])
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    with open(args.tracker_config, 'r', encoding='utf-8') as f:
+        aruco_config = yaml.safe_load(f)['aruco_detector']
+    variants = [(1.0, 0)] + [(d, w) for d in args.downscale if d < 1.0 for w in args.refine_window]
+
+    results = {}
+    print(f'{"scenario":<18} {"scale":>5} {"win":>3} {"ms p50":>7} {"ms p95":>7} {"detected":>8} '
+          f'{"corner p50/p95 px":>17} {"center p95 px":>13}')
+    for name in args.scenarios:
+        results[name] = run_scenario(name, args.frames, aruco_config, variants)
+        for r in results[name]:
+            print(f'{name:<18} {r["downscale"]:5.2f} {r["corner_refine_window"]:3d} {r["detect_ms_p50"]:7.2f} '
+                  f'{r["detect_ms_p95"]:7.2f} {r["detection_rate"]:8.3f} '
+                  f'{format_error(r["corner_error_px_p50"]):>8}/{format_error(r["corner_error_px_p95"])} '
+                  f'{format_error(r["center_error_px_p95"]):>13}')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
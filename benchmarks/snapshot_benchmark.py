@@ -0,0 +1,82 @@
+"""Compares the cost of publishing TrackerLiveData copies against compact TrackerSnapshot objects.
+
+Usage:
+    python benchmarks/snapshot_benchmark.py [--objects 5 20 100] [--repeat 1000]
+"""
+import argparse
+import copy
+import json
+import pickle
+from timeit import default_timer as timer
+
+import numpy as np
+
+from sledilnik.classes.Field import Field
+from sledilnik.classes.KalmanFilterBank import KalmanFilterBank
+from sledilnik.classes.ObjectTracker import ObjectTracker
+from sledilnik.classes.Point import Point
+from sledilnik.classes.TrackerLiveData import TrackerLiveData
+from sledilnik.classes.TrackerSnapshot import TrackerSnapshot
+
+KALMAN_CONFIG = {
+    'dt': 1,
+    'u': 0.0,
+    'acc_noise_mag': 0.003,
+    'measurement_noise_x': 0.6,
+    'measurement_noise_y': 0.6
+}
+
+
+def create_live_data(n):
+    fields = {
+        'game_field': Field(Point(0, 0), Point(3600, 0), Point(3600, 2100), Point(0, 2100)),
+        'team_1_basket': Field(Point(0, 0), Point(500, 0), Point(500, 500), Point(0, 500)),
+        'team_2_basket': Field(Point(3100, 1600), Point(3600, 1600), Point(3600, 2100), Point(3100, 2100)),
+    }
+    bank = KalmanFilterBank(KALMAN_CONFIG)
+    data = TrackerLiveData(fields, bank)
+    rng = np.random.default_rng(0)
+    for object_id in range(n):
+        position = tuple(rng.uniform(0, 2000, 4).round().tolist())
+        data.objects[object_id] = ObjectTracker(object_id, position, (0, 0, 0, 0), KALMAN_CONFIG, bank=bank)
+    slots = bank.active_slots()
+    bank.update(slots, bank.bounding_box[slots] + 1, np.ones(len(slots), bool))
+    data.timestamp = 0.0
+    return data
+
+
+def measure(fn, repeat):
+    ts = timer()
+    for _ in range(repeat):
+        fn()
+    return (timer() - ts) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--objects', type=int, nargs='+', default=[5, 20, 100])
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args()
+
+    for n in args.objects:
+        data = create_live_data(n)
+        snapshot = TrackerSnapshot.from_live_data(data)
+        encoded = snapshot.encode()
+        fields = data.fields_to_json()
+
+        results = [
+            ('deepcopy + pickle', lambda: pickle.dumps(copy.deepcopy(data), pickle.HIGHEST_PROTOCOL)),
+            ('TrackerLiveData.to_json', lambda: json.dumps(data.to_json())),
+            ('snapshot + pickle', lambda: pickle.dumps(TrackerSnapshot.from_live_data(data), pickle.HIGHEST_PROTOCOL)),
+            ('snapshot + encode', lambda: TrackerSnapshot.from_live_data(data).encode()),
+            ('decode', lambda: TrackerSnapshot.decode(encoded)),
+            ('TrackerSnapshot.to_json', lambda: json.dumps(snapshot.to_json())),
+            ('TrackerSnapshot.to_json + fields', lambda: json.dumps(snapshot.to_json(fields))),
+        ]
+        print(f'{n} objects, pickled copy {len(pickle.dumps(copy.deepcopy(data)))} B, encoded snapshot {len(encoded)} B')
+        for name, fn in results:
+            print(f'  {name:<34} {measure(fn, args.repeat):10.1f} us')
+
+
+if __name__ == '__main__':
+    main()
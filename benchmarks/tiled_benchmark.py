@@ -0,0 +1,134 @@
+"""Compares per-frame latency of tiled detection against one detectMarkers call on the whole frame.
+
+Renders the synthetic scenes of aruco_benchmark.py and detects markers on every frame with MarkerDetector.detect and
+with MarkerDetector.detect_tiles for each combination of grid and thread count. Tiles overlap by 1.5 times the side of
+the largest marker allowed by max_marker_perimeter_rate, like tiled mode of the tracker without a configured overlap.
+Reports latency of one frame, detection rate against ground truth, frames on which the detected ids differ from the
+single call, duplicate detections left after merging and the corner error in pixels.
+Tiles only run in parallel on as many cores as there are threads, the number of available cores is printed first.
+
+Usage:
+    python benchmarks/tiled_benchmark.py [--scenarios NAME ...] [--frames 60] [--grid 2x2 3x2 ...]
+                                         [--threads 1 4 ...] [--overlap PIXELS] [--output results.json]
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer as timer
+
+import cv2
+import numpy as np
+import yaml
+
+from aruco_benchmark import SCENARIOS, SyntheticScene
+from sledilnik.classes.MarkerDetector import MarkerDetector
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tracker_config.yaml')
+DEFAULT_SCENARIOS = ['large_4k_10']
+
+
+def parse_grid(value):
+    cols, rows = value.lower().split('x')
+    return int(cols), int(rows)
+
+
+def run_scenario(name, frames, aruco_config, variants, overlap, warmup=5):
+    scene = SyntheticScene(*SCENARIOS[name])
+    width, height = SCENARIOS[name][:2]
+    if overlap is None:
+        overlap = int(np.ceil(1.5 * aruco_config['max_marker_perimeter_rate'] * max(width, height) / 4))
+    detector = MarkerDetector(aruco_config)
+    executors = {threads: ThreadPoolExecutor(threads) for _, threads in variants if threads > 1}
+    tiles = {grid: MarkerDetector.tiles((0, 0, width, height), grid, overlap) for grid, _ in variants}
+
+    def single(gray):
+        return detector.detect(gray)
+
+    def tiled(grid, threads):
+        return lambda gray: detector.detect_tiles(gray, tiles[grid], executors.get(threads))
+
+    runs = [('single', 1, single)] + [(f'{grid[0]}x{grid[1]}', threads, tiled(grid, threads))
+                                      for grid, threads in variants]
+    times = [[] for _ in runs]
+    detected = [0 for _ in runs]
+    differing = [0 for _ in runs]
+    duplicates = [0 for _ in runs]
+    corner_errors = [[] for _ in runs]
+
+    for frame_index in range(frames + warmup):
+        gray = cv2.cvtColor(scene.render(frame_index), cv2.COLOR_BGR2GRAY)
+        truth = scene.corners(frame_index)
+        single_ids = None
+        for i, (_, _, detect) in enumerate(runs):
+            ts = timer()
+            corners, ids = detect(gray)
+            duration = timer() - ts
+            if frame_index < warmup:
+                continue
+            times[i].append(duration * 1000)
+            ids = ids.reshape(-1) if ids is not None else np.zeros(0, np.int32)
+            corners = np.asarray(corners, np.float64).reshape(-1, 4, 2)
+            known = np.isin(ids, scene.ids)
+            ids, corners = ids[known], corners[known]
+            unique_ids = set(ids.tolist())
+            if i == 0:
+                single_ids = unique_ids
+            differing[i] += unique_ids != single_ids
+            detected[i] += len(unique_ids)
+            duplicates[i] += len(ids) - len(unique_ids)
+            corner_errors[i].extend(np.linalg.norm(corners - truth[ids], axis=2).reshape(-1).tolist())
+
+    for executor in executors.values():
+        executor.shutdown()
+    expected = frames * len(scene.ids)
+    return [
+        {
+            'grid': grid,
+            'threads': threads,
+            'overlap': overlap if grid != 'single' else None,
+            'detect_ms_p50': float(np.percentile(times[i], 50)),
+            'detect_ms_p95': float(np.percentile(times[i], 95)),
+            'detection_rate': detected[i] / expected,
+            'frames_differing': differing[i],
+            'duplicates': duplicates[i],
+            'corner_error_px_p95': float(np.percentile(corner_errors[i], 95)) if corner_errors[i] else None,
+        }
+        for i, (grid, threads, _) in enumerate(runs)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=DEFAULT_SCENARIOS)
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--tracker-config', default=DEFAULT_CONFIG)
+    parser.add_argument('--grid', type=parse_grid, nargs='+', default=[(2, 2), (3, 2), (4, 3)])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--overlap', type=int, help='pixels shared by neighbouring tiles')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    with open(args.tracker_config, 'r', encoding='utf-8') as f:
+        aruco_config = yaml.safe_load(f)['aruco_detector']
+    variants = [(grid, threads) for grid in args.grid for threads in args.threads]
+
+    print(f'cores available: {len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()}')
+    results = {}
+    print(f'{"scenario":<18} {"grid":>6} {"thr":>3} {"ms p50":>7} {"ms p95":>7} {"detected":>8} {"differ":>6} '
+          f'{"dup":>4} {"corner p95 px":>13}')
+    for name in args.scenarios:
+        results[name] = run_scenario(name, args.frames, aruco_config, variants, args.overlap)
+        for r in results[name]:
+            error = r['corner_error_px_p95']
+            print(f'{name:<18} {r["grid"]:>6} {r["threads"]:3d} {r["detect_ms_p50"]:7.2f} {r["detect_ms_p95"]:7.2f} '
+                  f'{r["detection_rate"]:8.3f} {r["frames_differing"]:6d} {r["duplicates"]:4d} '
+                  f'{(f"{error:6.3f}" if error is not None else "-"):>13}')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Compares per-frame cost of cached fixed-point undistortion against rebuilding float maps every frame.
+
+Usage:
+    python benchmarks/undistort_benchmark.py [--tracker-config tracker_config.yaml] [--frames 100]
+"""
+import argparse
+import os
+import tempfile
+from timeit import default_timer as timer
+
+import cv2
+import numpy as np
+import yaml
+
+from sledilnik.classes.Undistorter import Undistorter
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tracker_config.yaml')
+
+
+def undistort_uncached(img, c):
+    """Previous Tracker.undistort implementation, which rebuilt the maps on every call"""
+    dist = np.array([c['k1'], c['k2'], c['p1'], c['p2'], c['k3']])
+    mtx = np.array([[c['fx'], 0, c['cx']], [0, c['fy'], c['cy']], [0, 0, 1]])
+
+    h, w = img.shape[:2]
+    new_camera_tx, roi = cv2.getOptimalNewCameraMatrix(mtx, dist, (w, h), 1, (w, h))
+    map_x, map_y = cv2.initUndistortRectifyMap(mtx, dist, None, new_camera_tx, (w, h), 5)
+    dst = cv2.remap(img, map_x, map_y, cv2.INTER_LINEAR)
+
+    x, y, w, h = roi
+    return dst[y:y + h, x:x + w]
+
+
+def measure(fn, frames):
+    times = []
+    for frame in frames:
+        ts = timer()
+        fn(frame)
+        times.append(timer() - ts)
+    return np.array(times) * 1000
+
+
+def report(name, times):
+    print(f'{name:<28} mean {times.mean():8.3f} ms   p50 {np.percentile(times, 50):8.3f} ms   '
+          f'p95 {np.percentile(times, 95):8.3f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracker-config', default=DEFAULT_CONFIG)
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    args = parser.parse_args()
+
+    with open(args.tracker_config, 'r', encoding='utf-8') as f:
+        camera_config = yaml.safe_load(f)['camera']
+
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, (args.height, args.width), np.uint8) for _ in range(4)]
+    frames = [frames[i % len(frames)] for i in range(args.frames)]
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        ts = timer()
+        Undistorter(camera_config, cache_dir).get_maps(args.width, args.height)
+        build_ms = (timer() - ts) * 1000
+
+        # Maps are loaded lazily by the first get_maps
+        ts = timer()
+        undistorter = Undistorter(camera_config, cache_dir)
+        undistorter.get_maps(args.width, args.height)
+        load_ms = (timer() - ts) * 1000
+
+        print(f'{args.width}x{args.height}, {args.frames} frames')
+        print(f'map build + save: {build_ms:.1f} ms, reload from disk: {load_ms:.1f} ms')
+        report('rebuild maps every frame', measure(lambda img: undistort_uncached(img, camera_config), frames))
+        report('cached CV_16SC2 maps', measure(undistorter.undistort, frames))
+
+        dst = np.empty_like(frames[0])
+        report('cached maps, reused buffer', measure(lambda img: undistorter.undistort(img, dst), frames))
+
+
+if __name__ == '__main__':
+    main()
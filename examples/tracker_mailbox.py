@@ -0,0 +1,26 @@
+from multiprocessing import Process, freeze_support
+
+from sledilnik.TrackerGame import TrackerGame
+from sledilnik.classes.SharedStateMailbox import SharedStateMailbox
+
+if __name__ == '__main__':
+    freeze_support()
+
+    # Create shared memory mailbox which always holds only the latest tracker state
+    mailbox = SharedStateMailbox()
+
+    # Create tracker process
+    tracker = TrackerGame()
+
+    # Start tracker process
+    p = Process(target=tracker.start, args=(mailbox,))
+    p.start()
+
+    # Read the newest state, states published while we were busy are skipped
+    for _ in range(100):
+        snapshot = mailbox.read()
+        print(snapshot.to_json())
+    print(f'Published: {mailbox.published}, received: {mailbox.received}, overwritten: {mailbox.overwritten}')
+
+    p.terminate()
+    mailbox.close()
@@ -0,0 +1,47 @@
+import asyncio
+import time
+from multiprocessing import Process, freeze_support
+
+from sledilnik.TrackerGame import TrackerGame
+from sledilnik.classes.SnapshotClient import SnapshotClient, SyncSnapshotClient
+
+
+async def subscribe(name, count):
+    # Any number of subscribers can connect, each always gets the newest snapshot
+    async with SnapshotClient(port=5555) as client:
+        async for snapshot in client:
+            print(name, snapshot.to_json(client.fields))
+            count -= 1
+            if count == 0:
+                break
+        print(f'{name} received: {client.received}, skipped: {client.skipped}, missed: {client.missed}')
+
+
+if __name__ == '__main__':
+    freeze_support()
+
+    # Create tracker process which serves snapshots on 127.0.0.1:5555
+    tracker = TrackerGame()
+    tracker.tracker_config['publisher'] = {'enabled': True, 'host': '127.0.0.1', 'port': 5555, 'unix_path': None}
+    p = Process(target=tracker.start)
+    p.start()
+
+    # Wait until the tracker is listening
+    while True:
+        try:
+            client = SyncSnapshotClient(port=5555)
+            break
+        except ConnectionRefusedError:
+            time.sleep(0.5)
+
+    # Blocking client
+    for _ in range(10):
+        print('sync', client.read().to_json(client.fields))
+    client.close()
+
+    # Asyncio clients
+    async def main():
+        await asyncio.gather(subscribe('controller', 100), subscribe('scoreboard', 20))
+
+    asyncio.run(main())
+    p.terminate()
@@ -3,6 +3,7 @@ import sys
 
 from multiprocessing import Queue
 
+from sledilnik.TrackerBatch import TrackerBatch
 from sledilnik.TrackerGame import TrackerGame
 from sledilnik.TrackerSetup import TrackerSetup
 
@@ -11,9 +12,17 @@ def main(argv):
     tracker_config_path = './tracker_config.yaml'
     game_config_path = None
     setup = False
+    batch = False
+    replay = False
+    output_dir = '.'
+    jobs = None
 
     try:
-        opts, args = getopt.getopt(argv, "ht:g:s", ["help", "tracker-config=", "game-config=", "setup"])
+        opts, args = getopt.gnu_getopt(
+            argv,
+            "ht:g:sbro:j:",
+            ["help", "tracker-config=", "game-config=", "setup", "batch", "replay", "output=", "jobs="]
+        )
     except getopt.GetoptError:
         help_text()
         sys.exit(1)
@@ -27,9 +36,22 @@ def main(argv):
             game_config_path = arg
         elif opt in ("-s", "--setup"):
             setup = True
+        elif opt in ("-b", "--batch"):
+            batch = True
+        elif opt in ("-r", "--replay"):
+            replay = True
+        elif opt in ("-o", "--output"):
+            output_dir = arg
+        elif opt in ("-j", "--jobs"):
+            jobs = int(arg)
 
     if setup:
         TrackerSetup(tracker_config_path, game_config_path).start()
+    elif batch or replay:
+        if not args:
+            help_text()
+            sys.exit(1)
+        TrackerBatch(tracker_config_path, game_config_path).start(args, output_dir, jobs, replay)
     else:
         TrackerGame(tracker_config_path, game_config_path).start(Queue())
 
@@ -40,6 +62,10 @@ def help_text():
     print("\t--tracker-config (-t) <path to tracker config>  sets path to tracker config")
     print("\t--game-config (-g) <path to game config>        sets path to game config")
     print("\t--setup (-s)                                    runs tracker setup")
+    print("\t--batch (-b) <video files>                      tracks recorded videos without GUI")
+    print("\t--replay (-r) <detection logs>                  tracks detections logged with detection_log")
+    print("\t--output (-o) <directory>                       sets directory for batch output (.npz)")
+    print("\t--jobs (-j) <number>                            sets number of videos processed in parallel")
 
 
 if __name__ == '__main__':
@@ -1,50 +1,92 @@
+import multiprocessing
+import os
+import pickle
+
 import cv2
 import numpy as np
 import yaml
 
+from sledilnik.classes.CalibrationBundle import CalibrationBundle, convert_pickle
+from sledilnik.classes.Undistorter import Undistorter
+from sledilnik.classes.VideoStreamer import VideoStreamer
+
 
 class Tracker:
     def __init__(self, tracker_config, game_config):
+        self.tracker_config_path = tracker_config
+        self.game_config_path = game_config
         self.tracker_config = self.read_config(tracker_config)
         if game_config is not None:
             self.game_config = self.read_config(game_config)
         else:
             self.game_config = None
+        self.undistorter = None
+        if self.tracker_config.get('undistort'):
+            self.undistorter = self.create_undistorter()
 
     @staticmethod
     def read_config(config_path):
         with open(config_path, "r", encoding="utf-8") as f:
             return yaml.safe_load(f)
 
-    def undistort(self, img):
+    def open_video(self, preprocess=None):
+        c = self.tracker_config.get('video_buffer', {})
+        cap = VideoStreamer(c.get('size', 4), c.get('policy', VideoStreamer.AUTO), preprocess)
+        cap.start(self.tracker_config['video_source'])
+        return cap
+
+    def load_fields(self):
+        """Loads fields and calibration from fields_path.
+        A calibration bundle (.npz) is converted once from the old pickle file with the same name if it does not exist
+        yet. Undistortion maps stored in the bundle are handed to the undistorter, and the bundle is saved again
+        whenever the undistorter gets maps of a frame size the bundle does not have, e.g. after converting. Only the
+        main process saves it, worker processes of pipeline, batch and multi-camera modes load the same bundle.
+        Returns:
+            dict: transformation_matrix, fields_corners and fields, None if there is no fields file
+        """
+        path = self.tracker_config['fields_path']
+        if not CalibrationBundle.is_bundle(path):
+            if not os.path.isfile(path):
+                return None
+            print(f'Loading fields from {path}')
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+
+        if not os.path.isfile(path):
+            pickle_path = os.path.splitext(path)[0] + '.pickle'
+            if not os.path.isfile(pickle_path):
+                return None
+            print(f'Converting fields from {pickle_path} to {path}')
+            convert_pickle(pickle_path, path, self.undistorter)
+
+        print(f'Loading fields from {path}')
+        bundle = CalibrationBundle.load(path)
+        saved_fields = bundle.to_saved_fields()
+        if self.undistorter is not None:
+            if bundle.undistort_key == self.undistorter.key:
+                self.undistorter.maps.update(bundle.undistort_maps)
+            if multiprocessing.parent_process() is None:
+                self.undistorter.on_new_maps = lambda w, h: self.write_fields(saved_fields)
+        return saved_fields
+
+    def write_fields(self, saved_fields):
+        """Saves fields to fields_path, as a calibration bundle if it is an .npz file and as a pickle otherwise"""
+        path = self.tracker_config['fields_path']
+        if CalibrationBundle.is_bundle(path):
+            CalibrationBundle.from_saved_fields(saved_fields, self.undistorter).save(path)
+            return
+        with open(path, 'wb') as output:
+            pickle.dump(saved_fields, output, pickle.HIGHEST_PROTOCOL)
 
-        c = self.tracker_config['camera']
-        # Camera parameters
-        k1 = c['k1']
-        k2 = c['k2']
-        k3 = c['k3']
-        p1 = c['p1']
-        p2 = c['p2']
-        fx = c['fx']
-        fy = c['fy']
-        cx = c['cx']
-        cy = c['cy']
-
-        dist = np.array([k1, k2, p1, p2, k3])
-        mtx = np.array([[fx, 0, cx], [0, fy, cy], [0, 0, 1]])
-
-        # Setting the params
-        h, w = img.shape[:2]
-        new_camera_tx, roi = cv2.getOptimalNewCameraMatrix(mtx, dist, (w, h), 1, (w, h))
-
-        # Undistort
-        map_x, map_y = cv2.initUndistortRectifyMap(mtx, dist, None, new_camera_tx, (w, h), 5)
-        dst = cv2.remap(img, map_x, map_y, cv2.INTER_LINEAR)
-
-        # Crop the image
-        x, y, w, h = roi
-        dst = dst[y:y + h, x:x + w]
-        return dst
+    def create_undistorter(self):
+        # Remap tables are cached next to the fields file
+        cache_dir = os.path.dirname(os.path.abspath(self.tracker_config['fields_path']))
+        return Undistorter(self.tracker_config['camera'], cache_dir)
+
+    def undistort(self, img):
+        if self.undistorter is None:
+            self.undistorter = self.create_undistorter()
+        return self.undistorter.undistort(img)
 
     def move_origin(self, x, y, transformation_matrix: np.ndarray):
         """Translates coordinate to new coordinate system and applies scaling to get units in ~mm.
@@ -64,31 +106,30 @@ class Tracker:
         y = d_point[0][0][1]
         return int(round(x)), int(round(y))
 
-    # def reverseCorrect(self, x, y, map):
-    #     """Reverses the correction of the coordinates.
-    #     Scale0 and scale1 define scaling constants. The scaling factor is a linear function of distance from center.
-    #     Args:
-    #         x (int): x coordinate
-    #         y (int): y coordinate
-    #         map (ResMap) : map object
-    #     Returns:
-    #         Tuple[int, int]: Reverted coordinates
-    #     """
-    #
-    #     # Scaling factors
-    #     scale0 = self.cameraConfig.scale0
-    #     scale1 = self.cameraConfig.scale1
-    #
-    #     # Convert screen coordinates to 0-based coordinates
-    #     offset_x = map.imageWidth / 2
-    #     offset_y = map.imageHeighth / 2
-    #
-    #     # Calculate distance from center
-    #     dist = np.sqrt((x - offset_x) ** 2 + (y - offset_y) ** 2)
-    #
-    #     # Find the distance before correction
-    #     distOld = (-scale0 + np.sqrt(scale0 ** 2 + 4 * dist * scale1)) / (2 * scale1)
-    #
-    #     # Revert coordinates and return
-    #     return (int(round((x - offset_x) / (scale0 + scale1 * distOld) + offset_x)),
-    #             int(round((y - offset_y) / (scale0 + scale1 * distOld) + offset_y)))
+    def move_origin_points(self, points, transformation_matrix: np.ndarray):
+        """Translates an array of coordinates to new coordinate system with a single perspective transform.
+        Args:
+            points (np.ndarray): array of (x, y) coordinates with shape (N, 2)
+            transformation_matrix: transformation matrix
+        Returns:
+            np.ndarray: translated coordinates with shape (N, 2)
+        """
+        if len(points) == 0:
+            return np.empty((0, 2), np.float32)
+        s_points = np.asarray(points, np.float32).reshape(-1, 1, 2)
+        d_points = cv2.perspectiveTransform(s_points, transformation_matrix)
+        return d_points.reshape(-1, 2)
+
+    def reverse_move_origin(self, points, transformation_matrix: np.ndarray):
+        """Translates coordinates from the map coordinate system back to frame coordinates.
+        Args:
+            points (np.ndarray): array of (x, y) map coordinates with shape (N, 2)
+            transformation_matrix: transformation matrix used by move_origin
+        Returns:
+            np.ndarray: frame coordinates with shape (N, 2)
+        """
+        if len(points) == 0:
+            return np.empty((0, 2), np.float32)
+        s_points = np.asarray(points, np.float32).reshape(-1, 1, 2)
+        d_points = cv2.perspectiveTransform(s_points, np.linalg.inv(transformation_matrix))
+        return d_points.reshape(-1, 2)
@@ -0,0 +1,144 @@
+import multiprocessing
+import os
+
+import cv2
+
+from sledilnik.Tracker import Tracker
+from sledilnik.TrackerGame import TrackerGame
+from sledilnik.classes.DetectionLog import DetectionLogReader
+from sledilnik.classes.TrackerSnapshot import TrackerSnapshot
+from sledilnik.classes.TrajectoryWriter import TrajectoryWriter
+from sledilnik.classes.VideoStreamer import VideoStreamer
+
+
+def process_video(tracker_config, game_config, video, output_path):
+    """Tracks objects in a recorded video as fast as possible and writes trajectories to output_path.
+    Timestamps are taken from the video frame rate, so they start at 0 for every video. If detection_log is set in
+    config, detections are also logged to a .detlog file next to output_path, which can be replayed with replay_log.
+    Args:
+        tracker_config (str): path to tracker config
+        game_config (str): path to game config
+        video (str): path to video file
+        output_path (str): path to .npz file
+    Returns:
+        str: output_path
+    """
+    tracker = TrackerGame(tracker_config, game_config)
+    tracker.debug = False
+    tracker.tracker_config['video_source'] = video
+    tracker.tracker_config['video_buffer'] = {
+        **tracker.tracker_config.get('video_buffer', {}),
+        'policy': VideoStreamer.LOSSLESS
+    }
+
+    if tracker.tracker_config.get('detection_log'):
+        tracker.detection_log_path = os.path.splitext(output_path)[0] + '.detlog'
+
+    cap = tracker.open_video()
+    fps = cap.video.get(cv2.CAP_PROP_FPS)
+    writer = TrajectoryWriter(output_path, metadata={'video': os.path.abspath(video), 'fps': fps})
+    timer = tracker.stage_timer
+    try:
+        for frame, _ in tracker.read_frames(cap):
+            if timer:
+                timer.start_frame()
+            frame_index = tracker.frame_counter
+            tracker.process_frame(frame, frame_index / fps if fps else float(frame_index))
+            writer.append(frame_index, TrackerSnapshot.from_live_data(tracker.data))
+            if timer:
+                timer.lap('write')
+                timer.end_frame()
+    finally:
+        cap.stop()
+        tracker.close_detection_log()
+        # Rows of an interrupted run stay in the part file of the writer
+        writer.flush()
+    writer.close()
+    if timer:
+        print(timer.format())
+    return output_path
+
+
+def replay_log(tracker_config, game_config, log_path, output_path):
+    """Tracks detections from a detection log as fast as possible and writes trajectories to output_path.
+    Video is not read and markers are not detected, so only tracking settings (kalman_filter, object_timeout,
+    pos_limit_x/y) and fields affect the result. With the same settings, trajectories match the ones of the run that
+    wrote the log.
+    Args:
+        tracker_config (str): path to tracker config
+        game_config (str): path to game config
+        log_path (str): path to detection log
+        output_path (str): path to .npz file
+    Returns:
+        str: output_path
+    """
+    tracker = TrackerGame(tracker_config, game_config)
+    tracker.debug = False
+    reader = DetectionLogReader(log_path)
+    frame = reader.frame()
+
+    writer = TrajectoryWriter(output_path, metadata={'detection_log': os.path.abspath(log_path)})
+    timer = tracker.stage_timer
+    try:
+        for frame_index, timestamp, corners, ids in reader:
+            if timer:
+                timer.start_frame()
+            tracker.replay_frame(frame_index, timestamp, corners, ids, frame)
+            if timer:
+                timer.lap('track')
+            # Batch runs number frames from 0, the tracker counts them from 1
+            writer.append(frame_index - 1, TrackerSnapshot.from_live_data(tracker.data))
+            if timer:
+                timer.lap('write')
+                timer.end_frame()
+    finally:
+        # Rows of an interrupted run stay in the part file of the writer
+        writer.flush()
+    writer.close()
+    if timer:
+        print(timer.format())
+    return output_path
+
+
+def _process_video_task(args):
+    return process_video(*args)
+
+
+def _replay_log_task(args):
+    return replay_log(*args)
+
+
+class TrackerBatch(Tracker):
+    """Processes recorded videos or detection logs without GUI and writes trajectories of each to a .npz file"""
+
+    def __init__(self, tracker_config='./tracker_config.yaml', game_config=None):
+        super().__init__(tracker_config, game_config)
+
+    @staticmethod
+    def output_path(video, output_dir):
+        return os.path.join(output_dir, os.path.splitext(os.path.basename(video))[0] + '.npz')
+
+    def start(self, videos, output_dir='.', jobs=None, replay=False):
+        """Processes videos, in parallel across processes when there is more than one.
+        Args:
+            videos (List[str]): paths to video files, or detection logs if replay is set
+            output_dir (str): directory for .npz files
+            jobs (int): number of processes, None uses all cores
+            replay (bool): replay detection logs instead of processing videos
+        """
+        task_function = _replay_log_task if replay else _process_video_task
+        os.makedirs(output_dir, exist_ok=True)
+        tasks = [
+            (self.tracker_config_path, self.game_config_path, video, self.output_path(video, output_dir))
+            for video in videos
+        ]
+        jobs = max(min(jobs or os.cpu_count(), len(tasks)), 1)
+
+        if jobs == 1:
+            for task in tasks:
+                print(f'Wrote {task_function(task)}')
+            return
+
+        with multiprocessing.Pool(jobs) as pool:
+            for output_path in pool.imap_unordered(task_function, tasks):
+                print(f'Wrote {output_path}')
@@ -1,18 +1,30 @@
 #!/usr/bin/env python
 import copy
-import os
-import pickle
+import multiprocessing.queues
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import cv2
-import cv2.aruco as aruco
 import numpy as np
 
-from sledilnik.Resources import ResGUIText, ResKeys
+from sledilnik.Resources import ResGUIText
 from sledilnik.Tracker import Tracker
+from sledilnik.classes.DetectionGate import DetectionGate
+from sledilnik.classes.DetectionLog import DetectionLogWriter
+from sledilnik.classes.DetectionPipeline import DetectionPipeline
+from sledilnik.classes.FieldClassifier import FieldClassifier
+from sledilnik.classes.FramePreprocessor import FramePreprocessor
+from sledilnik.classes.KalmanFilterBank import KalmanFilterBank
+from sledilnik.classes.MarkerDetector import MarkerDetector
+from sledilnik.classes.MarkerSizeTuner import MarkerSizeTuner
+from sledilnik.classes.MultiCameraCapture import MultiCameraCapture
 from sledilnik.classes.ObjectTracker import ObjectTracker
+from sledilnik.classes.PreviewRenderer import PreviewRenderer
+from sledilnik.classes.SnapshotDelta import DeltaEncoder
+from sledilnik.classes.SnapshotPublisher import SnapshotPublisher
+from sledilnik.classes.StageTimer import StageTimer
 from sledilnik.classes.TrackerLiveData import TrackerLiveData
-from sledilnik.classes.VideoStreamer import VideoStreamer
+from sledilnik.classes.TrackerSnapshot import TrackerSnapshot
 
 
 class TrackerGame(Tracker):
@@ -20,129 +32,520 @@ class TrackerGame(Tracker):
         super().__init__(tracker_config, game_config)
         self.debug = self.tracker_config['debug']
 
-        if os.path.isfile(self.tracker_config['fields_path']):
-            print(f'Loading fields from {self.tracker_config["fields_path"]}')
-            saved_fields = pickle.load(open(self.tracker_config['fields_path'], "rb"))
+        saved_fields = self.load_fields()
+        if saved_fields is not None:
             self.transformation_matrix = saved_fields['transformation_matrix']
-            self.data = TrackerLiveData(saved_fields['fields'])
+            self.bank = KalmanFilterBank(self.tracker_config['kalman_filter'])
+            self.data = TrackerLiveData(saved_fields['fields'], self.bank)
+            self.field_classifier = FieldClassifier(saved_fields['fields'])
         else:
             raise FileNotFoundError(f"Fields file ({self.tracker_config['fields_path']}) not found.")
 
+        # Detections outside pos limits, impossible jumps and duplicates are dropped before tracking
+        c = self.tracker_config.get('detection_gate', {})
+        self.detection_gate = DetectionGate(
+            self.tracker_config['pos_limit_x'],
+            self.tracker_config['pos_limit_y'],
+            c.get('max_speed', 150),
+            c.get('sigmas', 4.0)
+        )
+
+        self.detector = MarkerDetector(self.tracker_config['aruco_detector'])
+        self.detection_config = self.tracker_config.get('detection', {'mode': 'full'})
+
+        # Tiles of the last frame shape and region in tiled mode, detected on a thread pool
+        self.tiles = (None, [])
+        self.tile_executor = None
+        if self.detection_config['mode'] == 'tiled':
+            threads = self.detection_config.get('tiled', {}).get('threads', 4)
+            if threads > 1:
+                self.tile_executor = ThreadPoolExecutor(threads, thread_name_prefix='tile')
+
+        # Perimeter rates of the detector follow sizes of detected markers when adaptive_marker_size is enabled
+        self.marker_size_tuner = None
+        c = self.detection_config.get('adaptive_marker_size', {})
+        if c.get('enabled'):
+            a = self.tracker_config['aruco_detector']
+            self.marker_size_tuner = MarkerSizeTuner(
+                a['min_marker_perimeter_rate'],
+                a['max_marker_perimeter_rate'],
+                c.get('window', 300),
+                c.get('margin', 0.25),
+                c.get('min_samples', 30),
+                c.get('full_range_interval', 60)
+            )
+
+        # Frames are preprocessed on the capture thread when the video is opened with capture_preprocessing
+        self.preprocessing_config = self.tracker_config.get('preprocessing', {})
+        self.crop_to_field = self.preprocessing_config.get('crop_to_field', False)
+        self.preprocessor = FramePreprocessor(self.undistorter, self.field_roi if self.crop_to_field else None)
+        self.capture_preprocessing = False
+
+        # Stage durations are only measured when metrics are enabled
+        self.metrics_config = self.tracker_config.get('metrics', {})
+        self.stage_timer = None
+        if self.metrics_config.get('enabled'):
+            self.stage_timer = StageTimer(self.metrics_config.get('window', 1000),
+                                          self.metrics_config.get('log_interval', 5))
+
+        self.publisher = None
+        # Raw detections are appended to the log when detection_log is set, see start
+        self.detection_log_path = None
+        self.detection_log = None
         self.should_quit = False
         self.edit_mode = False
         self.frame_counter = 0
+        self.last_full_scan = 0
 
     def start(self, queue=None):
-        # Load video
-        cap = VideoStreamer()
-        cap.start(self.tracker_config['video_source'])
+        """Runs the tracker loop.
+        Args:
+            queue: multiprocessing Queue, which receives a copy of TrackerLiveData (or TrackerSnapshot with
+                compact_snapshots enabled) for every frame, or SharedStateMailbox, which always holds only the latest
+                state. States are also served to subscribers over sockets if publisher is enabled in config
+        """
+        self.publisher = self.create_publisher()
+        if self.tracker_config.get('cameras'):
+            self.start_multi_camera(queue)
+            return
+        if self.tracker_config.get('pipeline', {}).get('enabled'):
+            self.start_pipeline(queue)
+            return
 
-        # Create window
+        # Load video
+        cap = self.open_video()
+        self.detection_log_path = self.tracker_config.get('detection_log')
+        timer = self.stage_timer
+        if timer and self.metrics_config.get('http_port') is not None:
+            timer.serve(self.metrics_config['http_port'])
+
+        # Preview is drawn and shown on its own thread, without debug the loop makes no GUI calls
+        preview = None
         if self.debug:
-            cv2.namedWindow(ResGUIText.sWindowName, cv2.WINDOW_NORMAL)
-        # cv2.resizeWindow(ResGUIText.sWindowName, 2000,1000)
+            preview = PreviewRenderer(ResGUIText.sWindowName, self.tracker_config.get('preview_max_fps', 15)).start()
 
-        while not self.should_quit and cap.running:
+        while not self.should_quit:
+            if timer:
+                timer.start_frame()
 
             # Load frame-by-frame
             frame, timestamp = cap.read()
+            if timer:
+                timer.lap('read')
+                if cap.clock is not None:
+                    timer.record('frame_age', timer.last - cap.clock)
+                # Stages that ran on the capture thread
+                for stage, seconds in (cap.stage_durations or {}).items():
+                    timer.record(stage, seconds)
             if frame is None:
                 if self.debug:
                     cap.stop()
-                    cap = VideoStreamer()
-                    cap.start(self.tracker_config['video_source'])
+                    cap = self.open_video()
                     continue
                 break
 
-            # Convert to grayscale for Aruco detection
-            self.frame_counter += 1
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-            # Undistort image
-            if self.tracker_config['undistort']:
-                frame = self.undistort(frame)
-
-            # Detect markers
-            corners_tracked, ids, rejected_img_points = aruco.detectMarkers(
-                frame,
-                cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_100),
-                parameters=self.init_aruco_parameters()
-            )
-
-            # Compute mass centers and orientation
-            points_tracked = self.get_mass_center(corners_tracked, ids, frame)
-
-            # Detect Validate and track game_objects on map
-            self.track(points_tracked)
-
-            # Update timestamp
-            self.data.timestamp = timestamp
+            # Detect and track game_objects on map
+            frame, corners_tracked, ids = self.process_frame(frame, timestamp)
 
             # Write game data
-            if queue is not None:
-                queue.put(copy.deepcopy(self.data))
+            self.data.delay = time.perf_counter() - cap.clock
+            self.publish_all(queue)
+            if timer:
+                timer.lap('publish')
             # print(self.data.to_json())
 
-            self.on_key_press()
+            if preview:
+                preview.submit(frame, corners_tracked, ids, lambda: self.frame_objects(frame))
+                self.should_quit = preview.should_quit
 
-            if self.debug:
-                # Draw GUI and game_objects
-                frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-                frame_markers = aruco.drawDetectedMarkers(frame.copy(), corners_tracked, ids)
-                # Show frame
-                cv2.imshow(ResGUIText.sWindowName, frame_markers)
+            if timer:
+                timer.lap('preview')
+                timer.end_frame(self.data.delay)
 
         # When everything done, release the capture
         cap.stop()
-        cv2.destroyAllWindows()
+        if timer:
+            timer.close()
+        if preview:
+            preview.stop()
+        self.exit(queue)
+
+    def start_pipeline(self, queue=None):
+        """Runs the tracker with detection done on many frames at once in worker processes.
+        Results are tracked in frame order. There is no GUI and detection always scans whole frames.
+        Args:
+            queue: same as in start
+        """
+        c = self.tracker_config['pipeline']
+        # Workers preprocess frames themselves
+        cap = self.open_video(preprocess=False)
+        pipeline = DetectionPipeline(self.tracker_config_path, self.game_config_path, c['workers'], c['max_in_flight'])
+        try:
+            for _, timestamp, ids, positions, _ in pipeline.process(self.read_frames(cap)):
+                self.frame_counter += 1
+                self.track(ids, positions, timestamp)
+                self.data.timestamp = timestamp
+                # Capture clock does not travel through workers, timestamps are on the same wall clock
+                self.data.delay = time.time() - timestamp
+                self.publish_all(queue)
+        finally:
+            pipeline.close()
+            cap.stop()
+        self.exit(queue)
+
+    def start_multi_camera(self, queue=None):
+        """Runs the tracker on several cameras, each detected in its own process.
+        Detections of cameras with close timestamps are merged and tracked together in world coordinates. There is no
+        GUI and cameras always scan whole frames.
+        Args:
+            queue: same as in start
+        """
+        c = self.tracker_config.get('multi_camera', {})
+        cameras = MultiCameraCapture(
+            self.tracker_config['cameras'],
+            self.game_config_path,
+            c.get('max_time_offset', 0.02)
+        ).start()
+        try:
+            for timestamp, capture_time, detections in cameras.frames():
+                ids, positions = self.merge_detections(
+                    [ids for _, ids, _ in detections],
+                    [positions for _, _, positions in detections],
+                    c.get('merge_distance', 100)
+                )
+                self.frame_counter += 1
+                self.track(ids, positions, timestamp)
+                self.data.timestamp = timestamp
+                self.data.delay = time.time() - capture_time
+                self.publish_all(queue)
+                if self.should_quit:
+                    break
+        finally:
+            cameras.stop()
+        self.exit(queue)
+
+    @staticmethod
+    def merge_detections(ids_list, positions_list, merge_distance):
+        """Merges detections of several cameras in world coordinates.
+        Only detections of different cameras are merged. Every detection of the first camera that detected an id is
+        kept and averaged with the closest detection of that id of each other camera, if their centers are at most
+        merge_distance apart. Detections of other cameras that are not merged are dropped. Several detections of the
+        same id by one camera are left to DetectionGate, which keeps the one closest to the object.
+        Args:
+            ids_list (List[np.ndarray]): ids of each camera with shape (N,)
+            positions_list (List[np.ndarray]): positions of each camera with shape (N, 4)
+            merge_distance (float): largest distance between centers of merged detections
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: ids with shape (M,) and positions with shape (M, 4)
+        """
+        ids = np.concatenate(ids_list) if ids_list else np.empty(0, np.int32)
+        positions = np.concatenate(positions_list) if positions_list else np.empty((0, 4), np.int32)
+        if len(ids) < 2:
+            return ids, positions
+
+        # Detections of the first camera that detected their id
+        cameras = np.repeat(np.arange(len(ids_list)), [len(camera_ids) for camera_ids in ids_list])
+        _, first, inverse = np.unique(ids, return_index=True, return_inverse=True)
+        is_primary = cameras == cameras[first[inverse]]
+        if is_primary.all():
+            return ids, positions
+        primary = np.flatnonzero(is_primary)
+
+        sums = positions[primary].astype(np.float64)
+        counts = np.ones(len(primary))
+        for camera in np.unique(cameras[~is_primary]):
+            other = np.flatnonzero(~is_primary & (cameras == camera))
+            distance = np.linalg.norm(positions[primary, None, 0:2] - positions[None, other, 0:2], axis=2)
+            distance[(ids[primary, None] != ids[None, other]) | (distance > merge_distance)] = np.inf
+            closest = distance.argmin(axis=1)
+            merged = np.isfinite(distance[np.arange(len(primary)), closest])
+            sums[merged] += positions[other[closest[merged]]]
+            counts[merged] += 1
+        return ids[primary], np.rint(sums / counts[:, None]).astype(positions.dtype)
+
+    def process_frame(self, frame, timestamp):
+        """Detects and tracks objects on one captured frame.
+        Args:
+            frame: BGR frame
+            timestamp (float): capture timestamp
+        Returns:
+            Tuple[np.ndarray, tuple, np.ndarray]: preprocessed frame, corners and ids of detected markers
+        """
+        # Convert to grayscale for Aruco detection and undistort, unless it was done on the capture thread
+        timer = self.stage_timer
+        self.frame_counter += 1
+        if not self.capture_preprocessing:
+            frame = self.preprocess(frame, timer)
+
+        # Detect markers
+        corners_tracked, ids = self.detect_markers(frame)
+        if timer:
+            timer.lap('detect_markers')
+
+        # Record raw detections for replay
+        if self.detection_log_path is not None:
+            if self.detection_log is None:
+                self.detection_log = DetectionLogWriter(self.detection_log_path, frame.shape)
+            self.detection_log.append(self.frame_counter, timestamp, corners_tracked, ids)
+            if timer:
+                timer.lap('detection_log')
+
+        # Compute mass centers and orientation
+        ids_tracked, points_tracked = self.get_mass_center(corners_tracked, ids, frame)
+        if timer:
+            timer.lap('get_mass_center')
+
+        # Detect Validate and track game_objects on map
+        self.track(ids_tracked, points_tracked, timestamp)
+        if timer:
+            timer.lap('track')
+
+        # Narrow perimeter rates to detected markers, widen them when an object was not detected
+        if self.marker_size_tuner is not None:
+            lost = (self.bank.last_seen[self.bank.active_slots()] < self.frame_counter).any()
+            self.detector.set_perimeter_rates(*self.marker_size_tuner.update(corners_tracked, frame.shape, lost))
+
+        # Update timestamp
+        self.data.timestamp = timestamp
+        return frame, corners_tracked, ids
+
+    def replay_frame(self, frame_index, timestamp, corners, ids, frame):
+        """Tracks detections of one frame read from a detection log, same as process_frame after detection.
+        Args:
+            frame_index (int): frame counter of the logged frame, object timeouts count frames
+            timestamp (float): capture timestamp
+            corners (np.ndarray): corners with shape (N, 4, 2)
+            ids (np.ndarray): ids with shape (N,)
+            frame: frame or DetectionLogReader.frame with the shape of logged frames
+        """
+        self.frame_counter = frame_index
+        ids_tracked, points_tracked = self.get_mass_center(corners, ids, frame)
+        self.track(ids_tracked, points_tracked, timestamp)
+        self.data.timestamp = timestamp
+
+    def close_detection_log(self):
+        if self.detection_log is not None:
+            self.detection_log.close()
+            self.detection_log = None
+
+    def open_video(self, preprocess=True):
+        """Opens video, frames are preprocessed on the capture thread if enabled in config.
+        Args:
+            preprocess (bool): False always returns captured BGR frames
+        Returns:
+            VideoStreamer: started video streamer
+        """
+        self.capture_preprocessing = preprocess and self.preprocessing_config.get('capture_thread', False)
+        return super().open_video(self.preprocessor if self.capture_preprocessing else None)
+
+    @staticmethod
+    def read_frames(cap):
+        """Yields (frame, timestamp) from VideoStreamer until the stream ends"""
+        while True:
+            frame, timestamp = cap.read()
+            if frame is None:
+                return
+            yield frame, timestamp
+
+    def preprocess(self, frame, timer=None):
+        """Converts frame to grayscale and removes distortion if enabled.
+        Args:
+            frame: BGR frame
+            timer (StageTimer): records durations of both steps if given
+        Returns:
+            np.ndarray: grayscale frame
+        """
+        return self.preprocessor(frame, timer=timer)
+
+    def field_roi(self, frame):
+        """Computes the part of the frame that can contain valid positions.
+        Corners of the area given by pos_limit_x and pos_limit_y are mapped back to the frame.
+        Args:
+            frame: preprocessed frame
+        Returns:
+            Tuple[int, int, int, int]: region as (x0, y0, x1, y1), clipped to the frame
+        """
+        x0, x1 = self.tracker_config['pos_limit_x']
+        y0, y1 = self.tracker_config['pos_limit_y']
+        corners = np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], np.float64)
+        points = self.reverse_correct(self.reverse_move_origin(corners, self.transformation_matrix), frame)
+
+        margin = self.preprocessing_config.get('crop_margin', 50)
+        h, w = frame.shape[:2]
+        x0, y0 = np.clip(np.floor(points.min(axis=0) - margin), 0, (w, h)).astype(int)
+        x1, y1 = np.clip(np.ceil(points.max(axis=0) + margin), 0, (w, h)).astype(int)
+        return x0, y0, x1, y1
+
+    def create_publisher(self):
+        """Starts SnapshotPublisher if it is enabled in config"""
+        c = self.tracker_config.get('publisher', {})
+        if not c.get('enabled'):
+            return None
+        encoder = None
+        if c.get('encoding', 'full') == 'delta':
+            d = c.get('delta', {})
+            encoder = DeltaEncoder(
+                d.get('keyframe_interval', 60),
+                d.get('position_threshold', 1.0),
+                d.get('direction_threshold', 1.0)
+            )
+        return SnapshotPublisher(c.get('host', '127.0.0.1'), c.get('port'), c.get('unix_path'), encoder=encoder).start()
+
+    def publish_all(self, queue):
+        """Publishes the current state to queue (if given) and to subscribers of the publisher (if enabled)"""
         if queue is not None:
+            self.publish(queue)
+        if self.publisher is not None:
+            self.publisher.publish(self.data)
+
+    def exit(self, queue):
+        """Stops the publisher and tile threads, closes the detection log and exits the tracker process"""
+        if self.publisher is not None:
+            self.publisher.close()
+        if self.tile_executor is not None:
+            self.tile_executor.shutdown()
+        self.close_detection_log()
+        if isinstance(queue, multiprocessing.queues.Queue):
             queue.cancel_join_thread()
         sys.exit(0)
 
-    def track(self, points_tracked):
-        for ct in points_tracked:
-            object_id = ct[0]
-            position = ct[1]
-            if object_id in self.data.objects:
-                self.data.objects[object_id].update_state(position)
-                self.data.objects[object_id].detected = True
-                self.data.objects[object_id].enabled = True
-                self.data.objects[object_id].last_seen = self.frame_counter
-            else:
-                self.data.objects[object_id] = ObjectTracker(
-                    object_id,
-                    position,
-                    (0, 0, 0, 0),
-                    self.tracker_config['kalman_filter']
-                )
+    def publish(self, queue):
+        if hasattr(queue, 'publish'):
+            queue.publish(self.data)
+        elif self.tracker_config.get('compact_snapshots'):
+            queue.put(TrackerSnapshot.from_live_data(self.data, self.frame_counter))
+        else:
+            queue.put(copy.deepcopy(self.data))
 
-        # Disable object tracking if not detected for a long time
-        for k, v in list(self.data.objects.items()):
-            if ((self.frame_counter - v.last_seen) > self.tracker_config['object_timeout']) or \
-                    not self.is_valid_pos(v.bounding_box[0:2]):
-                del self.data.objects[k]
-                # objects[k].enabled = False
-
-        # Track undetected objects
-        for obj in self.data.objects:
-            if not self.data.objects[obj].detected:
-                self.data.objects[obj].lost_frames = self.data.objects[obj].lost_frames + 1
-                # if objects[obj].enabled == True:
-                self.data.objects[obj].update_state([])
-            self.data.objects[obj].detected = False
+    def track(self, ids, positions, timestamp=None):
+        """Updates all tracked objects with detections of the current frame.
+        Args:
+            ids (np.ndarray): aruco tag ids with shape (N,)
+            positions (np.ndarray): object center and top coordinates with shape (N, 4)
+            timestamp (float): capture timestamp, filters advance by elapsed time when frame_period is set
+        """
+        bank = self.bank
+
+        # Filter detections and match them to objects tracked before this frame
+        slots = bank.active_slots()
+        ids, positions, index = self.detection_gate.filter(ids, positions, bank, slots, self.frame_counter)
+        found = index >= 0
+        measurements = np.zeros((len(slots), 4))
+        measured = np.zeros(len(slots), bool)
+        measurements[index[found]] = positions[found]
+        measured[index[found]] = True
+        bank.last_seen[slots[measured]] = self.frame_counter
+
+        # Disable object tracking if not detected for a long time, undetected objects are checked at their last
+        # known position
+        check_box = np.where(measured[:, None], measurements, bank.bounding_box[slots])
+        remove = ((self.frame_counter - bank.last_seen[slots]) > self.tracker_config['object_timeout']) | \
+            ~self.valid_positions(check_box)
+        for slot in slots[remove]:
+            self.data.objects.pop(int(bank.ids[slot])).release()
+
+        # Track detected and undetected objects with one batched step
+        keep = ~remove
+        bank.update(slots[keep], measurements[keep], measured[keep], timestamp)
+        bank.lost_frames[slots[keep & ~measured]] += 1
+
+        # Start tracking new objects, they are first updated in the next frame
+        new = ~found
+        for object_id, position in zip(ids[new].tolist(), map(tuple, positions[new].tolist())):
+            self.data.objects[object_id] = ObjectTracker(
+                object_id,
+                position,
+                (0, 0, 0, 0),
+                self.tracker_config['kalman_filter'],
+                bank=bank
+            )
+            self.data.objects[object_id].last_seen = self.frame_counter
+
+        # Classify all objects into fields at once
+        slots = bank.active_slots()
+        bank.fields[slots] = self.field_classifier.classify(bank.bounding_box[slots, 0], bank.bounding_box[slots, 1])
 
     def init_aruco_parameters(self):
-        c = self.tracker_config['aruco_detector']
-        aruco_parameters = aruco.DetectorParameters()
-        aruco_parameters.adaptiveThreshWinSizeMin = c['adaptive_thresh_win_size_min']
-        aruco_parameters.adaptiveThreshWinSizeMax = c['adaptive_thresh_win_size_max']
-        aruco_parameters.adaptiveThreshConstant = c['adaptive_thresh_constant']
-        aruco_parameters.minMarkerPerimeterRate = c['min_marker_perimeter_rate']
-        aruco_parameters.maxMarkerPerimeterRate = c['max_marker_perimeter_rate']
-        aruco_parameters.perspectiveRemovePixelPerCell = c['perspective_remove_pixel_per_cell']
-        aruco_parameters.perspectiveRemoveIgnoredMarginPerCell = c['perspective_remove_ignored_margin_per_cell']
-        aruco_parameters.minMarkerDistanceRate = c['min_marker_distance_rate']
-        return aruco_parameters
+        return self.detector.create_parameters()
+
+    def detect_markers(self, frame):
+        """Detects markers using the configured detection mode.
+        In roi mode only windows around last object positions are searched. The whole frame is still scanned
+        every full_scan_interval frames, when there are no objects and when any object was not detected in the
+        previous frame. In tiled mode the frame is searched in overlapping tiles on several threads.
+        Args:
+            frame: grayscale frame
+        Returns:
+            Tuple[tuple, np.ndarray]: corners and ids as returned by aruco.detectMarkers
+        """
+        if self.detection_config['mode'] == 'roi':
+            c = self.detection_config['roi']
+            full_scan = (self.frame_counter - self.last_full_scan >= c['full_scan_interval']) or \
+                not self.data.objects or \
+                (self.bank.last_seen[self.bank.active_slots()] < self.frame_counter - 1).any()
+            if not full_scan:
+                return self.detector.detect_windows(frame, self.get_search_windows(frame, c['margin']))
+
+        self.last_full_scan = self.frame_counter
+        return self.detect_field(frame)
+
+    def detect_field(self, frame):
+        """Detects markers on the whole frame, or only on the field when frames are cropped to it"""
+        roi = self.preprocessor.roi
+        cropped = self.crop_to_field and roi is not None and roi != (0, 0, frame.shape[1], frame.shape[0])
+        if self.detection_config['mode'] == 'tiled':
+            tiles = self.get_tiles(frame, roi if cropped else (0, 0, frame.shape[1], frame.shape[0]))
+            return self.detector.detect_tiles(frame, tiles, self.tile_executor)
+        if cropped:
+            return self.detector.detect_region(frame, roi)
+        return self.detector.detect(frame)
+
+    def get_tiles(self, frame, region):
+        """Splits the region into tiles of tiled mode, tiles are kept until the frame shape or region changes.
+        Without a configured overlap neighbouring tiles share 1.5 times the side of the largest marker allowed by
+        max_marker_perimeter_rate, a marker rotated by 45 degrees spans 1.41 times its side.
+        Args:
+            frame: grayscale frame
+            region (Tuple[int, int, int, int]): searched region as (x0, y0, x1, y1)
+        Returns:
+            List[Tuple[int, int, int, int]]: tiles as (x0, y0, x1, y1)
+        """
+        key = (frame.shape, region)
+        if self.tiles[0] != key:
+            c = self.detection_config.get('tiled', {})
+            overlap = c.get('overlap')
+            if overlap is None:
+                max_rate = self.tracker_config['aruco_detector']['max_marker_perimeter_rate']
+                largest_side = max_rate * max(frame.shape[:2]) / 4
+                overlap = int(np.ceil(1.5 * largest_side))
+            self.tiles = (key, MarkerDetector.tiles(region, c.get('grid', (2, 2)), overlap))
+        return self.tiles[1]
+
+    def get_search_windows(self, frame, margin):
+        """Computes search windows around last reported positions of tracked objects.
+        Windows are only used when every object was detected in the previous frame, so the reported positions are
+        the last measurements. The filter states are not used, they lag moving objects by several frames of movement.
+        Center and top of each object are mapped back to frame coordinates. The window is centered on the center and
+        is large enough to contain the whole marker plus margin pixels on each side.
+        Args:
+            frame: frame object
+            margin (int): margin in pixels
+        Returns:
+            List[Tuple[int, int, int, int]]: windows as (x0, y0, x1, y1)
+        """
+        reported = self.bank.bounding_box[self.bank.active_slots()].reshape(-1, 2)
+        points = self.reverse_correct(self.reverse_move_origin(reported, self.transformation_matrix), frame)
+        centers = points[0::2]
+        tops = points[1::2]
+
+        # Distance from center to top is half the marker side, which makes the half diagonal ~1.42 times as long
+        half_size = 1.5 * np.linalg.norm(tops - centers, axis=1) + margin
+        h, w = frame.shape[:2]
+        x0 = np.clip(centers[:, 0] - half_size, 0, w).astype(int)
+        y0 = np.clip(centers[:, 1] - half_size, 0, h).astype(int)
+        x1 = np.clip(centers[:, 0] + half_size, 0, w).astype(int)
+        y1 = np.clip(centers[:, 1] + half_size, 0, h).astype(int)
+        return list(zip(x0, y0, x1, y1))
 
     def correct(self, x, y, frame):
         """Corrects the coordinates.
@@ -170,49 +573,103 @@ class TrackerGame(Tracker):
         return (int(round((x - offset_x) * (scale0 + scale1 * dist) + offset_x)),
                 int(round((y - offset_y) * (scale0 + scale1 * dist) + offset_y)))
 
+    def reverse_correct(self, points, frame):
+        """Reverses the correction of the coordinates.
+        Args:
+            points (np.ndarray): array of corrected (x, y) coordinates with shape (N, 2)
+            frame: frame object
+        Returns:
+            np.ndarray: reverted coordinates with shape (N, 2)
+        """
+
+        # Scaling factors
+        scale0 = self.tracker_config['camera']['scale0']
+        scale1 = self.tracker_config['camera']['scale1']
+
+        # Convert screen coordinates to 0-based coordinates
+        offset = np.array([frame.shape[1] / 2, frame.shape[0] / 2])
+
+        # Calculate distance from center
+        dist = np.linalg.norm(points - offset, axis=1, keepdims=True)
+
+        # Find the distance before correction
+        if scale1 == 0:
+            dist_old = dist / scale0
+        else:
+            dist_old = (-scale0 + np.sqrt(scale0 ** 2 + 4 * dist * scale1)) / (2 * scale1)
+
+        # Revert coordinates and return
+        return (points - offset) / (scale0 + scale1 * dist_old) + offset
+
+    def correct_points(self, points, frame):
+        """Corrects an array of coordinates, same as correct but for all points at once.
+        Args:
+            points (np.ndarray): array of (x, y) coordinates with shape (N, 2)
+            frame: frame object
+        Returns:
+            np.ndarray: corrected coordinates with shape (N, 2)
+        """
+
+        # Scaling factors
+        scale0 = self.tracker_config['camera']['scale0']
+        scale1 = self.tracker_config['camera']['scale1']
+
+        # Convert screen coordinates to 0-based coordinates
+        offset = np.array([frame.shape[1] / 2, frame.shape[0] / 2])
+
+        # Calculate distance from center
+        dist = np.linalg.norm(points - offset, axis=1, keepdims=True)
+
+        # Correct coordinates and return
+        return (points - offset) * (scale0 + scale1 * dist) + offset
+
     def get_mass_center(self, corners, ids, frame):
         """Computes mass centers of objects in the frame.
+        All markers are processed at once, with a single perspective transform for centers and tops.
         Args:
             corners (2d array of float): corners of each object in the frame
             ids (2d array of int): aruco tag ids
             frame: frame object
         Returns:
-            List[int, Tuple[float, float, float, float]]: List of aruco tag ids with object center and top coordinates
-        """
-        mass_centers = []
-        for i, o in enumerate(corners):
-            x1 = o[0][0][0]
-            y1 = o[0][0][1]
-            x2 = o[0][1][0]
-            y2 = o[0][1][1]
-            x3 = o[0][2][0]
-            y3 = o[0][2][1]
-            x4 = o[0][3][0]
-            y4 = o[0][3][1]
-
-            # A=1/2*(x1*y2-x2*y1+x2*y3-x3*y2+x3*y4-x4*y3+x4*y1-x1*y4);
-            # Cx=1/(6*A)*((x1+x2)*(x1*y2-x2*y1)+ \
-            # (x2+x3)*(x2*y3-x3*y2)+ \
-            # (x3+x4)*(x3*y4-x4*y3)+ \
-            # (x4+x1)*(x4*y1-x1*y4))
-            (Cx, Cy) = self.move_origin(
-                *self.correct((x1 + x2 + x3 + x4) / 4, (y1 + y2 + y3 + y4) / 4, frame),
-                self.transformation_matrix
+            Tuple[np.ndarray, np.ndarray]: aruco tag ids with shape (N,) and object center and top coordinates
+                (x, y, x_top, y_top) with shape (N, 4)
+        """
+        if ids is None or len(ids) == 0:
+            return np.empty(0, np.int32), np.empty((0, 4), np.int32)
 
-            )
-            (CxTop, CyTop) = self.move_origin(
-                *self.correct((x1 + x2) / 2, (y1 + y2) / 2, frame),
-                self.transformation_matrix
-            )
-            mass_centers.append([ids[i][0], (Cx, Cy, CxTop, CyTop)])
+        c = np.asarray(corners, np.float64).reshape(-1, 4, 2)
+        n = len(c)
 
-        return mass_centers
+        # Centers and top edge midpoints, corrected in one array
+        points = np.empty((2 * n, 2))
+        points[:n] = (c[:, 0] + c[:, 1] + c[:, 2] + c[:, 3]) / 4
+        points[n:] = (c[:, 0] + c[:, 1]) / 2
+        points = np.rint(self.correct_points(points, frame))
+
+        # Move origin of all points with one transform
+        points = np.rint(self.move_origin_points(points, self.transformation_matrix))
+
+        return np.asarray(ids, np.int32).reshape(-1), np.hstack((points[:n], points[n:])).astype(np.int32)
 
     def is_valid_pos(self, pos):
         return self.tracker_config['pos_limit_x'][0] <= pos[0] <= self.tracker_config['pos_limit_x'][1] and \
             self.tracker_config['pos_limit_y'][0] <= pos[1] <= self.tracker_config['pos_limit_y'][1]
 
-    def on_key_press(self):
-        # Detect key press
-        key_pressed = cv2.waitKey(1) & 0xFF
-        self.should_quit = key_pressed == ord(ResKeys.quitKey)
\ No newline at end of file
+    def valid_positions(self, positions):
+        """Same as is_valid_pos for an array of positions with shape (N, 2) or (N, 4)"""
+        x = positions[:, 0]
+        y = positions[:, 1]
+        return (self.tracker_config['pos_limit_x'][0] <= x) & (x <= self.tracker_config['pos_limit_x'][1]) & \
+            (self.tracker_config['pos_limit_y'][0] <= y) & (y <= self.tracker_config['pos_limit_y'][1])
+
+    def frame_objects(self, frame):
+        """Maps tracked objects back to frame coordinates for drawing.
+        Args:
+            frame: preprocessed frame
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: ids, centers (N, 2) and tops (N, 2)
+        """
+        slots = self.bank.active_slots()
+        points = self.bank.bounding_box[slots].reshape(-1, 2)
+        points = self.reverse_correct(self.reverse_move_origin(points, self.transformation_matrix), frame)
+        return self.bank.ids[slots], points[0::2], points[1::2]
\ No newline at end of file
@@ -1,10 +1,5 @@
-import getopt
-import json
-import os
-import pickle
 import sys
 from timeit import default_timer as timer
-from typing import List
 
 import numpy as np
 
@@ -12,7 +7,6 @@ from sledilnik.Resources import ResKeys
 from sledilnik.Tracker import Tracker
 from sledilnik.classes.Field import Field
 from sledilnik.classes.Point import Point
-from sledilnik.classes.VideoStreamer import VideoStreamer
 from sledilnik.draw_utils import *
 
 
@@ -28,9 +22,8 @@ class TrackerSetup(Tracker):
 
         self.fields_corners = []
         self.fields = {}
-        if os.path.isfile(self.tracker_config['fields_path']):
-            print(f'Loading fields from {self.tracker_config["fields_path"]}')
-            saved_fields = pickle.load(open(self.tracker_config['fields_path'], 'rb'))
+        saved_fields = self.load_fields()
+        if saved_fields is not None:
             self.fields_corners = saved_fields['fields_corners']
             self.fields = saved_fields['fields']
 
@@ -46,22 +39,20 @@ class TrackerSetup(Tracker):
 
     def start(self):
         # Load video
-        cap = VideoStreamer()
-        cap.start(self.tracker_config['video_source'])
+        cap = self.open_video()
 
         # Create window
         cv2.namedWindow(ResGUIText.sWindowName, cv2.WINDOW_NORMAL)
 
         ts = timer()
-        while not self.should_quit and cap.running:
+        while not self.should_quit:
 
             # Load frame-by-frame
             frame, timestamp = cap.read()
             if frame is None:
                 if self.debug:
                     cap.stop()
-                    cap = VideoStreamer()
-                    cap.start(self.tracker_config['video_source'])
+                    cap = self.open_video()
                     continue
                 break
 
@@ -148,15 +139,12 @@ class TrackerSetup(Tracker):
 
             self.fields[field_name] = Field(*field)
 
-        with open(self.tracker_config['fields_path'], 'wb') as output:
-            pickle.dump(
-                {
-                    'transformation_matrix': transformation_matrix,
-                    'fields_corners': self.fields_corners,
-                    'fields': self.fields
-                },
-                output,
-                pickle.HIGHEST_PROTOCOL
-            )
+        self.write_fields(
+            {
+                'transformation_matrix': transformation_matrix,
+                'fields_corners': self.fields_corners,
+                'fields': self.fields
+            }
+        )
 
         print(self.fields)
@@ -0,0 +1,172 @@
+"""Provides CalibrationBundle class which stores fields and camera calibration in a versioned numpy file"""
+import os
+import pickle
+import tempfile
+import zipfile
+from typing import Dict, Tuple
+
+import numpy as np
+
+from sledilnik.classes.Field import Field
+from sledilnik.classes.Point import Point
+
+
+class CalibrationBundle:
+    """Holds the transformation matrix, clicked field corners, fields and optional undistortion maps.
+
+    The bundle is an uncompressed .npz file, so it is loaded without unpickling and every array can be memory mapped
+    straight from the file. Undistortion maps are only used when they were built for the same camera config, which
+    is checked with Undistorter.key.
+    """
+
+    VERSION = 1
+    MMAP_SIZE = 65536
+
+    def __init__(self, transformation_matrix, fields_corners, fields: Dict[str, Field], undistort_key=None,
+                 undistort_maps=None):
+        self.transformation_matrix = transformation_matrix
+        self.fields_corners = fields_corners
+        self.fields: Dict[str, Field] = fields
+        self.undistort_key = undistort_key
+        self.undistort_maps: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray, Tuple[int, int, int, int]]] = \
+            undistort_maps or {}
+
+    @staticmethod
+    def is_bundle(path):
+        return os.path.splitext(path)[1] == '.npz'
+
+    def to_saved_fields(self):
+        """Returns contents in the same form as the old pickle file"""
+        return {
+            'transformation_matrix': self.transformation_matrix,
+            'fields_corners': self.fields_corners,
+            'fields': self.fields
+        }
+
+    @classmethod
+    def from_saved_fields(cls, saved_fields, undistorter=None):
+        """Creates bundle from contents of the old pickle file.
+        Args:
+            saved_fields (dict): transformation_matrix, fields_corners and fields
+            undistorter (Undistorter): maps already built by the undistorter are included if given
+        """
+        if undistorter is None:
+            return cls(saved_fields['transformation_matrix'], saved_fields['fields_corners'], saved_fields['fields'])
+        return cls(
+            saved_fields['transformation_matrix'],
+            saved_fields['fields_corners'],
+            saved_fields['fields'],
+            undistorter.key,
+            dict(undistorter.maps)
+        )
+
+    def save(self, path):
+        fields_corners = np.array(self.fields_corners).reshape(-1, 2)
+        field_points = np.array([
+            [point.to_tuple() for point in (field.top_left, field.top_right, field.bottom_right, field.bottom_left)]
+            for field in self.fields.values()
+        ]).reshape(-1, 4, 2)
+        arrays = {
+            'version': np.array(self.VERSION),
+            'transformation_matrix': np.asarray(self.transformation_matrix),
+            'fields_corners': fields_corners,
+            'field_names': np.array(list(self.fields.keys()), dtype=str),
+            'field_points': field_points
+        }
+        if self.undistort_key is not None:
+            arrays['undistort_key'] = np.array(self.undistort_key)
+            for (w, h), (map1, map2, roi) in self.undistort_maps.items():
+                arrays[f'undistort_map1_{w}x{h}'] = map1
+                arrays[f'undistort_map2_{w}x{h}'] = map2
+                arrays[f'undistort_roi_{w}x{h}'] = np.array(roi)
+
+        # Uncompressed, so arrays can be memory mapped
+        # Written to a unique temporary file first, so processes saving at the same time do not share it, and arrays
+        # mapped from the old file stay valid after it is replaced
+        fd, temp_path = tempfile.mkstemp('.npz', dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Loads bundle.
+        Args:
+            path (str): path to .npz file
+            mmap (bool): memory map arrays instead of reading them
+        Returns:
+            CalibrationBundle: loaded bundle
+        """
+        arrays = cls.read_arrays(path, mmap)
+        version = int(arrays['version'])
+        if version > cls.VERSION:
+            raise ValueError(f'Calibration bundle {path} has version {version}, only {cls.VERSION} is supported.')
+
+        fields = {
+            str(name): Field(*[Point(*point) for point in points])
+            for name, points in zip(arrays['field_names'].tolist(), arrays['field_points'].tolist())
+        }
+        undistort_maps = {}
+        for name in arrays:
+            if name.startswith('undistort_map1_'):
+                size = name[len('undistort_map1_'):]
+                w, h = (int(v) for v in size.split('x'))
+                undistort_maps[(w, h)] = (
+                    arrays[name],
+                    arrays[f'undistort_map2_{size}'],
+                    tuple(arrays[f'undistort_roi_{size}'].tolist())
+                )
+        return cls(
+            np.array(arrays['transformation_matrix']),
+            arrays['fields_corners'].tolist(),
+            fields,
+            str(arrays['undistort_key']) if 'undistort_key' in arrays else None,
+            undistort_maps
+        )
+
+    @staticmethod
+    def read_arrays(path, mmap=True):
+        """Reads all arrays of an .npz file, large stored arrays are memory mapped if mmap is set"""
+        arrays = {}
+        with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+            for info in archive.infolist():
+                name = info.filename[:-len('.npy')]
+                # Small arrays are cheaper to read than to map
+                small = info.file_size < CalibrationBundle.MMAP_SIZE
+                if not mmap or small or info.compress_type != zipfile.ZIP_STORED:
+                    with archive.open(info) as member:
+                        arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+                    continue
+
+                # Data of a stored member starts after its local header, which has 30 fixed bytes
+                f.seek(info.header_offset + 26)
+                name_length, extra_length = np.frombuffer(f.read(4), '<u2')
+                f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+                version = np.lib.format.read_magic(f)
+                if version == (1, 0):
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+                else:
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+                if dtype.hasobject:
+                    raise ValueError(f'Array {name} in {path} contains objects.')
+                arrays[name] = np.memmap(
+                    path, dtype, 'r', f.tell(), shape, 'F' if fortran_order else 'C'
+                )
+        return arrays
+
+
+def convert_pickle(pickle_path, bundle_path, undistorter=None):
+    """Converts the old pickle file with fields to a calibration bundle.
+    Args:
+        pickle_path (str): path to pickle file
+        bundle_path (str): path to .npz file
+        undistorter (Undistorter): maps already built by the undistorter are included if given, Tracker.load_fields
+            saves the bundle again in the main process once maps for the video size are built
+    """
+    with open(pickle_path, 'rb') as f:
+        saved_fields = pickle.load(f)
+    CalibrationBundle.from_saved_fields(saved_fields, undistorter).save(bundle_path)
@@ -0,0 +1,104 @@
+"""Provides DetectionGate class which filters detections of a frame before they reach the Kalman filters"""
+import numpy as np
+
+
+class DetectionGate:
+    """Drops detections that cannot belong to a tracked object, with array operations over all detections of a frame.
+
+    Detections outside pos_limit_x/y are dropped. A detection of a tracked object is rejected when it is further from
+    the object's last reported center than the object can move since it was last seen (max_speed per frame), by more
+    than sigmas standard deviations of the innovation covariance of its filter. The reported center is the last
+    measurement, or the filter's prediction while the object is not detected. The prediction of a detected object is
+    not used, because with the low process noise of the default kalman_filter settings it lags moving objects by
+    several frames of movement. Of several detections with the same id only the one closest to the reported center is
+    kept, or the first one for ids that are not tracked yet.
+    """
+
+    def __init__(self, pos_limit_x, pos_limit_y, max_speed=150, sigmas=4.0):
+        """
+        Args:
+            pos_limit_x (Tuple[float, float]): smallest and largest valid x
+            pos_limit_y (Tuple[float, float]): smallest and largest valid y
+            max_speed (float): largest distance an object moves between two frames in field units, None disables
+                gating by distance
+            sigmas (float): allowed Mahalanobis distance beyond max_speed
+        """
+        self.lower = np.array([pos_limit_x[0], pos_limit_y[0]])
+        self.upper = np.array([pos_limit_x[1], pos_limit_y[1]])
+        self.max_speed = max_speed
+        self.sigmas = sigmas
+        # Number of detections dropped so far
+        self.out_of_limits = 0
+        self.rejected = 0
+        self.duplicates = 0
+
+    def filter(self, ids, positions, bank, slots, frame_counter):
+        """Filters detections of one frame and matches them to tracked objects.
+        Args:
+            ids (np.ndarray): aruco tag ids with shape (N,)
+            positions (np.ndarray): center and top coordinates with shape (N, 4)
+            bank (KalmanFilterBank): filters of tracked objects
+            slots (np.ndarray): active slots of the bank
+            frame_counter (int): current frame, objects last seen earlier may have moved further
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: kept ids with shape (M,), positions with shape (M, 4) and index
+                into slots of the object of each detection, -1 for ids that are not tracked
+        """
+        centers = positions[:, :2]
+        valid = ((centers >= self.lower) & (centers <= self.upper)).all(axis=1)
+        if not valid.all():
+            self.out_of_limits += len(ids) - np.count_nonzero(valid)
+            ids = ids[valid]
+            positions = positions[valid]
+
+        # Match detections to objects by id
+        index = np.full(len(ids), -1, np.int64)
+        if len(slots) == 0 or len(ids) == 0:
+            return self.first_of_each_id(ids, positions, index, np.zeros(len(ids)))
+        order = np.argsort(bank.ids[slots])
+        sorted_ids = bank.ids[slots][order]
+        i = np.minimum(np.searchsorted(sorted_ids, ids), len(slots) - 1)
+        found = sorted_ids[i] == ids
+        index[found] = order[i[found]]
+
+        # Distance to the reported center orders duplicates, detections of new objects keep their order
+        s = slots[index[found]]
+        innovation = positions[found, :2] - bank.bounding_box[s, :2]
+        distance = np.zeros(len(ids))
+        distance[found] = np.hypot(innovation[:, 0], innovation[:, 1])
+
+        if self.max_speed is not None:
+            # Only detections further than the largest possible movement are measured with the innovation covariance
+            # c (a p a' + ex) c' + ez of their filters, the part of the distance within reach does not count
+            allowed = self.max_speed * np.maximum(frame_counter - bank.last_seen[s], 1)
+            far = distance[found] > allowed
+            if far.any():
+                excess = innovation[far] * (1 - allowed[far] / distance[found][far])[:, None]
+                a = bank.a[:2]
+                cov = a @ bank.p[s[far]] @ a.T + bank.ex[:2, :2] + bank.ez
+                det = cov[:, 0, 0] * cov[:, 1, 1] - cov[:, 0, 1] * cov[:, 1, 0]
+                mahalanobis2 = (cov[:, 1, 1] * excess[:, 0] ** 2 -
+                                (cov[:, 0, 1] + cov[:, 1, 0]) * excess[:, 0] * excess[:, 1] +
+                                cov[:, 0, 0] * excess[:, 1] ** 2) / det
+                reject = np.flatnonzero(found)[far][mahalanobis2 > self.sigmas ** 2]
+                if len(reject):
+                    self.rejected += len(reject)
+                    keep = np.ones(len(ids), bool)
+                    keep[reject] = False
+                    ids, positions, index, distance = ids[keep], positions[keep], index[keep], distance[keep]
+
+        return self.first_of_each_id(ids, positions, index, distance)
+
+    def first_of_each_id(self, ids, positions, index, distance):
+        """Keeps the detection with the smallest distance of each id, the first one on ties"""
+        if len(ids) < 2:
+            return ids, positions, index
+        order = np.lexsort((distance, ids))
+        first = np.empty(len(ids), bool)
+        first[0] = True
+        np.not_equal(ids[order[1:]], ids[order[:-1]], out=first[1:])
+        if first.all():
+            return ids, positions, index
+        self.duplicates += len(ids) - np.count_nonzero(first)
+        keep = np.sort(order[first])
+        return ids[keep], positions[keep], index[keep]
@@ -0,0 +1,118 @@
+"""Provides DetectionLogWriter and DetectionLogReader classes which record raw marker detections for replay"""
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'TDET'
+VERSION = 1
+# magic, version, height and width of detected frames
+FILE_HEADER = struct.Struct('<4sHII')
+# frame index, capture timestamp, number of markers, followed by ids (int32) and corners (float32, 4 x 2 per marker)
+RECORD_HEADER = struct.Struct('<qdI')
+RECORD_MARKER_SIZE = 4 + 4 * 2 * 4
+
+
+class DetectionLogWriter:
+    """Appends detections of every frame to a binary log.
+
+    Records are only ever appended, so a log of a tracker that was killed can still be read up to its last complete
+    record. Frame index and timestamps start over with every run, so running the tracker again with the same path
+    does not continue the log, the existing log is renamed to the first free path.1, path.2, ... (before the
+    extension) and a new log is started.
+    """
+
+    def __init__(self, path, frame_shape):
+        """
+        Args:
+            path (str): path to log file
+            frame_shape (tuple): shape of detected frames, get_mass_center depends on it
+        """
+        self.path = path
+        h, w = frame_shape[:2]
+        if os.path.isfile(path) and os.path.getsize(path) > 0:
+            rotated = self.rotated_path(path)
+            os.replace(path, rotated)
+            print(f'Moved previous detection log to {rotated}')
+        self.file = open(path, 'wb')
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, h, w))
+        self.records = 0
+
+    @staticmethod
+    def rotated_path(path):
+        """Returns the first path.N with the extension kept that does not exist yet"""
+        root, ext = os.path.splitext(path)
+        n = 1
+        while os.path.exists(f'{root}.{n}{ext}'):
+            n += 1
+        return f'{root}.{n}{ext}'
+
+    def append(self, frame_index, timestamp, corners, ids):
+        """Appends detections of one frame.
+        Args:
+            frame_index (int): frame counter of the tracker
+            timestamp (float): capture timestamp
+            corners: corners as returned by aruco.detectMarkers
+            ids: ids as returned by aruco.detectMarkers, None if nothing was detected
+        """
+        if ids is None or len(ids) == 0:
+            self.file.write(RECORD_HEADER.pack(frame_index, timestamp if timestamp is not None else np.nan, 0))
+        else:
+            ids = np.asarray(ids, '<i4').reshape(-1)
+            corners = np.asarray(corners, '<f4').reshape(-1, 4, 2)
+            self.file.write(RECORD_HEADER.pack(
+                frame_index, timestamp if timestamp is not None else np.nan, len(ids)
+            ) + ids.tobytes() + corners.tobytes())
+        self.records += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class DetectionLogReader:
+    """Reads a log written by DetectionLogWriter.
+
+    The whole log is read into memory and records are decoded lazily while iterating, without copying ids and
+    corners out of the buffer. An incomplete last record is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.buffer = f.read()
+        magic, version, h, w = FILE_HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a detection log or has an unsupported version.')
+        self.frame_shape = (h, w)
+
+        # Offsets of complete records
+        self.offsets = []
+        offset = FILE_HEADER.size
+        while offset + RECORD_HEADER.size <= len(self.buffer):
+            count = RECORD_HEADER.unpack_from(self.buffer, offset)[2]
+            end = offset + RECORD_HEADER.size + count * RECORD_MARKER_SIZE
+            if end > len(self.buffer):
+                break
+            self.offsets.append(offset)
+            offset = end
+        self.end = offset
+
+    def frame(self):
+        """Returns a read-only stand-in for detected frames, get_mass_center only uses their shape"""
+        return np.broadcast_to(np.uint8(0), self.frame_shape)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        """Yields (frame index, timestamp, corners with shape (N, 4, 2), ids with shape (N,)) of every record"""
+        buffer = self.buffer
+        for offset in self.offsets:
+            frame_index, timestamp, count = RECORD_HEADER.unpack_from(buffer, offset)
+            offset += RECORD_HEADER.size
+            ids = np.frombuffer(buffer, '<i4', count, offset)
+            corners = np.frombuffer(buffer, '<f4', count * 8, offset + 4 * count).reshape(count, 4, 2)
+            yield frame_index, None if np.isnan(timestamp) else timestamp, corners, ids
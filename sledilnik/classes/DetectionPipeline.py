@@ -0,0 +1,117 @@
+"""Provides DetectionPipeline class which detects markers on many frames in parallel"""
+import multiprocessing
+import os
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# State of a worker process
+_tracker = None
+_slots = None
+
+
+def _init_worker(tracker_config, game_config, slot_names, shape, dtype):
+    global _tracker, _slots
+    from sledilnik.TrackerGame import TrackerGame
+
+    _tracker = TrackerGame(tracker_config, game_config)
+    _slots = []
+    for name in slot_names:
+        shm = shared_memory.SharedMemory(name=name)
+        _slots.append((shm, np.ndarray(shape, dtype, shm.buf)))
+
+
+def _detect(slot, frame_index, timestamp):
+    """Preprocesses frame in a shared memory slot, detects markers and computes their mass centers"""
+    frame = _tracker.preprocess(_slots[slot][1])
+    corners, ids = _tracker.detect_field(frame)
+    ids, positions = _tracker.get_mass_center(corners, ids, frame)
+    corners = np.asarray(corners, np.float32).reshape(-1, 4, 2)
+    return frame_index, timestamp, ids, positions, corners
+
+
+class DetectionPipeline:
+    """Runs grayscale conversion, undistortion, detection and get_mass_center on whole frames in worker processes.
+
+    Frames are copied into a fixed set of shared memory slots, one per frame in flight, so they are never pickled.
+    Results are returned in frame order, so they can be fed to the sequential tracking step. Each worker loads its
+    own TrackerGame from the same config files.
+    """
+
+    def __init__(self, tracker_config, game_config=None, workers=None, max_in_flight=None):
+        self.tracker_config = tracker_config
+        self.game_config = game_config
+        self.workers = workers or os.cpu_count()
+        self.max_in_flight = max(max_in_flight or 2 * self.workers, 1)
+        self.pool = None
+        self.slots = []
+        self.free_slots = deque()
+        self.pending = deque()
+        self.frame_index = 0
+
+    def open(self, frame):
+        """Creates shared memory slots for frames like the given one and starts worker processes"""
+        for _ in range(self.max_in_flight):
+            shm = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+            self.slots.append((shm, np.ndarray(frame.shape, frame.dtype, shm.buf)))
+        self.free_slots.extend(range(self.max_in_flight))
+        self.pool = multiprocessing.Pool(
+            self.workers,
+            _init_worker,
+            (self.tracker_config, self.game_config, [shm.name for shm, _ in self.slots], frame.shape, frame.dtype)
+        )
+
+    def submit(self, frame, timestamp):
+        """Sends frame to a worker, waits for the oldest frame first if too many frames are in flight.
+        Args:
+            frame: BGR frame
+            timestamp (float): capture timestamp
+        Returns:
+            list: results that had to be collected, see collect
+        """
+        if self.pool is None:
+            self.open(frame)
+        results = []
+        while not self.free_slots:
+            results.append(self.collect())
+        slot = self.free_slots.popleft()
+        np.copyto(self.slots[slot][1], frame)
+        self.pending.append((slot, self.pool.apply_async(_detect, (slot, self.frame_index, timestamp))))
+        self.frame_index += 1
+        return results
+
+    def collect(self):
+        """Waits for the oldest frame in flight.
+        Returns:
+            Tuple[int, float, np.ndarray, np.ndarray, np.ndarray]: frame index, timestamp, ids, positions (N, 4) and
+                corners (N, 4, 2)
+        """
+        slot, result = self.pending.popleft()
+        try:
+            return result.get()
+        finally:
+            self.free_slots.append(slot)
+
+    def process(self, frames):
+        """Processes frames and yields results in frame order.
+        Args:
+            frames: iterable of (frame, timestamp)
+        """
+        for frame, timestamp in frames:
+            yield from self.submit(frame, timestamp)
+        while self.pending:
+            yield self.collect()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        shms = [shm for shm, _ in self.slots]
+        self.slots = []
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+        self.free_slots.clear()
+        self.pending.clear()
@@ -1,7 +1,10 @@
-from flask_restx import Api, fields
+from typing import TYPE_CHECKING
 
 from sledilnik.classes.Point import Point
 
+if TYPE_CHECKING:
+    from flask_restx import Api
+
 
 class Field:
     def __init__(self, top_left: Point, top_right: Point, bottom_right: Point, bottom_left: Point):
@@ -27,7 +30,8 @@ class Field:
         )
 
     @classmethod
-    def to_model(cls, api: Api):
+    def to_model(cls, api: 'Api'):
+        from flask_restx import fields
         return api.model('Field', {
             'top_left': fields.Nested(Point.to_model(api), required=True),
             'top_right': fields.Nested(Point.to_model(api), required=True),
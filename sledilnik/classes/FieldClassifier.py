@@ -0,0 +1,39 @@
+"""Provides FieldClassifier class which finds fields that contain each object"""
+from typing import Dict
+
+import numpy as np
+import shapely
+
+from sledilnik.classes.Field import Field
+
+
+class FieldClassifier:
+    """Classifies positions into fields with prepared polygons.
+
+    Membership is returned as a bitmask per position, bit i is set if the position is inside the i-th field in the
+    order of the fields dict. All positions are tested against all fields with one shapely.contains_xy call.
+    """
+
+    MAX_FIELDS = 64
+
+    def __init__(self, fields: Dict[str, Field]):
+        if len(fields) > self.MAX_FIELDS:
+            raise ValueError(f'At most {self.MAX_FIELDS} fields are supported, got {len(fields)}.')
+        self.names = list(fields.keys())
+        corners = np.array([field.to_tuple() for field in fields.values()], np.float64).reshape(-1, 4, 2)
+        self.polygons = shapely.polygons(corners)
+        shapely.prepare(self.polygons)
+        self.bits = np.left_shift(np.uint64(1), np.arange(len(self.names), dtype=np.uint64))
+
+    def classify(self, x, y):
+        """Finds fields that contain each position, positions on the boundary are not inside.
+        Args:
+            x (np.ndarray): x coordinates with shape (N,)
+            y (np.ndarray): y coordinates with shape (N,)
+        Returns:
+            np.ndarray: bitmask of fields with shape (N,) and dtype uint64
+        """
+        if len(self.names) == 0 or len(x) == 0:
+            return np.zeros(len(x), np.uint64)
+        inside = shapely.contains_xy(self.polygons[:, None], x[None, :], y[None, :])
+        return np.bitwise_or.reduce(np.where(inside, self.bits[:, None], np.uint64(0)), axis=0)
@@ -0,0 +1,123 @@
+"""Provides FramePreprocessor class which turns captured frames into detection-ready grayscale frames"""
+import weakref
+
+import cv2
+import numpy as np
+
+from sledilnik.classes.Undistorter import Undistorter
+
+
+class FramePreprocessor:
+    """Converts BGR frames to grayscale, removes lens distortion and optionally processes only a region of interest.
+
+    Output is written into preallocated buffers, so it can run on the capture thread of VideoStreamer, which passes
+    one buffer per slot of its ring. With a region of interest only that part of the output is converted and
+    remapped. Every buffer is blacked out outside the region the first time it is used, so the rest of the buffer
+    stays black. Output frames keep the full (undistorted) size, so coordinates on them do not need an offset.
+    """
+
+    def __init__(self, undistorter: Undistorter = None, roi_function=None):
+        """
+        Args:
+            undistorter (Undistorter): removes distortion if given
+            roi_function: called with the first preprocessed frame, returns region of interest as (x0, y0, x1, y1),
+                the whole frame is processed if None
+        """
+        self.undistorter = undistorter
+        self.roi_function = roi_function
+        self.roi = None
+        # Whole grayscale frame, source of remap, only used by the thread that preprocesses
+        self.gray = None
+        # Buffers that are already black outside the region of interest
+        self.cleared = []
+
+    def __call__(self, frame, dst=None, timer=None):
+        """Preprocesses frame.
+        Args:
+            frame: BGR frame
+            dst: buffer of the output frame from a previous call, a new one is allocated if None
+            timer (StageTimer): records durations of grayscale conversion and undistortion if given, a StageLaps on
+                the capture thread
+        Returns:
+            np.ndarray: grayscale frame
+        """
+        if self.roi is None:
+            # Region of interest is only known once the size of preprocessed frames is known
+            frame = self.preprocess_full(frame, timer)
+            if self.roi_function is not None:
+                self.roi = tuple(int(v) for v in self.roi_function(frame))
+            else:
+                self.roi = (0, 0, frame.shape[1], frame.shape[0])
+            if dst is not None and dst.shape == frame.shape:
+                np.copyto(dst, frame)
+                frame = dst
+            return self.clear_outside_roi(frame)
+
+        x0, y0, x1, y1 = self.roi
+        if self.undistorter is None:
+            dst = self.output_buffer(dst, frame.shape[:2])
+            self.written(
+                dst[y0:y1, x0:x1],
+                cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY, dst=dst[y0:y1, x0:x1])
+            )
+            if timer:
+                timer.lap('cvtColor')
+            return dst
+
+        self.gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        if timer:
+            timer.lap('cvtColor')
+        h, w = self.gray.shape
+        map1, map2, (ux, uy, uw, uh) = self.undistorter.get_maps(w, h)
+        dst = self.output_buffer(dst, (uh, uw))
+        self.written(dst[y0:y1, x0:x1], cv2.remap(
+            self.gray,
+            map1[uy + y0:uy + y1, ux + x0:ux + x1],
+            map2[uy + y0:uy + y1, ux + x0:ux + x1],
+            cv2.INTER_LINEAR,
+            dst=dst[y0:y1, x0:x1]
+        ))
+        if timer:
+            timer.lap('undistort')
+        return dst
+
+    def output_buffer(self, dst, shape):
+        """Returns dst, or a new black buffer of the given shape if None, blacked out outside the region of interest"""
+        if dst is None:
+            dst = np.zeros(shape, np.uint8)
+            self.cleared.append(weakref.ref(dst))
+            return dst
+        return self.clear_outside_roi(dst)
+
+    def clear_outside_roi(self, buffer):
+        """Blacks out the buffer outside the region of interest, once for each buffer"""
+        if any(ref() is buffer for ref in self.cleared):
+            return buffer
+        x0, y0, x1, y1 = self.roi
+        if (x0, y0, x1, y1) != (0, 0, buffer.shape[1], buffer.shape[0]):
+            buffer[:y0] = 0
+            buffer[y1:] = 0
+            buffer[y0:y1, :x0] = 0
+            buffer[y0:y1, x1:] = 0
+        # References to freed buffers are dropped
+        self.cleared = [ref for ref in self.cleared if ref() is not None]
+        self.cleared.append(weakref.ref(buffer))
+        return buffer
+
+    @staticmethod
+    def written(view, result):
+        """Makes sure output of an OpenCV call given dst=view is in view, OpenCV returns a new array instead of
+        writing into dst when it has to reallocate it"""
+        if result is not view:
+            np.copyto(view, result)
+
+    def preprocess_full(self, frame, timer=None):
+        """Converts and undistorts the whole frame"""
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if timer:
+            timer.lap('cvtColor')
+        if self.undistorter is not None:
+            frame = self.undistorter.undistort(frame)
+            if timer:
+                timer.lap('undistort')
+        return frame
@@ -0,0 +1,317 @@
+"""Provides KalmanFilterBank class which runs Kalman filters of all tracked objects at once"""
+from typing import Dict
+
+import numpy as np
+
+
+class KalmanFilterBank:
+    """Stores states and covariances of all tracked objects in contiguous arrays and updates them in batches.
+
+    Each object has two states, q for its center and q2 for its top, which share the same covariance, because the
+    covariance update does not depend on measurements. For the same reason the covariance of an object depends only
+    on the number of updates since it was created, so with steady_state_gain enabled the gains are computed once,
+    cached by age and reused until the covariance converges, after which the steady-state gain is used for all.
+
+    With frame_period set, filters advance by the capture time elapsed since the previous update instead of one dt.
+    Elapsed time is rounded to multiples of dt_bucket * dt and transition and noise matrices are cached per multiple.
+    Cached gains only hold for objects that were always advanced by dt, so objects that went through another step use
+    their own covariances until these converge to the steady state again.
+    """
+
+    def __init__(self, config: Dict, capacity=100):
+        self.dt = config['dt']
+        self.u = config['u']
+        self.acc_noise_magnitude = config['acc_noise_mag']
+        self.steady_state_gain = config.get('steady_state_gain', False)
+
+        # Seconds of capture time per dt, None advances by dt on every update
+        self.frame_period = config.get('frame_period')
+        self.dt_bucket = config.get('dt_bucket', 0.05)
+        self.nominal_bucket = int(round(1 / self.dt_bucket))
+        # Capture timestamp of the last update and matrices of steps other than dt by bucket
+        self.timestamp = None
+        self.transitions = {}
+
+        self.ez = np.array(
+            [
+                [config['measurement_noise_x'], 0],
+                [0, config['measurement_noise_y']]
+            ]
+        )
+        self.a, self.ex = self.matrices(self.dt)
+        self.c = np.array(
+            [
+                [1, 0, 0, 0, 0, 0],
+                [0, 1, 0, 0, 0, 0]
+            ]
+        )
+
+        self.ids = np.full(capacity, -1, np.int64)
+        self.active = np.zeros(capacity, bool)
+        self.q = np.zeros((capacity, 6, 1))
+        self.q2 = np.zeros((capacity, 6, 1))
+        self.p = np.zeros((capacity, 6, 6))
+        self.age = np.zeros(capacity, np.int64)
+        # Whether the covariance of the object is p_table[age], false after steps other than dt
+        self.on_table = np.zeros(capacity, bool)
+        self.bounding_box = np.zeros((capacity, 4))
+        self.direction = np.zeros(capacity)
+        self.last_seen = np.zeros(capacity, np.int64)
+        self.lost_frames = np.zeros(capacity, np.int64)
+        # Bitmask of fields that contain the object, set by the tracker
+        self.fields = np.zeros(capacity, np.uint64)
+
+        # Covariances and gains by age, used with steady_state_gain
+        self.p_table = self.ex[None]
+        self.k_table = np.empty((0, 6, 2))
+        self.converged_age = None
+
+    def matrices(self, dt):
+        """Returns transition matrix and process noise covariance of a step of dt"""
+        ex = np.array(
+            [
+                [dt ** 5 / 20, 0, dt ** 4 / 8, 0, dt ** 3 / 6, 0],
+                [0, dt ** 5 / 20, 0, dt ** 4 / 8, 0, dt ** 3 / 6],
+                [dt ** 4 / 8, 0, dt ** 3 / 3, 0, dt ** 2 / 2, 0],
+                [0, dt ** 4 / 8, 0, dt ** 3 / 3, 0, dt ** 2 / 2],
+                [dt ** 3 / 6, 0, dt ** 2 / 2, 0, dt, 0],
+                [0, dt ** 3 / 6, 0, dt ** 2 / 2, 0, dt]
+            ]
+        ) * self.acc_noise_magnitude ** 2 / 3
+        a = np.array(
+            [
+                [1, 0, dt, 0, dt ** 2 / 2, 0],
+                [0, 1, 0, dt, 0, dt ** 2 / 2],
+                [0, 0, 1, 0, dt, 0],
+                [0, 0, 0, 1, 0, dt],
+                [0, 0, 0, 0, 1, 0],
+                [0, 0, 0, 0, 0, 1]
+            ]
+        )
+        return a, ex
+
+    def step(self, timestamp):
+        """Returns matrices of the step to the given capture timestamp and remembers it as the time of the last update.
+        Args:
+            timestamp (float): capture timestamp, None for a step of dt
+        Returns:
+            Tuple[np.ndarray, np.ndarray, bool]: transition matrix, process noise covariance and whether the step is dt
+        """
+        last = self.timestamp
+        if timestamp is not None:
+            self.timestamp = timestamp
+        if self.frame_period is None or timestamp is None or last is None:
+            return self.a, self.ex, True
+
+        # Repeated frames do not move objects and out of order ones are not moved back
+        bucket = int(round(max(timestamp - last, 0) / self.frame_period / self.dt_bucket))
+        if bucket == self.nominal_bucket:
+            return self.a, self.ex, True
+        matrices = self.transitions.get(bucket)
+        if matrices is None:
+            if len(self.transitions) >= 1024:
+                self.transitions.clear()
+            matrices = self.transitions[bucket] = self.matrices(bucket * self.dt_bucket * self.dt)
+        return matrices[0], matrices[1], False
+
+    @property
+    def capacity(self):
+        return len(self.active)
+
+    def grow(self):
+        """Doubles the capacity of the bank"""
+        for name in ('ids', 'active', 'q', 'q2', 'p', 'age', 'on_table', 'bounding_box', 'direction', 'last_seen',
+                     'lost_frames', 'fields'):
+            array = getattr(self, name)
+            grown = np.zeros((len(array) * 2,) + array.shape[1:], array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+        self.ids[self.capacity // 2:] = -1
+
+    def add(self, object_id, position, velocity=(0, 0, 0, 0), accel=(0, 0, 0, 0)):
+        """Starts tracking an object.
+        Args:
+            object_id (int): aruco tag id
+            position (Tuple[float, float, float, float]): center and top coordinates
+            velocity (Tuple[float, float, float, float]): center and top velocity
+            accel (Tuple[float, float, float, float]): center and top acceleration
+        Returns:
+            int: slot of the object in the bank
+        """
+        free = np.flatnonzero(~self.active)
+        if len(free) == 0:
+            self.grow()
+            free = np.flatnonzero(~self.active)
+        slot = free[0]
+
+        self.ids[slot] = object_id
+        self.active[slot] = True
+        self.q[slot, :, 0] = (position[0], position[1], velocity[0], velocity[1], accel[0], accel[1])
+        self.q2[slot, :, 0] = (position[2], position[3], velocity[2], velocity[3], accel[2], accel[3])
+        self.p[slot] = self.ex
+        self.age[slot] = 0
+        self.on_table[slot] = True
+        self.bounding_box[slot] = position
+        self.direction[slot] = np.arctan2(position[3] - position[1], position[2] - position[0])
+        self.last_seen[slot] = 0
+        self.lost_frames[slot] = 0
+        self.fields[slot] = 0
+        return slot
+
+    def remove(self, slot):
+        self.active[slot] = False
+        self.ids[slot] = -1
+
+    def active_slots(self):
+        return np.flatnonzero(self.active)
+
+    def gains(self, slots, a=None, ex=None):
+        """Computes predicted covariances and Kalman gains for the given slots.
+        With steady_state_gain and no matrices given, gains are taken from the cache by age.
+        Args:
+            slots (np.ndarray): slots of objects
+            a (np.ndarray): transition matrix of the step, the one of dt if not given
+            ex (np.ndarray): process noise covariance of the step, the one of dt if not given
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: predicted covariances (N, 6, 6), None for cached gains, and gains (N, 6, 2)
+        """
+        if a is None:
+            if self.steady_state_gain:
+                age = self.age[slots]
+                self.extend_tables(age.max(initial=0))
+                if self.converged_age is not None:
+                    age = np.minimum(age, self.converged_age)
+                return None, self.k_table[age]
+            a, ex = self.a, self.ex
+
+        p = a @ self.p[slots] @ a.T + ex
+
+        # Closed-form inverse of the 2x2 innovation covariance c p c' + ez
+        s = p[:, :2, :2] + self.ez
+        det = s[:, 0, 0] * s[:, 1, 1] - s[:, 0, 1] * s[:, 1, 0]
+        s_inv = np.empty_like(s)
+        s_inv[:, 0, 0] = s[:, 1, 1]
+        s_inv[:, 0, 1] = -s[:, 0, 1]
+        s_inv[:, 1, 0] = -s[:, 1, 0]
+        s_inv[:, 1, 1] = s[:, 0, 0]
+        s_inv /= det[:, None, None]
+
+        # p c' selects the first two columns of p
+        return p, p[:, :, :2] @ s_inv
+
+    def extend_tables(self, age):
+        """Extends cached covariances and gains up to the given age or until they converge"""
+        if self.converged_age is not None or len(self.k_table) > age:
+            return
+        p_table = list(self.p_table)
+        k_table = list(self.k_table)
+        while self.converged_age is None and len(k_table) <= age:
+            p = self.a @ p_table[-1] @ self.a.T + self.ex
+            k = p[:, :2] @ np.linalg.inv(p[:2, :2] + self.ez)
+            p_next = p - k @ p[:2, :]
+            k_table.append(k)
+            if np.allclose(p_next, p_table[-1], rtol=1e-9, atol=0):
+                self.converged_age = len(k_table) - 1
+            p_table.append(p_next)
+        self.p_table = np.array(p_table)
+        self.k_table = np.array(k_table)
+
+    def update(self, slots, positions, measured, timestamp=None):
+        """Predicts and updates states of the given objects with one batched step.
+        Args:
+            slots (np.ndarray): unique slots of objects
+            positions (np.ndarray): measured center and top coordinates with shape (N, 4), ignored where not measured
+            measured (np.ndarray): boolean mask of objects that were detected
+            timestamp (float): capture timestamp of the measurements, the step is the time elapsed since the last
+                update when frame_period is set
+        """
+        a, ex, nominal = self.step(timestamp)
+        if len(slots) == 0:
+            return
+        positions = np.asarray(positions, np.float64).reshape(-1, 4)
+        measured = np.asarray(measured, bool)
+
+        if not self.steady_state_gain or not nominal:
+            self.update_slots(slots, positions, measured, a, ex)
+            return
+
+        # Objects with covariances of their own are updated apart from objects with cached gains
+        cached = self.on_table[slots]
+        if not cached.all():
+            self.update_slots(slots[~cached], positions[~cached], measured[~cached], a, ex)
+            slots, positions, measured = slots[cached], positions[cached], measured[cached]
+        self.update_slots(slots, positions, measured)
+
+    def update_slots(self, slots, positions, measured, a=None, ex=None):
+        """Same as update with the given step, gains are cached if no matrices are given"""
+        if len(slots) == 0:
+            return
+        p, k = self.gains(slots, a, ex)
+        if a is None:
+            a = self.a
+        q = a @ self.q[slots]
+        q2 = a @ self.q2[slots]
+
+        # Innovations are zero for objects that were not detected
+        y = np.zeros((len(slots), 2, 1))
+        y2 = np.zeros((len(slots), 2, 1))
+        y[measured, :, 0] = positions[measured, 0:2] - q[measured, 0:2, 0]
+        y2[measured, :, 0] = positions[measured, 2:4] - q2[measured, 0:2, 0]
+        self.q[slots] = q + k @ y
+        self.q2[slots] = q2 + k @ y2
+
+        if p is None:
+            age = self.age[slots] + 1
+            if self.converged_age is not None:
+                age = np.minimum(age, self.converged_age + 1)
+            self.p[slots] = self.p_table[age]
+            self.age[slots] += 1
+        else:
+            self.p[slots] = p - k @ p[:, :2, :]
+            self.age[slots] += 1
+            if self.steady_state_gain:
+                # Objects return to cached gains when their covariance converged to the steady state again
+                age = self.age[slots]
+                self.extend_tables(age.max())
+                on_table = np.zeros(len(slots), bool)
+                if self.converged_age is not None:
+                    steady = self.p_table[self.converged_age + 1]
+                    on_table = (age > self.converged_age) & \
+                        (np.abs(self.p[slots] - steady).max(axis=(1, 2)) <= 1e-6 * np.abs(steady).max())
+                self.on_table[slots] = on_table
+
+        bounding_box = np.where(
+            measured[:, None],
+            positions,
+            np.hstack((self.q[slots, 0:2, 0], self.q2[slots, 0:2, 0]))
+        )
+        self.bounding_box[slots] = bounding_box
+        self.direction[slots] = np.arctan2(
+            bounding_box[:, 3] - bounding_box[:, 1],
+            bounding_box[:, 2] - bounding_box[:, 0]
+        )
+
+    def predict(self, slots, timestamp=None):
+        """Predicts bounding boxes without changing the states.
+        Without a timestamp the filter states are predicted one dt ahead. With a capture timestamp, which needs
+        frame_period, the reported bounding boxes are extrapolated with the filtered velocity and acceleration by the
+        time since the last update, which may also be negative. Boxes are extrapolated instead of states, because with
+        low process noise the states lag moving objects.
+        Args:
+            slots (np.ndarray): slots of objects
+            timestamp (float): capture timestamp to predict at
+        Returns:
+            np.ndarray: predicted center and top coordinates with shape (N, 4)
+        """
+        if timestamp is None:
+            q = self.a[:2] @ self.q[slots]
+            q2 = self.a[:2] @ self.q2[slots]
+            return np.hstack((q[:, :, 0], q2[:, :, 0]))
+
+        if self.frame_period is None:
+            raise ValueError('Predicting at a timestamp needs frame_period in kalman_filter config.')
+        t = 0.0 if self.timestamp is None else (timestamp - self.timestamp) / self.frame_period * self.dt
+        box = self.bounding_box[slots].copy()
+        box[:, 0:2] += self.q[slots, 2:4, 0] * t + self.q[slots, 4:6, 0] * (t * t / 2)
+        box[:, 2:4] += self.q2[slots, 2:4, 0] * t + self.q2[slots, 4:6, 0] * (t * t / 2)
+        return box
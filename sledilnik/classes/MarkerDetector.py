@@ -0,0 +1,221 @@
+"""Provides MarkerDetector class which wraps ArUco marker detection"""
+from typing import Dict
+
+import cv2
+import cv2.aruco as aruco
+import numpy as np
+
+
+class MarkerDetector:
+    """Detects ArUco markers on the whole frame, on tiles of the frame or inside search windows"""
+
+    def __init__(self, config: Dict):
+        self.config = config
+        self.dictionary = aruco.getPredefinedDictionary(aruco.DICT_4X4_100)
+        # Perimeter rates passed to the detector, narrowed by set_perimeter_rates
+        self.min_perimeter_rate = config['min_marker_perimeter_rate']
+        self.max_perimeter_rate = config['max_marker_perimeter_rate']
+        # Markers are searched on frames downscaled by this factor, corners are then refined on the full frame
+        self.downscale = config.get('downscale', 1.0)
+        self.refine_window = config.get('corner_refine_window', 3)
+        self.refine_criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_COUNT, 10, 0.05)
+        self.parameters = self.create_parameters()
+        # Parameters scaled for the last region passed to detect_region and for tile sizes of detect_tiles
+        self.region_parameters = (None, None)
+        self.tile_parameters = {}
+
+    def create_parameters(self, scale=1.0):
+        """Creates detector parameters from config.
+        Perimeter rates are relative to the larger image dimension, so when detecting on a window that is smaller
+        than the frame they have to be scaled by frame_size / window_size to keep the same limits in pixels.
+        Args:
+            scale (float): factor for perimeter rates
+        Returns:
+            aruco.DetectorParameters: detector parameters
+        """
+        c = self.config
+        aruco_parameters = aruco.DetectorParameters()
+        aruco_parameters.adaptiveThreshWinSizeMin = c['adaptive_thresh_win_size_min']
+        aruco_parameters.adaptiveThreshWinSizeMax = c['adaptive_thresh_win_size_max']
+        aruco_parameters.adaptiveThreshConstant = c['adaptive_thresh_constant']
+        aruco_parameters.minMarkerPerimeterRate = self.min_perimeter_rate * scale
+        aruco_parameters.maxMarkerPerimeterRate = min(self.max_perimeter_rate * scale, 4.0)
+        aruco_parameters.perspectiveRemovePixelPerCell = c['perspective_remove_pixel_per_cell']
+        aruco_parameters.perspectiveRemoveIgnoredMarginPerCell = c['perspective_remove_ignored_margin_per_cell']
+        aruco_parameters.minMarkerDistanceRate = c['min_marker_distance_rate']
+        return aruco_parameters
+
+    def set_perimeter_rates(self, min_rate, max_rate):
+        """Changes perimeter rates used by all following detections.
+        Args:
+            min_rate (float): smallest marker perimeter relative to the larger frame dimension
+            max_rate (float): largest marker perimeter relative to the larger frame dimension
+        """
+        if (min_rate, max_rate) == (self.min_perimeter_rate, self.max_perimeter_rate):
+            return
+        self.min_perimeter_rate = min_rate
+        self.max_perimeter_rate = max_rate
+        self.parameters = self.create_parameters()
+        self.region_parameters = (None, None)
+        self.tile_parameters = {}
+
+    def detect(self, frame):
+        """Detects markers on the whole frame.
+        Args:
+            frame: grayscale frame
+        Returns:
+            Tuple[tuple, np.ndarray]: corners and ids as returned by aruco.detectMarkers
+        """
+        return self.detect_image(frame, self.parameters)
+
+    def detect_image(self, image, parameters):
+        """Runs aruco.detectMarkers on the image, or on a copy downscaled by downscale.
+        Corners found on the downscaled copy are mapped back to the image and refined with cornerSubPix in windows of
+        2 * corner_refine_window + 1 pixels, so only small patches around the corners are read at full resolution.
+        Args:
+            image: grayscale image
+            parameters (aruco.DetectorParameters): detector parameters
+        Returns:
+            Tuple[tuple, np.ndarray]: corners and ids as returned by aruco.detectMarkers
+        """
+        if self.downscale >= 1.0:
+            corners, ids, _ = aruco.detectMarkers(image, self.dictionary, parameters=parameters)
+            return corners, ids
+
+        h, w = image.shape[:2]
+        size = (max(int(round(w * self.downscale)), 1), max(int(round(h * self.downscale)), 1))
+        small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        corners, ids, _ = aruco.detectMarkers(small, self.dictionary, parameters=parameters)
+        if ids is None:
+            return corners, ids
+
+        # Pixel centers of the downscaled image are half a pixel off the scaled pixel centers of the image
+        scale = np.array([w / size[0], h / size[1]], np.float32)
+        points = (np.concatenate(corners).reshape(-1, 1, 2) + 0.5) * scale - 0.5
+        if self.refine_window > 0:
+            points = cv2.cornerSubPix(
+                image, points, (self.refine_window, self.refine_window), (-1, -1), self.refine_criteria
+            )
+        return tuple(points.reshape(-1, 1, 4, 2)), ids
+
+    def detect_region(self, frame, region):
+        """Detects markers inside one region of the frame and maps corners back to frame coordinates.
+        Unlike detect_windows all detections are kept, so the result is the same as detect on the whole frame when
+        all markers are inside the region.
+        Args:
+            frame: grayscale frame
+            region (Tuple[int, int, int, int]): region as (x0, y0, x1, y1), already clipped to the frame
+        Returns:
+            Tuple[tuple, np.ndarray]: corners and ids in the same format as aruco.detectMarkers
+        """
+        x0, y0, x1, y1 = region
+        if self.region_parameters[0] != (region, frame.shape):
+            scale = max(frame.shape[:2]) / max(x1 - x0, y1 - y0, 1)
+            self.region_parameters = ((region, frame.shape), self.create_parameters(scale))
+        corners, ids = self.detect_image(frame[y0:y1, x0:x1], self.region_parameters[1])
+        if ids is None:
+            return corners, ids
+        offset = np.array([x0, y0], np.float32)
+        return tuple(marker_corners + offset for marker_corners in corners), ids
+
+    def detect_windows(self, frame, windows):
+        """Detects markers only inside search windows and maps corners back to frame coordinates.
+        If the same marker is found in more than one window, only the first detection is kept.
+        Args:
+            frame: grayscale frame
+            windows (List[Tuple[int, int, int, int]]): windows as (x0, y0, x1, y1), already clipped to the frame
+        Returns:
+            Tuple[tuple, np.ndarray]: corners and ids in the same format as aruco.detectMarkers
+        """
+        frame_size = max(frame.shape[:2])
+        corners_all = []
+        ids_all = []
+        for x0, y0, x1, y1 in windows:
+            # Windows clipped at the frame edge can be empty in one dimension only
+            if x1 <= x0 or y1 <= y0:
+                continue
+            window_size = max(x1 - x0, y1 - y0)
+            corners, ids = self.detect_image(frame[y0:y1, x0:x1], self.create_parameters(frame_size / window_size))
+            if ids is None:
+                continue
+            offset = np.array([x0, y0], np.float32)
+            for marker_corners, marker_id in zip(corners, ids):
+                if marker_id[0] in ids_all:
+                    continue
+                corners_all.append(marker_corners + offset)
+                ids_all.append(marker_id[0])
+
+        if not ids_all:
+            return (), None
+        return tuple(corners_all), np.array(ids_all, np.int32).reshape(-1, 1)
+
+    @staticmethod
+    def tiles(region, grid, overlap):
+        """Splits a region into a grid of overlapping tiles.
+        Args:
+            region (Tuple[int, int, int, int]): region as (x0, y0, x1, y1)
+            grid (Tuple[int, int]): number of columns and rows
+            overlap (int): pixels shared by neighbouring tiles, a marker smaller than that is whole in at least one tile
+        Returns:
+            List[Tuple[int, int, int, int]]: tiles as (x0, y0, x1, y1)
+        """
+        x0, y0, x1, y1 = region
+        cols, rows = grid
+        xs = np.linspace(x0, x1, cols + 1).astype(int)
+        ys = np.linspace(y0, y1, rows + 1).astype(int)
+        before = overlap // 2
+        after = overlap - before
+        return [
+            (max(xs[c] - before, x0), max(ys[r] - before, y0), min(xs[c + 1] + after, x1), min(ys[r + 1] + after, y1))
+            for r in range(rows) for c in range(cols)
+        ]
+
+    def detect_tiles(self, frame, tiles, executor=None):
+        """Detects markers on tiles of the frame and maps corners back to frame coordinates.
+        OpenCV releases the GIL while detecting, so tiles are detected in parallel on threads of the executor. A marker
+        inside the overlap of tiles is found in each of them, detections with the same id whose centers are closer
+        than half the marker side are merged into the first one.
+        Args:
+            frame: grayscale frame
+            tiles (List[Tuple[int, int, int, int]]): tiles as (x0, y0, x1, y1), see tiles
+            executor (concurrent.futures.Executor): executor tiles are detected on, None detects them in turn
+        Returns:
+            Tuple[tuple, np.ndarray]: corners and ids in the same format as aruco.detectMarkers
+        """
+        # Parameters are created here, so worker threads only read them
+        frame_size = max(frame.shape[:2])
+        parameters = []
+        for x0, y0, x1, y1 in tiles:
+            scale = frame_size / max(x1 - x0, y1 - y0, 1)
+            if scale not in self.tile_parameters:
+                self.tile_parameters[scale] = self.create_parameters(scale)
+            parameters.append(self.tile_parameters[scale])
+
+        def detect_tile(tile, tile_parameters):
+            x0, y0, x1, y1 = tile
+            corners, ids = self.detect_image(frame[y0:y1, x0:x1], tile_parameters)
+            if ids is None:
+                return None
+            return np.concatenate(corners).reshape(-1, 4, 2) + np.array([x0, y0], np.float32), ids.reshape(-1)
+
+        if executor is None:
+            results = list(map(detect_tile, tiles, parameters))
+        else:
+            results = list(executor.map(detect_tile, tiles, parameters))
+        results = [result for result in results if result is not None]
+        if not results:
+            return (), None
+
+        corners = np.concatenate([corners for corners, _ in results])
+        ids = np.concatenate([ids for _, ids in results])
+        if len(ids) > 1:
+            # Drop detections that have an earlier one with the same id and a close center
+            centers = corners.mean(axis=1)
+            side = np.hypot(*(corners[:, 1] - corners[:, 0]).T)
+            distance = np.hypot(*(centers[:, None] - centers[None, :]).transpose(2, 0, 1))
+            duplicate = (ids[:, None] == ids[None, :]) & (distance < side[:, None] / 2) & \
+                np.tri(len(ids), k=-1, dtype=bool)
+            keep = ~duplicate.any(axis=1)
+            corners = corners[keep]
+            ids = ids[keep]
+        return tuple(corners.reshape(-1, 1, 4, 2)), ids.astype(np.int32).reshape(-1, 1)
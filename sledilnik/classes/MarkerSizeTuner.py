@@ -0,0 +1,81 @@
+"""Provides MarkerSizeTuner class which narrows the marker perimeter range of the detector to the observed markers"""
+import numpy as np
+
+
+class MarkerSizeTuner:
+    """Keeps perimeters of recently detected markers and derives perimeter rates for the detector from them.
+
+    The detector rejects contours whose number of points is outside the perimeter rates times the larger frame
+    dimension, so with bounds close to the real marker size most candidate contours are dropped before they are
+    checked. Perimeters are measured like the contour points are counted, as the sum of the longer axis of each edge.
+    Bounds fall back to the configured range for the next frame when a tracked object was not detected, and for one
+    frame every full_range_interval frames, so markers of other sizes are still found. Observed perimeters are kept
+    over such frames, a single missed marker would otherwise keep the range wide until min_samples are seen again.
+    """
+
+    def __init__(self, min_rate, max_rate, window=300, margin=0.25, min_samples=30, full_range_interval=60):
+        """
+        Args:
+            min_rate (float): configured min_marker_perimeter_rate
+            max_rate (float): configured max_marker_perimeter_rate
+            window (int): number of recent perimeters bounds are computed from
+            margin (float): bounds are this share below the smallest and above the largest perimeter
+            min_samples (int): perimeters needed before bounds are narrowed
+            full_range_interval (int): frames between detections with the configured range, 0 never
+        """
+        self.config_range = (min_rate, max_rate)
+        self.margin = margin
+        self.min_samples = min_samples
+        self.full_range_interval = full_range_interval
+        self.rates = np.empty(window)
+        self.count = 0
+        self.index = 0
+        self.frames = 0
+        self.widened = 0
+
+    @staticmethod
+    def perimeter_rates(corners, frame_shape):
+        """Returns perimeters of markers relative to the larger frame dimension.
+        Args:
+            corners: corners as returned by aruco.detectMarkers
+            frame_shape (tuple): shape of the frame markers were detected on
+        Returns:
+            np.ndarray: perimeter rates with shape (N,)
+        """
+        c = np.asarray(corners, np.float64).reshape(-1, 4, 2)
+        # An 8-connected contour has one point per pixel along the longer axis of each edge
+        edges = np.abs(c - np.roll(c, -1, axis=1)).max(axis=2)
+        return edges.sum(axis=1) / max(frame_shape[:2])
+
+    def observe(self, corners, frame_shape):
+        """Adds perimeters of detected markers"""
+        window = len(self.rates)
+        rates = self.perimeter_rates(corners, frame_shape)[-window:]
+        self.rates[(self.index + np.arange(len(rates))) % window] = rates
+        self.index = (self.index + len(rates)) % window
+        self.count = min(self.count + len(rates), window)
+
+    def update(self, corners, frame_shape, lost):
+        """Observes detections of a frame and returns perimeter rates for the next one.
+        Args:
+            corners: corners of markers detected on the frame
+            frame_shape (tuple): shape of the frame
+            lost (bool): whether a tracked object was not detected
+        Returns:
+            Tuple[float, float]: min and max perimeter rate
+        """
+        self.frames += 1
+        if len(corners):
+            self.observe(corners, frame_shape)
+        if self.count < self.min_samples:
+            return self.config_range
+        if lost or (self.full_range_interval and self.frames % self.full_range_interval == 0):
+            self.widened += 1
+            return self.config_range
+
+        rates = self.rates[:self.count]
+        low, high = self.config_range
+        # Rounded, so small changes of the observed range do not rebuild detector parameters every frame
+        low = max(low, float(np.floor(rates.min() * (1 - self.margin) * 1000)) / 1000)
+        high = min(high, float(np.ceil(rates.max() * (1 + self.margin) * 1000)) / 1000)
+        return low, max(high, low)
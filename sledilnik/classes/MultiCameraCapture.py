@@ -0,0 +1,132 @@
+"""Provides MultiCameraCapture class which detects markers on several cameras in separate processes"""
+import multiprocessing
+import os
+import queue
+import time
+
+import cv2
+
+
+def _run_camera(index, tracker_config, game_config, results, stop):
+    """Captures, preprocesses and detects markers of one camera and puts detections in world coordinates in results.
+    Recorded videos are timestamped by frame rate, cameras by capture time, both shifted by time_offset from the
+    camera config. A message with frame index None marks the end of the stream.
+    """
+    from sledilnik.TrackerGame import TrackerGame
+
+    cap = None
+    try:
+        tracker = TrackerGame(tracker_config, game_config)
+        tracker.debug = False
+        source = tracker.tracker_config['video_source']
+        recorded = isinstance(source, str) and os.path.isfile(source)
+        offset = tracker.tracker_config.get('time_offset', 0)
+
+        cap = tracker.open_video()
+        fps = cap.video.get(cv2.CAP_PROP_FPS) if recorded else 0
+        for frame_index, (frame, timestamp) in enumerate(tracker.read_frames(cap)):
+            if stop.is_set():
+                break
+            capture_time = timestamp
+            if recorded:
+                timestamp = frame_index / fps if fps else float(frame_index)
+            timestamp += offset
+
+            if not tracker.capture_preprocessing:
+                frame = tracker.preprocess(frame)
+            corners, ids = tracker.detect_field(frame)
+            ids, positions = tracker.get_mass_center(corners, ids, frame)
+            results.put((index, frame_index, timestamp, capture_time, ids, positions))
+    finally:
+        if cap is not None:
+            cap.stop()
+        results.put((index, None, None, None, None, None))
+
+
+class MultiCameraCapture:
+    """Runs one process per camera and groups their detections by capture timestamp.
+
+    Each camera has its own tracker config with video_source, fields_path (its own transformation matrix from
+    TrackerSetup), camera, undistort, preprocessing and aruco_detector, so detections arrive already mapped into the
+    shared world frame given by map_virtual_corners. Queues are bounded, so recorded videos are read at the pace of
+    the slowest camera.
+    """
+
+    def __init__(self, camera_configs, game_config=None, max_time_offset=0.02, queue_size=8):
+        self.camera_configs = camera_configs
+        self.game_config = game_config
+        self.max_time_offset = max_time_offset
+        self.queue_size = queue_size
+        self.processes = []
+        self.queues = []
+        self.stop_event = None
+
+    def start(self):
+        self.stop_event = multiprocessing.Event()
+        for index, config in enumerate(self.camera_configs):
+            results = multiprocessing.Queue(self.queue_size)
+            process = multiprocessing.Process(
+                target=_run_camera,
+                args=(index, config, self.game_config, results, self.stop_event),
+                daemon=True
+            )
+            process.start()
+            self.queues.append(results)
+            self.processes.append(process)
+        return self
+
+    def next_detection(self, index):
+        """Waits for the next detection of a camera, returns None when the camera finished or its process died"""
+        while True:
+            try:
+                detection = self.queues[index].get(timeout=1)
+            except queue.Empty:
+                if not self.processes[index].is_alive():
+                    return None
+                continue
+            return detection if detection[1] is not None else None
+
+    def frames(self):
+        """Yields detections of all cameras grouped by timestamp.
+        The group starts at the earliest waiting detection and includes the waiting detection of every camera that
+        is at most max_time_offset later. Cameras without a detection in that range are left out of the group.
+        Yields:
+            Tuple[float, float, list]: timestamp of the group, earliest capture time and list of
+                (camera index, ids, positions) with positions in world coordinates
+        """
+        heads = [None] * len(self.queues)
+        finished = [False] * len(self.queues)
+        while True:
+            for i in range(len(heads)):
+                if heads[i] is None and not finished[i]:
+                    heads[i] = self.next_detection(i)
+                    finished[i] = heads[i] is None
+            waiting = [head for head in heads if head is not None]
+            if not waiting:
+                return
+
+            timestamp = min(head[2] for head in waiting)
+            group = []
+            for i, head in enumerate(heads):
+                if head is not None and head[2] <= timestamp + self.max_time_offset:
+                    group.append(head)
+                    heads[i] = None
+            yield timestamp, min(head[3] for head in group), [(head[0], head[4], head[5]) for head in group]
+
+    def stop(self):
+        if self.stop_event is not None:
+            self.stop_event.set()
+        # Drain queues, so processes blocked on put can exit
+        deadline = time.time() + 5
+        for process, results in zip(self.processes, self.queues):
+            while process.is_alive() and time.time() < deadline:
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            if process.is_alive():
+                process.terminate()
+            process.join()
+            results.cancel_join_thread()
+        self.processes = []
+        self.queues = []
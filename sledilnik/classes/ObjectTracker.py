@@ -1,121 +1,136 @@
 """Provides ObjectTracker class which implements Kalman filter"""
-from math import atan2, pi
-from typing import Dict
+from math import pi
+from typing import TYPE_CHECKING, Dict
 
 import numpy as np
-from flask_restx import Api, fields
-from numpy.linalg import inv
 
+from sledilnik.classes.KalmanFilterBank import KalmanFilterBank
 from sledilnik.classes.Point import Point
 
+if TYPE_CHECKING:
+    from flask_restx import Api
+
 
 class ObjectTracker:
-    """Tracks object using Kalman filter"""
+    """Tracks object using Kalman filter.
+    The filter state is stored in a slot of a KalmanFilterBank, which can be shared by many objects so that they are
+    all updated at once. Without a bank, the object gets its own.
+    """
 
-    def __init__(self, object_id, position, velocity, config: Dict, accel=(0, 0, 0, 0)):
+    def __init__(self, object_id, position, velocity, config: Dict, accel=(0, 0, 0, 0), bank=None):
         self.id = object_id
-        self.position: Point = Point(position[0], position[1])
-        self.bounding_box: tuple[int] = position
-        self.velocity = velocity
-        self.direction = atan2(position[3] - position[1], position[2] - position[0])
-
-        self.q = np.array([[position[0]], [position[1]], [velocity[0]], [velocity[1]], [accel[0]], [accel[1]]])
-        self.q2 = np.array([[position[2]], [position[3]], [velocity[2]], [velocity[3]], [accel[2]], [accel[3]]])
+        self.bank: KalmanFilterBank = bank if bank is not None else KalmanFilterBank(config, 1)
+        self.slot = self.bank.add(object_id, position, velocity, accel)
 
-        self.acc_noise_magnitude = config['acc_noise_mag']
-        self.dt = config['dt']
-        self.u = config['u']
+        self.acc_noise_magnitude = self.bank.acc_noise_magnitude
+        self.dt = self.bank.dt
+        self.u = self.bank.u
         self.detected = True
         self.enabled = True
-        self.last_seen = 0
-        self.lost_frames = 0
-
-        self.ez = np.array(
-            [
-                [config['measurement_noise_x'], 0],
-                [0, config['measurement_noise_y']]
-            ]
-        )
-
-        self.ex = np.array(
-            [
-                [self.dt ** 5 / 20, 0, self.dt ** 4 / 8, 0, self.dt ** 3 / 6, 0],
-                [0, self.dt ** 5 / 20, 0, self.dt ** 4 / 8, 0, self.dt ** 3 / 6],
-                [self.dt ** 4 / 8, 0, self.dt ** 3 / 3, 0, self.dt ** 2 / 2, 0],
-                [0, self.dt ** 4 / 8, 0, self.dt ** 3 / 3, 0, self.dt ** 2 / 2],
-                [self.dt ** 3 / 6, 0, self.dt ** 2 / 2, 0, self.dt, 0],
-                [0, self.dt ** 3 / 6, 0, self.dt ** 2 / 2, 0, self.dt]
-            ]
-        ) * self.acc_noise_magnitude ** 2 / 3
-
-        self.p = self.ex
-        self.pw = self.ex
-
-        self.a = np.array(
-            [
-                [1, 0, self.dt, 0, self.dt ** 2 / 2, 0],
-                [0, 1, 0, self.dt, 0, self.dt ** 2 / 2],
-                [0, 0, 1, 0, self.dt, 0],
-                [0, 0, 0, 1, 0, self.dt],
-                [0, 0, 0, 0, 1, 0],
-                [0, 0, 0, 0, 0, 1]
-            ]
-        )
-        self.b = np.array(
-            [
-                [self.dt ** 2 / 2],
-                [self.dt ** 2 / 2],
-                [self.dt],
-                [self.dt]
-            ]
-        )
-        self.c = np.array(
-            [
-                [1, 0, 0, 0, 0, 0],
-                [0, 1, 0, 0, 0, 0]
-            ]
-        )
 
-    def update_state(self, position):
-        self.q = np.dot(self.a, self.q)  # +self.B*self.u
-        self.q2 = np.dot(self.a, self.q2)  # +self.B*self.u
+    @property
+    def q(self):
+        return self.bank.q[self.slot]
 
-        self.pw = np.dot(np.dot(self.a, self.pw), np.transpose(self.a)) + self.ex
-        self.p = np.dot(np.dot(self.a, self.p), np.transpose(self.a)) + self.ex
+    @property
+    def q2(self):
+        return self.bank.q2[self.slot]
 
-        k = np.dot(np.dot(self.p, np.transpose(self.c)),
-                   inv(np.dot(np.dot(self.c, self.p), np.transpose(self.c)) + self.ez))
-        k2 = np.dot(np.dot(self.pw, np.transpose(self.c)),
-                    inv(np.dot(np.dot(self.c, self.pw), np.transpose(self.c)) + self.ez))
-        if position:
-            q_pos_measurement = np.array([[position[0]], [position[1]]])
-            q_pos_measurement2 = np.array([[position[2]], [position[3]]])
-            self.q = self.q + np.dot(k, q_pos_measurement - np.dot(self.c, self.q))
-            self.q2 = self.q2 + np.dot(k2, q_pos_measurement2 - np.dot(self.c, self.q2))
+    @property
+    def p(self):
+        return self.bank.p[self.slot]
+
+    @property
+    def pw(self):
+        # Covariance of the top is always equal to the covariance of the center
+        return self.bank.p[self.slot]
+
+    @property
+    def a(self):
+        return self.bank.a
+
+    @property
+    def c(self):
+        return self.bank.c
+
+    @property
+    def ex(self):
+        return self.bank.ex
+
+    @property
+    def ez(self):
+        return self.bank.ez
+
+    @property
+    def bounding_box(self):
+        return tuple(self.bank.bounding_box[self.slot].tolist())
 
-        self.p = np.dot(np.eye(6) - np.dot(k, self.c), self.p)
-        self.pw = np.dot(np.eye(6) - np.dot(k2, self.c), self.pw)
-        self.velocity = (self.q[2][0], self.q[3][0])
+    @property
+    def position(self):
+        return Point(*self.bank.bounding_box[self.slot, 0:2].tolist())
 
-        if not position:
-            self.bounding_box = (self.q[0][0], self.q[1][0], self.q2[0][0], self.q2[1][0])
+    @property
+    def velocity(self):
+        return self.bank.q[self.slot, 2, 0], self.bank.q[self.slot, 3, 0]
+
+    @property
+    def direction(self):
+        return float(self.bank.direction[self.slot])
+
+    @property
+    def fields(self):
+        """Bitmask of fields that contain the object, see FieldClassifier"""
+        return int(self.bank.fields[self.slot])
+
+    @property
+    def last_seen(self):
+        return int(self.bank.last_seen[self.slot])
+
+    @last_seen.setter
+    def last_seen(self, value):
+        self.bank.last_seen[self.slot] = value
+
+    @property
+    def lost_frames(self):
+        return int(self.bank.lost_frames[self.slot])
+
+    @lost_frames.setter
+    def lost_frames(self, value):
+        self.bank.lost_frames[self.slot] = value
+
+    def update_state(self, position):
+        if position:
+            self.bank.update(np.array([self.slot]), np.array([position]), np.array([True]))
         else:
-            self.bounding_box = position
+            self.bank.update(np.array([self.slot]), np.zeros((1, 4)), np.array([False]))
+
+    def predict(self, timestamp=None):
+        """Predicts bounding box in the next frame, or at a capture timestamp, without changing the state.
+        Args:
+            timestamp (float): capture timestamp, see KalmanFilterBank.predict
+        Returns:
+            Tuple[float, float, float, float]: predicted center and top coordinates
+        """
+        return tuple(self.bank.predict(np.array([self.slot]), timestamp)[0].tolist())
 
-        self.position = Point(self.bounding_box[0], self.bounding_box[1])
-        self.direction = atan2(self.bounding_box[3] - self.bounding_box[1], self.bounding_box[2] - self.bounding_box[0])
+    def release(self):
+        """Frees the slot of this object in the bank"""
+        self.bank.remove(self.slot)
 
     def to_json(self):
         return {
             "id": int(self.id),
-            "position": Point(self.bounding_box[0], self.bounding_box[1]).to_json(),
-            "dir": float(self.direction * 180 / pi)
+            "position": Point(*self.bank.bounding_box[self.slot, 0:2].tolist()).to_json(),
+            "dir": float(self.bank.direction[self.slot] * 180 / pi)
         }
 
     @classmethod
-    def to_model(cls, api: Api):
+    def to_model(cls, api: 'Api'):
+        from flask_restx import fields
         return api.model('ObjectTracker', {
             'id': fields.Integer,
             'position': fields.Nested(Point.to_model(api)),
-            'dir': fields.Float
+            'dir': fields.Float,
+            # Names of fields the object is in, added by TrackerLiveData.to_json
+            'fields': fields.List(fields.String)
         })
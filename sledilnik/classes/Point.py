@@ -1,4 +1,7 @@
-from flask_restx import Api, fields
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from flask_restx import Api
 
 
 class Point:
@@ -16,7 +19,9 @@ class Point:
         return self.x, self.y
 
     @classmethod
-    def to_model(cls, api: Api):
+    def to_model(cls, api: 'Api'):
+        # Imported here, so the tracker does not import Flask, to_model of Field and ObjectTracker do the same
+        from flask_restx import fields
         return api.model('Point', {
             'x': fields.Integer(required=True, description='x coordinate'),
             'y': fields.Integer(required=True, description='y coordinate'),
@@ -0,0 +1,99 @@
+"""Provides PreviewRenderer class which shows the debug preview without slowing down tracking"""
+import threading
+import time
+
+import cv2
+import cv2.aruco as aruco
+
+from sledilnik.Resources import ResGUIText, ResKeys
+from sledilnik.draw_utils import draw_fps, draw_help, draw_objects
+
+
+class PreviewRenderer:
+    """Draws and shows the latest frame on its own thread at a capped rate.
+
+    The tracker loop only hands over the latest frame, detections and tracked objects. Frames arriving faster than
+    max_fps are skipped before they are copied, so the loop pays for one copy per shown frame and never waits for
+    drawing or the window. All HighGUI calls are made on the renderer thread, which also handles key presses.
+    """
+
+    def __init__(self, window_name=ResGUIText.sWindowName, max_fps=15):
+        self.window_name = window_name
+        self.interval = 1 / max_fps if max_fps else 0
+        self.condition = threading.Condition()
+        self.pending = None
+        self.last_submit = 0
+        self.running = False
+        self.should_quit = False
+        self.thread = None
+
+        # Tracking rate shown on the preview
+        self.frames = 0
+        self.fps = 0
+        self.fps_start = time.perf_counter()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, args=())
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def submit(self, frame, corners, ids, objects=None):
+        """Hands over the state of the current frame, does nothing if the previous one was shown too recently.
+        Args:
+            frame: grayscale frame, copied because capture reuses its buffer
+            corners: corners of detected markers
+            ids: ids of detected markers
+            objects: callable returning tracked objects as (ids, centers, tops) in frame coordinates, only called
+                for frames that are shown
+        """
+        now = time.perf_counter()
+        self.frames += 1
+        if now - self.fps_start >= 1:
+            self.fps = self.frames / (now - self.fps_start)
+            self.frames = 0
+            self.fps_start = now
+        if now - self.last_submit < self.interval:
+            return
+        self.last_submit = now
+
+        state = (frame.copy(), corners, ids, objects() if objects is not None else None, self.fps)
+        with self.condition:
+            self.pending = state
+            self.condition.notify_all()
+
+    def run(self):
+        cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
+        try:
+            while self.running:
+                with self.condition:
+                    self.condition.wait_for(lambda: self.pending is not None or not self.running, self.interval or 0.1)
+                    state, self.pending = self.pending, None
+                if state is not None:
+                    cv2.imshow(self.window_name, self.draw(*state))
+
+                # Detect key press, also keeps the window responsive
+                key_pressed = cv2.waitKey(1) & 0xFF
+                if key_pressed == ord(ResKeys.quitKey):
+                    self.should_quit = True
+        finally:
+            cv2.destroyWindow(self.window_name)
+
+    @staticmethod
+    def draw(frame, corners, ids, objects, fps):
+        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        aruco.drawDetectedMarkers(frame, corners, ids)
+        if objects is not None:
+            draw_objects(frame, *objects)
+        draw_fps(frame, fps)
+        draw_help(frame)
+        return frame
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        return
@@ -0,0 +1,112 @@
+"""Provides SharedStateMailbox class which publishes the latest tracker state through shared memory"""
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from sledilnik.classes.TrackerSnapshot import SNAPSHOT_DTYPE, TrackerSnapshot
+
+HEADER_DTYPE = np.dtype([
+    ('seq', '<u8'),
+    ('count', '<u4'),
+    ('truncated', '<u4'),
+    ('timestamp', '<f8'),
+    ('delay', '<f8'),
+])
+
+
+class SharedStateMailbox:
+    """Holds only the latest tracker state in a fixed-layout shared memory record.
+
+    The writer never blocks and never queues, so a slow reader cannot make memory or latency grow. The record is
+    guarded by a sequence counter (seqlock): the writer makes it odd before writing and even after, and readers retry
+    whenever the counter was odd or changed while copying. Readers count records that were overwritten before they
+    read them. The mailbox can be passed to another process, which attaches to the same shared memory.
+    """
+
+    def __init__(self, capacity=100, name=None):
+        self.capacity = capacity
+        size = HEADER_DTYPE.itemsize + capacity * SNAPSHOT_DTYPE.itemsize
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.owner = True
+        self.attach()
+        self.header['seq'] = 0
+
+    def attach(self):
+        self.header = np.ndarray((), HEADER_DTYPE, self.shm.buf, 0)
+        self.objects = np.ndarray((self.capacity,), SNAPSHOT_DTYPE, self.shm.buf, HEADER_DTYPE.itemsize)
+        self.last_seq = 0
+        self.received = 0
+        self.overwritten = 0
+
+    def __getstate__(self):
+        return {'name': self.shm.name, 'capacity': self.capacity}
+
+    def __setstate__(self, state):
+        self.capacity = state['capacity']
+        # Child processes share the resource tracker of the creator, which unlinks the shared memory in close
+        self.shm = shared_memory.SharedMemory(name=state['name'])
+        self.owner = False
+        self.attach()
+
+    @property
+    def published(self):
+        """Number of records published so far"""
+        return int(self.header['seq']) // 2
+
+    def publish(self, data):
+        """Writes tracked objects of TrackerLiveData into the mailbox.
+        Args:
+            data (TrackerLiveData): live data with a KalmanFilterBank
+        """
+        bank = data.bank
+        slots = bank.active_slots()
+        count = min(len(slots), self.capacity)
+
+        seq = int(self.header['seq'])
+        self.header['seq'] = seq + 1
+
+        self.header['count'] = count
+        self.header['truncated'] = len(slots) - count
+        self.header['timestamp'] = data.timestamp if data.timestamp is not None else np.nan
+        self.header['delay'] = data.delay if data.delay is not None else np.nan
+        TrackerSnapshot.fill_rows(self.objects[:count], bank, slots[:count], data.timestamp)
+
+        self.header['seq'] = seq + 2
+
+    def read(self, timeout=None):
+        """Reads the latest record.
+        Args:
+            timeout (float): seconds to wait for a record newer than the last one read, None waits forever and 0
+                returns the latest record even if it was already read
+        Returns:
+            TrackerSnapshot: snapshot with the sequence number of the record, or None if nothing new arrived in time
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            seq = int(self.header['seq'])
+            if seq % 2 == 0 and (seq > self.last_seq or (timeout == 0 and seq > 0)):
+                header = self.header.copy()
+                objects = self.objects[:min(int(header['count']), self.capacity)].copy()
+                if int(self.header['seq']) == seq:
+                    if seq > self.last_seq:
+                        self.overwritten += max((seq - self.last_seq) // 2 - 1, 0)
+                        self.received += 1
+                        self.last_seq = seq
+                    return TrackerSnapshot(
+                        objects,
+                        None if np.isnan(header['timestamp']) else float(header['timestamp']),
+                        None if np.isnan(header['delay']) else float(header['delay']),
+                        seq // 2
+                    )
+                continue
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(0.0005)
+
+    def close(self):
+        self.header = None
+        self.objects = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
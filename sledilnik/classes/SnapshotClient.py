@@ -0,0 +1,205 @@
+"""Provides SnapshotClient and SyncSnapshotClient classes which subscribe to a SnapshotPublisher"""
+import asyncio
+import json
+import threading
+
+from sledilnik.classes.SnapshotDelta import DeltaDecoder
+from sledilnik.classes.SnapshotPublisher import KIND_DELTA, KIND_FIELDS, KIND_SNAPSHOT, MESSAGE_HEADER
+from sledilnik.classes.TrackerSnapshot import TrackerSnapshot
+
+
+class _SubscriberProtocol(asyncio.Protocol):
+    """Reads messages as they arrive and keeps only the newest snapshot, deltas are applied as they arrive"""
+
+    def __init__(self, client):
+        self.client = client
+        self.buffer = bytearray()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.buffer += data
+        client = self.client
+        offset = 0
+        while len(self.buffer) - offset >= MESSAGE_HEADER.size:
+            length, kind = MESSAGE_HEADER.unpack_from(self.buffer, offset)
+            # Length counts the kind byte and the payload
+            end = offset + 4 + length
+            if len(self.buffer) < end:
+                break
+            payload = bytes(self.buffer[offset + MESSAGE_HEADER.size:end])
+            offset = end
+            if kind == KIND_FIELDS:
+                client.fields = json.loads(payload)
+            elif kind == KIND_SNAPSHOT or kind == KIND_DELTA:
+                if kind == KIND_DELTA:
+                    payload = client.decoder.decode(payload)
+                    if payload is None:
+                        continue
+                client.received += 1
+                if client.latest is not None:
+                    client.skipped += 1
+                client.latest = payload
+        del self.buffer[:offset]
+        if client.latest is not None:
+            client.ready.set()
+
+    def connection_lost(self, exc):
+        self.client.closed = True
+        self.client.ready.set()
+
+
+class SnapshotClient:
+    """Asyncio client of SnapshotPublisher.
+
+    Messages are read as soon as they arrive and only the newest snapshot is kept, so a slow consumer always gets
+    the latest state instead of working through a backlog. Use as
+
+        async with SnapshotClient(port=5555) as client:
+            async for snapshot in client:
+                ...
+
+    Counters: received snapshots, skipped snapshots (received but replaced by a newer one before they were read) and
+    missed snapshots (dropped by the publisher, seen as gaps in sequence numbers). Deltas are rebuilt into full
+    snapshots by a DeltaDecoder, snapshots that arrive while it waits for a keyframe are counted as missed.
+    """
+
+    def __init__(self, host='127.0.0.1', port=None, unix_path=None):
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.transport = None
+        self.ready = asyncio.Event()
+        self.latest = None
+        self.closed = False
+        self.fields = None
+        self.decoder = DeltaDecoder()
+        self.last_seq = None
+        self.received_at_read = 0
+        self.received = 0
+        self.skipped = 0
+        self.missed = 0
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        if self.unix_path is not None:
+            self.transport, _ = await loop.create_unix_connection(lambda: _SubscriberProtocol(self), self.unix_path)
+        else:
+            self.transport, _ = await loop.create_connection(lambda: _SubscriberProtocol(self), self.host, self.port)
+        return self
+
+    async def read(self):
+        """Waits for a snapshot newer than the last one read.
+        Returns:
+            TrackerSnapshot: newest snapshot, None when the connection closed
+        """
+        while self.latest is None:
+            if self.closed:
+                return None
+            self.ready.clear()
+            await self.ready.wait()
+        snapshot, self.latest = self.latest, None
+        if not isinstance(snapshot, TrackerSnapshot):
+            snapshot = TrackerSnapshot.decode(snapshot)
+        # Snapshots published since the last read that were not received here were dropped by the publisher
+        if self.last_seq is not None:
+            self.missed += snapshot.seq - self.last_seq - (self.received - self.received_at_read)
+        self.last_seq = snapshot.seq
+        self.received_at_read = self.received
+        return snapshot
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        snapshot = await self.read()
+        if snapshot is None:
+            raise StopAsyncIteration
+        return snapshot
+
+    async def close(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+class SyncSnapshotClient:
+    """Blocking wrapper of SnapshotClient, which runs it on a background thread.
+
+    read returns the newest snapshot like SharedStateMailbox.read, iterating yields snapshots until the connection
+    closes.
+    """
+
+    def __init__(self, host='127.0.0.1', port=None, unix_path=None):
+        self.client = None
+        self.condition = threading.Condition()
+        self.latest = None
+        self.finished = False
+        self.loop = asyncio.new_event_loop()
+        connected = threading.Event()
+        error = []
+
+        async def run():
+            try:
+                self.client = await SnapshotClient(host, port, unix_path).connect()
+            except Exception as e:
+                error.append(e)
+                return
+            finally:
+                connected.set()
+            async for snapshot in self.client:
+                with self.condition:
+                    self.latest = snapshot
+                    self.condition.notify_all()
+
+        def target():
+            try:
+                self.loop.run_until_complete(run())
+            finally:
+                with self.condition:
+                    self.finished = True
+                    self.condition.notify_all()
+
+        self.thread = threading.Thread(target=target)
+        self.thread.daemon = True
+        self.thread.start()
+        connected.wait()
+        if error:
+            raise error[0]
+
+    @property
+    def fields(self):
+        return self.client.fields
+
+    def read(self, timeout=None):
+        """Waits for a snapshot newer than the last one read.
+        Args:
+            timeout (float): seconds to wait, None waits until a snapshot arrives or the connection closes
+        Returns:
+            TrackerSnapshot: newest snapshot, None on timeout or when the connection closed
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.latest is not None or self.finished, timeout)
+            snapshot, self.latest = self.latest, None
+            return snapshot
+
+    def __iter__(self):
+        while True:
+            snapshot = self.read()
+            if snapshot is None:
+                return
+            yield snapshot
+
+    def close(self):
+        if self.client is not None and not self.finished:
+            asyncio.run_coroutine_threadsafe(self.client.close(), self.loop).result()
+        self.thread.join()
+        self.loop.close()
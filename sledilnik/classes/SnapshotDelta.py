@@ -0,0 +1,186 @@
+"""Provides DeltaEncoder and DeltaDecoder classes which send only objects that changed since the previous message"""
+import struct
+from math import cos, radians
+
+import numpy as np
+
+from sledilnik.classes.TrackerSnapshot import SNAPSHOT_DTYPE, TrackerSnapshot
+
+REMOVED_DTYPE = np.dtype('<i4')
+
+
+def _sorted_by_id(objects):
+    return objects[np.argsort(objects['id'], kind='stable')]
+
+
+def _find(sorted_ids, ids):
+    """Finds ids in sorted unique ids, faster than np.isin for a few objects.
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: index of each id in sorted_ids (0 if missing) and mask of found ids
+    """
+    if len(sorted_ids) == 0:
+        return np.zeros(len(ids), np.intp), np.zeros(len(ids), bool)
+    index = np.searchsorted(sorted_ids, ids)
+    index[index == len(sorted_ids)] = 0
+    return index, sorted_ids[index] == ids
+
+
+class DeltaEncoder:
+    """Encodes a stream of snapshots as keyframes with all objects and deltas with only the objects that changed.
+
+    An object is sent in a delta if it is new, if its center moved more than position_threshold or its direction
+    turned more than direction_threshold since it was last sent, or if it got lost, found or changed fields. Objects
+    that are no longer tracked are sent as removed ids. Changes are measured against the state the decoder holds, so
+    small movements add up until they are sent and errors never accumulate. Every message names the sequence number
+    of the message before it, so a decoder that missed one waits for the next keyframe instead of drifting.
+    """
+
+    MAGIC = b'TDLT'
+    VERSION = 1
+    # magic, version, keyframe, row size, changed row count, removed id count, sequence number, sequence number of
+    # the previous message, timestamp, delay
+    HEADER = struct.Struct('<4sHBxHxxIIQQdd')
+
+    def __init__(self, keyframe_interval=60, position_threshold=1.0, direction_threshold=1.0):
+        """
+        Args:
+            keyframe_interval (int): frames between keyframes, 0 sends keyframes only on request
+            position_threshold (float): smallest movement of the center that is sent
+            direction_threshold (float): smallest change of direction in degrees that is sent
+        """
+        self.keyframe_interval = keyframe_interval
+        self.position_threshold = position_threshold
+        self.min_cos = np.float32(cos(radians(direction_threshold)))
+        # Objects as the decoder holds them, sorted by id
+        self.reference = None
+        self.last_seq = 0
+        self.since_keyframe = 0
+        self.is_keyframe = False
+        self.keyframes = 0
+
+    def changed(self, objects, reference, index):
+        """Returns mask of objects that differ enough from their rows in reference to be sent"""
+        ref = reference[index]
+        moved = np.hypot(objects['x'] - ref['x'], objects['y'] - ref['y']) > self.position_threshold
+        # Turned more than the threshold in either direction
+        turned = np.cos(objects['dir'] - ref['dir']) < self.min_cos
+        return moved | turned | (objects['fields'] != ref['fields']) | \
+            ((objects['lost_frames'] == 0) != (ref['lost_frames'] == 0))
+
+    def encode(self, snapshot: TrackerSnapshot, keyframe=False) -> bytes:
+        """Encodes snapshot as a keyframe or a delta against the previously encoded snapshots.
+        Args:
+            snapshot (TrackerSnapshot): snapshot with increasing sequence numbers
+            keyframe (bool): send a keyframe even if the interval did not pass
+        Returns:
+            bytes: encoded message, is_keyframe is set if it is a keyframe
+        """
+        objects = _sorted_by_id(snapshot.objects)
+        self.since_keyframe += 1
+        keyframe = keyframe or self.reference is None or \
+            (self.keyframe_interval and self.since_keyframe >= self.keyframe_interval)
+
+        if keyframe:
+            changed = objects
+            removed = np.empty(0, REMOVED_DTYPE)
+            self.reference = objects
+            self.since_keyframe = 0
+            self.keyframes += 1
+        else:
+            reference = self.reference
+            index, known = _find(reference['id'], objects['id'])
+            if known.all():
+                send = self.changed(objects, reference, index)
+            else:
+                send = ~known
+                send[known] = self.changed(objects[known], reference, index[known])
+            changed = objects[send]
+            removed = reference['id'][~_find(objects['id'], reference['id'])[1]].astype(REMOVED_DTYPE)
+
+            # Objects that were not sent stay as the decoder holds them, objects is already a sorted copy
+            kept = ~send
+            objects[kept] = reference[index[kept]]
+            self.reference = objects
+
+        self.is_keyframe = keyframe
+        message = self.HEADER.pack(
+            self.MAGIC,
+            self.VERSION,
+            keyframe,
+            SNAPSHOT_DTYPE.itemsize,
+            len(changed),
+            len(removed),
+            snapshot.seq,
+            self.last_seq,
+            snapshot.timestamp if snapshot.timestamp is not None else np.nan,
+            snapshot.delay if snapshot.delay is not None else np.nan
+        ) + changed.tobytes() + removed.tobytes()
+        self.last_seq = snapshot.seq
+        return message
+
+
+class DeltaDecoder:
+    """Rebuilds full snapshots from messages of DeltaEncoder.
+
+    Deltas are only applied on top of the message they were encoded after. After a missed message the decoder
+    returns None until the next keyframe arrives. Rows keep the timestamp of the frame in which they were last sent.
+    """
+
+    def __init__(self):
+        self.objects = None
+        self.last_seq = None
+        self.keyframes = 0
+        self.deltas = 0
+        self.out_of_sync = 0
+
+    @property
+    def synced(self):
+        return self.objects is not None
+
+    def decode(self, buffer):
+        """Applies a message to the held state.
+        Args:
+            buffer (bytes): message encoded with DeltaEncoder.encode
+        Returns:
+            TrackerSnapshot: all objects after the message, None while waiting for a keyframe
+        """
+        magic, version, keyframe, row_size, count, removed_count, seq, previous_seq, timestamp, delay = \
+            DeltaEncoder.HEADER.unpack_from(buffer)
+        if magic != DeltaEncoder.MAGIC or version != DeltaEncoder.VERSION or row_size != SNAPSHOT_DTYPE.itemsize:
+            raise ValueError('Not a tracker delta or unsupported version.')
+        changed = np.frombuffer(buffer, SNAPSHOT_DTYPE, count, DeltaEncoder.HEADER.size)
+        removed = np.frombuffer(buffer, REMOVED_DTYPE, removed_count, DeltaEncoder.HEADER.size + changed.nbytes)
+
+        if keyframe:
+            self.objects = changed.copy()
+            self.keyframes += 1
+        elif self.objects is None or previous_seq != self.last_seq:
+            # Missed a message, the state can only be rebuilt from a keyframe
+            if self.objects is not None:
+                self.out_of_sync += 1
+            self.objects = None
+            self.last_seq = seq
+            return None
+        else:
+            index, found = _find(self.objects['id'], changed['id'])
+            if len(removed) == 0 and found.all():
+                # Only known objects changed, the previous state is shared with the returned snapshot
+                objects = self.objects.copy()
+                objects[index] = changed
+                self.objects = objects
+            else:
+                ids = self.objects['id']
+                # Changed rows are sorted by id, removed ids are too
+                keep = ~_find(changed['id'], ids)[1]
+                if len(removed):
+                    keep &= ~_find(removed, ids)[1]
+                self.objects = _sorted_by_id(np.concatenate((self.objects[keep], changed)))
+            self.deltas += 1
+        self.last_seq = seq
+
+        return TrackerSnapshot(
+            self.objects,
+            None if np.isnan(timestamp) else timestamp,
+            None if np.isnan(delay) else delay,
+            seq
+        )
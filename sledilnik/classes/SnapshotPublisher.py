@@ -0,0 +1,250 @@
+"""Provides SnapshotPublisher class which serves tracker snapshots to many subscribers over TCP and Unix sockets"""
+import asyncio
+import json
+import os
+import struct
+import threading
+import time
+
+from sledilnik.classes.SnapshotDelta import DeltaEncoder
+from sledilnik.classes.TrackerSnapshot import TrackerSnapshot
+
+# Every message is a length (of kind and payload), a kind and a payload
+MESSAGE_HEADER = struct.Struct('<IB')
+# Payload is JSON with fields, sent once after connecting
+KIND_FIELDS = 0
+# Payload is a snapshot encoded with TrackerSnapshot.encode
+KIND_SNAPSHOT = 1
+# Payload is a keyframe or delta encoded with DeltaEncoder.encode
+KIND_DELTA = 2
+
+
+def encode_message(kind, payload):
+    return MESSAGE_HEADER.pack(len(payload) + 1, kind) + payload
+
+
+class _Subscriber(asyncio.Protocol):
+    """Connection of one subscriber, holds at most one snapshot that could not be sent yet.
+    With delta encoding a delta cannot replace an unsent one, so the subscriber stops receiving deltas until it
+    catches up and gets the next keyframe.
+    """
+
+    def __init__(self, publisher):
+        self.publisher = publisher
+        self.transport = None
+        self.peer = None
+        self.paused = False
+        self.pending = None
+        self.pending_seq = 0
+        self.connected_at = time.time()
+        self.sent = 0
+        self.dropped = 0
+        self.last_sent_seq = 0
+        # Whether deltas can be applied on top of what was sent
+        self.synced = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.peer = transport.get_extra_info('peername') or transport.get_extra_info('sockname')
+        # Once more than write_buffer_size bytes are unsent, newer snapshots are conflated instead of buffered
+        transport.set_write_buffer_limits(self.publisher.write_buffer_size)
+        self.publisher.subscribers.add(self)
+        if self.publisher.fields_message is not None:
+            transport.write(self.publisher.fields_message)
+        self.publisher.keyframe_requested = True
+
+    def connection_lost(self, exc):
+        self.publisher.subscribers.discard(self)
+
+    def data_received(self, data):
+        # Subscribers do not send anything
+        return
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        if self.pending is not None:
+            self.send(self.pending, self.pending_seq)
+            self.pending = None
+        if not self.synced:
+            self.publisher.keyframe_requested = True
+
+    def send(self, message, seq):
+        self.transport.write(message)
+        self.sent += 1
+        self.last_sent_seq = seq
+
+    def offer(self, message, seq, keyframe=True):
+        """Sends snapshot, or keeps it instead of the previous unsent one if the subscriber is behind.
+        Args:
+            message (bytes): encoded message
+            seq (int): sequence number of the snapshot
+            keyframe (bool): False for deltas, which can only follow the message they were encoded after
+        """
+        if keyframe:
+            self.synced = True
+        elif not self.synced:
+            self.dropped += 1
+            return
+        if not self.paused:
+            self.send(message, seq)
+            return
+        if self.pending is not None:
+            if not keyframe:
+                # Deltas cannot be conflated, wait for a keyframe, which is requested once writing resumes
+                self.dropped += 2
+                self.pending = None
+                self.synced = False
+                return
+            self.dropped += 1
+        self.pending = message
+        self.pending_seq = seq
+
+
+class SnapshotPublisher:
+    """Serves the latest tracker state to any number of subscribers.
+
+    Has the same publish method as SharedStateMailbox, so it can be passed to TrackerGame.start. Snapshots are
+    encoded once on the tracker thread and handed to an asyncio loop on a background thread, which writes them to
+    every subscriber. A subscriber that cannot keep up only has the newest unsent snapshot kept for it (latest-value
+    conflation), so it never stalls the tracker or other subscribers. Messages are length prefixed, see
+    SnapshotClient.
+
+    With a DeltaEncoder, snapshots are sent as keyframes and deltas that only contain objects that changed. A
+    keyframe is sent every keyframe_interval frames of the encoder, and sooner when a subscriber connects or catches
+    up after falling behind.
+    """
+
+    def __init__(self, host='127.0.0.1', port=None, unix_path=None, write_buffer_size=65536,
+                 encoder: DeltaEncoder = None):
+        """
+        Args:
+            host (str): TCP host
+            port (int): TCP port, None disables TCP, 0 picks a free port
+            unix_path (str): path of Unix socket, None disables it
+            write_buffer_size (int): bytes buffered per subscriber before its snapshots are conflated
+            encoder (DeltaEncoder): encoder of deltas, None sends every snapshot in full
+        """
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.write_buffer_size = write_buffer_size
+        self.encoder = encoder
+        # Set on the loop thread, read by the next publish
+        self.keyframe_requested = False
+        self.subscribers = set()
+        self.fields_message = None
+        self.seq = 0
+        self.loop = None
+        self.servers = []
+        self.thread = None
+
+    def start(self):
+        """Starts serving on a background thread, returns when sockets are listening"""
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        error = []
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.loop.run_until_complete(self.open_servers())
+            except Exception as e:
+                error.append(e)
+                ready.set()
+                return
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run)
+        self.thread.daemon = True
+        self.thread.start()
+        ready.wait()
+        if error:
+            raise error[0]
+        return self
+
+    async def open_servers(self):
+        if self.port is not None:
+            server = await self.loop.create_server(lambda: _Subscriber(self), self.host, self.port)
+            self.port = server.sockets[0].getsockname()[1]
+            self.servers.append(server)
+            print(f'Publishing snapshots on {self.host}:{self.port}')
+        if self.unix_path is not None:
+            if os.path.exists(self.unix_path):
+                os.unlink(self.unix_path)
+            self.servers.append(await self.loop.create_unix_server(lambda: _Subscriber(self), self.unix_path))
+            print(f'Publishing snapshots on {self.unix_path}')
+
+    def publish(self, data):
+        """Sends tracked objects of TrackerLiveData to all subscribers without waiting for them.
+        Args:
+            data (TrackerLiveData): live data with a KalmanFilterBank
+        """
+        self.seq += 1
+        snapshot = TrackerSnapshot.from_live_data(data, self.seq)
+        if self.encoder is None:
+            message = encode_message(KIND_SNAPSHOT, snapshot.encode())
+            keyframe = True
+        else:
+            keyframe_requested, self.keyframe_requested = self.keyframe_requested, False
+            message = encode_message(KIND_DELTA, self.encoder.encode(snapshot, keyframe_requested))
+            keyframe = self.encoder.is_keyframe
+        fields_message = None
+        if self.fields_message is None:
+            fields_message = encode_message(KIND_FIELDS, json.dumps(data.fields_to_json()).encode('utf-8'))
+        self.loop.call_soon_threadsafe(self.broadcast, message, self.seq, fields_message, keyframe)
+
+    def broadcast(self, message, seq, fields_message=None, keyframe=True):
+        if fields_message is not None:
+            self.fields_message = fields_message
+            for subscriber in self.subscribers:
+                subscriber.transport.write(fields_message)
+        for subscriber in self.subscribers:
+            subscriber.offer(message, seq, keyframe)
+
+    def metrics(self):
+        """Returns per subscriber metrics.
+        Returns:
+            List[dict]: peer, seconds connected, snapshots sent and dropped, lag in snapshots behind the newest one
+                and bytes waiting in its write buffer
+        """
+        async def collect():
+            now = time.time()
+            return [
+                {
+                    'peer': str(subscriber.peer),
+                    'connected': now - subscriber.connected_at,
+                    'sent': subscriber.sent,
+                    'dropped': subscriber.dropped,
+                    'lag': self.seq - subscriber.last_sent_seq,
+                    'buffered': subscriber.transport.get_write_buffer_size()
+                }
+                for subscriber in self.subscribers
+            ]
+
+        # Subscribers are only touched on the loop thread
+        return asyncio.run_coroutine_threadsafe(collect(), self.loop).result()
+
+    def close(self):
+        if self.loop is None:
+            return
+
+        async def shutdown():
+            for server in self.servers:
+                server.close()
+            for subscriber in list(self.subscribers):
+                subscriber.transport.close()
+            for server in self.servers:
+                await server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+        self.servers = []
+        if self.unix_path is not None and os.path.exists(self.unix_path):
+            os.unlink(self.unix_path)
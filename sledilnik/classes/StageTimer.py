@@ -0,0 +1,135 @@
+"""Provides StageTimer class which measures how long each stage of the tracker loop takes"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+class StageTimer:
+    """Keeps rolling windows of durations of tracker loop stages and reports their percentiles.
+
+    Durations are measured with a monotonic clock. Call start_frame at the beginning of each frame, lap after each
+    stage and end_frame when the frame is done. Recording a sample only stores one float into a preallocated ring,
+    percentiles are computed when they are reported.
+    """
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, window=1000, log_interval=5.0):
+        self.window = window
+        self.log_interval = log_interval
+        self.samples = {}
+        self.counts = {}
+        self.frame_start = None
+        self.last = None
+        self.last_log = time.perf_counter()
+        self.server = None
+
+    def record(self, stage, seconds):
+        """Stores duration of a stage in seconds"""
+        samples = self.samples.get(stage)
+        if samples is None:
+            samples = self.samples[stage] = np.zeros(self.window)
+            self.counts[stage] = 0
+        count = self.counts[stage]
+        samples[count % self.window] = seconds
+        self.counts[stage] = count + 1
+
+    def start_frame(self):
+        self.frame_start = self.last = time.perf_counter()
+
+    def lap(self, stage):
+        """Records time since the previous lap (or start of the frame) as duration of the stage"""
+        now = time.perf_counter()
+        self.record(stage, now - self.last)
+        self.last = now
+
+    def end_frame(self, delay=None):
+        """Records duration of the whole frame and capture to publish delay, logs summary every log_interval seconds.
+        Args:
+            delay (float): seconds from capture of the frame to publishing its state
+        """
+        now = time.perf_counter()
+        self.record('frame', now - self.frame_start)
+        if delay is not None:
+            self.record('delay', delay)
+        self.last = now
+        if self.log_interval and now - self.last_log >= self.log_interval:
+            self.last_log = now
+            print(self.format())
+
+    def summary(self):
+        """Returns count, mean and percentiles in milliseconds of every stage.
+        Returns:
+            Dict[str, Dict[str, float]]: stage -> {'count', 'mean', 'p50', 'p95', 'p99'}
+        """
+        result = {}
+        for stage, samples in list(self.samples.items()):
+            count = self.counts[stage]
+            values = samples[:min(count, self.window)] * 1000
+            result[stage] = {
+                'count': count,
+                'mean': float(values.mean()),
+                **{f'p{p}': float(v) for p, v in zip(self.PERCENTILES, np.percentile(values, self.PERCENTILES))}
+            }
+        return result
+
+    def format(self):
+        """Returns summary as one log line"""
+        return 'Stage ms p50/p95/p99: ' + ', '.join(
+            f'{stage} {s["p50"]:.2f}/{s["p95"]:.2f}/{s["p99"]:.2f}' for stage, s in self.summary().items()
+        )
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serves summary as JSON over HTTP on a background thread"""
+        timer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(timer.summary()).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                return
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        print(f'Serving stage timings on http://{host}:{self.server.server_address[1]}')
+        return self.server
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class StageLaps:
+    """Measures stages of one frame on another thread, like StageTimer.lap.
+
+    Durations of the frame are kept in a dict that is replaced by start, so a reader on the thread that owns the
+    StageTimer can hold the dict of a previous frame and record it with StageTimer.record while the next frame is
+    measured.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.last = None
+
+    def start(self):
+        self.durations = {}
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        """Stores time since the previous lap (or start) as duration of the stage"""
+        now = time.perf_counter()
+        self.durations[stage] = now - self.last
+        self.last = now
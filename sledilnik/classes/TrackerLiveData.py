@@ -2,17 +2,40 @@ from typing import Dict
 
 from sledilnik.classes import ObjectTracker
 from sledilnik.classes.Field import Field
+from sledilnik.classes.KalmanFilterBank import KalmanFilterBank
+from sledilnik.classes.TrackerSnapshot import TrackerSnapshot
 
 
 class TrackerLiveData:
-    def __init__(self, fields: Dict[int, Field]):
+    def __init__(self, fields: Dict[int, Field], bank: KalmanFilterBank = None):
         self.fields: Dict[int, Field] = fields
         self.objects: Dict[int, ObjectTracker] = {}
+        # Filter bank holding states of all objects, for publishing without going through each ObjectTracker
+        self.bank: KalmanFilterBank = bank
+        self.timestamp = None
         self.delay = None
 
+    def fields_to_json(self):
+        return {str(field_id): field.to_json() for field_id, field in self.fields.items()}
+
+    def predict(self, timestamp):
+        """Returns TrackerSnapshot with all objects extrapolated to a capture timestamp, which can be later than the
+        last frame, so positions can be published at a higher rate than frames are tracked or compensated for delay.
+        Needs frame_period in kalman_filter config.
+        """
+        return TrackerSnapshot.from_live_data(self, timestamp=timestamp)
+
+    def field_names(self, mask):
+        """Returns names of fields in a bitmask of fields, bit i is the i-th field"""
+        return [name for i, name in enumerate(self.fields) if mask >> i & 1]
+
     def to_json(self):
+        objects = {}
+        for object_id, game_object in self.objects.items():
+            objects[str(object_id)] = game_object.to_json()
+            objects[str(object_id)]["fields"] = self.field_names(game_object.fields)
         return {
-            "fields": {str(field_id): field.to_json() for field_id, field in self.fields.items()},
-            "objects": {str(object_id): game_object.to_json() for object_id, game_object in self.objects.items()},
+            "fields": self.fields_to_json(),
+            "objects": objects,
             "delay": self.delay
         }
@@ -0,0 +1,143 @@
+"""Provides TrackerSnapshot class which holds a compact immutable copy of tracked objects"""
+import struct
+from math import pi
+
+import numpy as np
+
+# One row per object, direction is in radians and timestamp is the capture time of the frame, so rows of many
+# snapshots can be concatenated
+SNAPSHOT_DTYPE = np.dtype([
+    ('id', '<i4'),
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('x_top', '<f4'),
+    ('y_top', '<f4'),
+    ('dir', '<f4'),
+    ('vx', '<f4'),
+    ('vy', '<f4'),
+    ('lost_frames', '<i4'),
+    ('timestamp', '<f8'),
+    # Bit i is set if the object is inside the i-th field
+    ('fields', '<u8'),
+])
+
+
+class TrackerSnapshot:
+    """Tracked objects at one moment as a structured numpy array.
+    Fields are static, so they are not part of the snapshot and are sent to consumers once as metadata.
+    """
+
+    __slots__ = ('objects', 'timestamp', 'delay', 'seq')
+
+    MAGIC = b'TSNP'
+    VERSION = 2
+    # magic, version, row size, row count, sequence number, timestamp, delay
+    HEADER = struct.Struct('<4sHHIQdd')
+
+    def __init__(self, objects: np.ndarray, timestamp=None, delay=None, seq=0):
+        objects.flags.writeable = False
+        self.objects: np.ndarray = objects
+        self.timestamp = timestamp
+        self.delay = delay
+        self.seq = seq
+
+    @staticmethod
+    def fill_rows(rows: np.ndarray, bank, slots, timestamp):
+        """Writes states of the given bank slots into rows of SNAPSHOT_DTYPE"""
+        rows['id'] = bank.ids[slots]
+        rows['x'] = bank.bounding_box[slots, 0]
+        rows['y'] = bank.bounding_box[slots, 1]
+        rows['x_top'] = bank.bounding_box[slots, 2]
+        rows['y_top'] = bank.bounding_box[slots, 3]
+        rows['dir'] = bank.direction[slots]
+        rows['vx'] = bank.q[slots, 2, 0]
+        rows['vy'] = bank.q[slots, 3, 0]
+        rows['lost_frames'] = bank.lost_frames[slots]
+        rows['timestamp'] = timestamp if timestamp is not None else np.nan
+        rows['fields'] = bank.fields[slots]
+
+    @classmethod
+    def from_live_data(cls, data, seq=0, timestamp=None):
+        """Creates snapshot from TrackerLiveData by reading its KalmanFilterBank arrays.
+        Args:
+            data (TrackerLiveData): live data with a KalmanFilterBank
+            seq (int): sequence number of the snapshot
+            timestamp (float): capture timestamp objects are extrapolated to, see KalmanFilterBank.predict, the
+                last frame if not given
+        Returns:
+            TrackerSnapshot: snapshot of tracked objects
+        """
+        slots = data.bank.active_slots()
+        objects = np.empty(len(slots), SNAPSHOT_DTYPE)
+        if timestamp is None:
+            cls.fill_rows(objects, data.bank, slots, data.timestamp)
+            return cls(objects, data.timestamp, data.delay, seq)
+
+        cls.fill_rows(objects, data.bank, slots, timestamp)
+        box = data.bank.predict(slots, timestamp)
+        objects['x'] = box[:, 0]
+        objects['y'] = box[:, 1]
+        objects['x_top'] = box[:, 2]
+        objects['y_top'] = box[:, 3]
+        objects['dir'] = np.arctan2(box[:, 3] - box[:, 1], box[:, 2] - box[:, 0])
+        return cls(objects, timestamp, data.delay, seq)
+
+    def encode(self) -> bytes:
+        """Encodes snapshot as a fixed-size header followed by fixed-width rows"""
+        return self.HEADER.pack(
+            self.MAGIC,
+            self.VERSION,
+            SNAPSHOT_DTYPE.itemsize,
+            len(self.objects),
+            self.seq,
+            self.timestamp if self.timestamp is not None else np.nan,
+            self.delay if self.delay is not None else np.nan
+        ) + self.objects.tobytes()
+
+    @classmethod
+    def decode(cls, buffer):
+        """Decodes snapshot encoded with encode. Rows are not copied out of the buffer.
+        Args:
+            buffer (bytes): encoded snapshot
+        Returns:
+            TrackerSnapshot: decoded snapshot
+        """
+        magic, version, row_size, count, seq, timestamp, delay = cls.HEADER.unpack_from(buffer)
+        if magic != cls.MAGIC or version != cls.VERSION or row_size != SNAPSHOT_DTYPE.itemsize:
+            raise ValueError('Not a tracker snapshot or unsupported version.')
+        objects = np.frombuffer(buffer, SNAPSHOT_DTYPE, count, cls.HEADER.size)
+        return cls(
+            objects,
+            None if np.isnan(timestamp) else timestamp,
+            None if np.isnan(delay) else delay,
+            seq
+        )
+
+    def to_json(self, fields=None):
+        """Builds the same structure as TrackerLiveData.to_json straight from columns.
+        Args:
+            fields (dict): optional fields as returned by TrackerLiveData.fields_to_json, names of fields that
+                contain each object are only added if fields are given
+        Returns:
+            dict: JSON serializable dict
+        """
+        o = self.objects
+        objects = {
+            str(object_id): {"id": object_id, "position": {"x": x, "y": y}, "dir": direction}
+            for object_id, x, y, direction in zip(
+                o['id'].tolist(),
+                o['x'].tolist(),
+                o['y'].tolist(),
+                (o['dir'].astype(np.float64) * 180 / pi).tolist()
+            )
+        }
+        result = {"objects": objects, "delay": self.delay}
+        if fields is not None:
+            names = list(fields)
+            for game_object, mask in zip(objects.values(), o['fields'].tolist()):
+                game_object["fields"] = [name for i, name in enumerate(names) if mask >> i & 1]
+            result["fields"] = fields
+        return result
+
+    def __len__(self):
+        return len(self.objects)
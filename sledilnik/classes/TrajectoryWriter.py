@@ -0,0 +1,70 @@
+"""Provides TrajectoryWriter class which stores tracker output as per-column arrays"""
+import os
+import zipfile
+
+import numpy as np
+
+from sledilnik.classes.TrackerSnapshot import SNAPSHOT_DTYPE, TrackerSnapshot
+
+TRAJECTORY_DTYPE = np.dtype([('frame', '<i8')] + [(name, SNAPSHOT_DTYPE[name]) for name in SNAPSHOT_DTYPE.names])
+
+
+class TrajectoryWriter:
+    """Streams one row per object per frame to disk and writes them to a .npz file with one array per column.
+
+    Rows are appended into a preallocated chunk, and every full chunk is appended as raw TRAJECTORY_DTYPE records to
+    path + '.part', so memory does not grow with the length of the video and a run that is killed keeps all flushed
+    rows, readable with np.fromfile(path + '.part', TRAJECTORY_DTYPE). close converts the part file to the .npz
+    file and removes it. Load the result with np.load, e.g. np.load(path)['x'].
+    """
+
+    def __init__(self, path, chunk_size=65536, metadata=None):
+        self.path = path
+        self.part_path = path + '.part'
+        self.chunk_size = chunk_size
+        self.metadata = metadata or {}
+        self.chunk = np.empty(chunk_size, TRAJECTORY_DTYPE)
+        self.length = 0
+        self.frames = 0
+        self.part = open(self.part_path, 'wb')
+
+    def append(self, frame_index, snapshot: TrackerSnapshot):
+        """Appends all objects of a snapshot as rows of the given frame"""
+        self.frames += 1
+        rows = snapshot.objects
+        start = 0
+        while start < len(rows):
+            if self.length == self.chunk_size:
+                self.flush()
+            count = min(len(rows) - start, self.chunk_size - self.length)
+            chunk = self.chunk[self.length:self.length + count]
+            chunk['frame'] = frame_index
+            for name in SNAPSHOT_DTYPE.names:
+                chunk[name] = rows[name][start:start + count]
+            self.length += count
+            start += count
+
+    def flush(self):
+        """Appends rows of the current chunk to the part file"""
+        self.part.write(self.chunk[:self.length].tobytes())
+        self.part.flush()
+        self.length = 0
+
+    def close(self):
+        """Writes all rows to path and removes the part file"""
+        self.flush()
+        self.part.close()
+        if os.path.getsize(self.part_path) > 0:
+            table = np.memmap(self.part_path, TRAJECTORY_DTYPE, 'r')
+        else:
+            table = np.empty(0, TRAJECTORY_DTYPE)
+        columns = {name: table[name] for name in TRAJECTORY_DTYPE.names}
+        columns['frames'] = self.frames
+        columns.update(self.metadata)
+        # Written like np.savez_compressed, but one column at a time, so only one column is copied into memory
+        with zipfile.ZipFile(self.path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, value in columns.items():
+                with archive.open(name + '.npy', 'w', force_zip64=True) as f:
+                    np.lib.format.write_array(f, np.asarray(value), allow_pickle=False)
+        del table, columns
+        os.remove(self.part_path)
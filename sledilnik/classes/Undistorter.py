@@ -0,0 +1,112 @@
+"""Provides Undistorter class which caches undistortion remap tables"""
+import hashlib
+import os
+import tempfile
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+
+
+class Undistorter:
+    """Removes lens distortion using remap tables that are built once per (resolution, camera config) pair.
+
+    Maps are kept in fixed-point form (CV_16SC2 + interpolation table), which is more compact than float maps and
+    makes cv2.remap faster. Maps are cached on disk in cache_dir and loaded the first time they are needed, unless
+    they were already added to maps, e.g. from a calibration bundle.
+    """
+
+    CAMERA_KEYS = ('k1', 'k2', 'k3', 'p1', 'p2', 'fx', 'fy', 'cx', 'cy')
+
+    def __init__(self, camera_config: Dict, cache_dir=None):
+        self.camera_matrix = np.array(
+            [
+                [camera_config['fx'], 0, camera_config['cx']],
+                [0, camera_config['fy'], camera_config['cy']],
+                [0, 0, 1]
+            ]
+        )
+        self.dist_coeffs = np.array(
+            [camera_config['k1'], camera_config['k2'], camera_config['p1'], camera_config['p2'], camera_config['k3']]
+        )
+        self.key = hashlib.sha1(
+            repr([float(camera_config[k]) for k in self.CAMERA_KEYS]).encode('utf-8')
+        ).hexdigest()[:12]
+        self.cache_dir = cache_dir
+        self.maps: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray, Tuple[int, int, int, int]]] = {}
+        # Called with width and height when maps of a size that was not in maps are loaded from cache_dir or built
+        self.on_new_maps = None
+
+    def cache_path(self, w, h):
+        return os.path.join(self.cache_dir, f'undistort_maps_{w}x{h}_{self.key}.npz')
+
+    def load_cached(self, w, h):
+        """Loads maps for the given frame size saved for this camera config from cache_dir.
+        Returns:
+            Tuple[np.ndarray, np.ndarray, Tuple[int, int, int, int]]: map1, map2 and crop rectangle, None if not saved
+        """
+        if self.cache_dir is None or not os.path.isfile(self.cache_path(w, h)):
+            return None
+        with np.load(self.cache_path(w, h)) as saved:
+            return saved['map1'], saved['map2'], tuple(int(v) for v in saved['roi'])
+
+    def save_cached(self, w, h, maps):
+        """Saves maps for the given frame size to cache_dir.
+        Maps are written to a unique temporary file that then replaces the cache file, so other processes never load
+        a partly written one.
+        """
+        try:
+            fd, temp_path = tempfile.mkstemp('.npz', dir=self.cache_dir)
+        except OSError as e:
+            print(f'Could not save undistortion maps: {e}')
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, map1=maps[0], map2=maps[1], roi=np.array(maps[2]))
+            os.replace(temp_path, self.cache_path(w, h))
+        except OSError as e:
+            os.remove(temp_path)
+            print(f'Could not save undistortion maps: {e}')
+
+    def build(self, w, h):
+        """Builds fixed-point maps and crop rectangle for the given frame size.
+        Args:
+            w (int): frame width
+            h (int): frame height
+        Returns:
+            Tuple[np.ndarray, np.ndarray, Tuple[int, int, int, int]]: map1, map2 and crop rectangle
+        """
+        new_camera_tx, roi = cv2.getOptimalNewCameraMatrix(self.camera_matrix, self.dist_coeffs, (w, h), 1, (w, h))
+        map1, map2 = cv2.initUndistortRectifyMap(
+            self.camera_matrix, self.dist_coeffs, None, new_camera_tx, (w, h), cv2.CV_16SC2
+        )
+        return map1, map2, tuple(int(v) for v in roi)
+
+    def get_maps(self, w, h):
+        maps = self.maps.get((w, h))
+        if maps is None:
+            maps = self.load_cached(w, h)
+            if maps is None:
+                maps = self.build(w, h)
+                if self.cache_dir is not None:
+                    self.save_cached(w, h, maps)
+            self.maps[(w, h)] = maps
+            if self.on_new_maps is not None:
+                self.on_new_maps(w, h)
+        return maps
+
+    def undistort(self, img, dst=None):
+        """Undistorts and crops the image.
+        Args:
+            img: input frame
+            dst: optional preallocated output buffer of the same shape as img
+        Returns:
+            np.ndarray: undistorted and cropped frame
+        """
+        h, w = img.shape[:2]
+        map1, map2, roi = self.get_maps(w, h)
+        dst = cv2.remap(img, map1, map2, cv2.INTER_LINEAR, dst=dst)
+
+        # Crop the image
+        x, y, w, h = roi
+        return dst[y:y + h, x:x + w]
@@ -2,64 +2,210 @@ import threading
 import time
 import cv2
 
+from sledilnik.classes.StageTimer import StageLaps
+
 
 class VideoStreamer:
-    """Fetches video from camera"""
+    """Fetches video from camera.
+
+    Frames are captured on a separate thread into a small ring of preallocated buffers. Each frame gets a monotonic
+    sequence number and capture timestamp, and read blocks until a frame newer than the last one read arrives.
+    With the latest policy read always returns the newest frame and older unread frames are dropped, with the
+    lossless policy every frame is returned in order and capture waits while the ring is full.
+
+    An optional preprocess callable runs on the capture thread right after decoding, so the reader receives
+    processed frames. It is called as preprocess(frame, dst, timer), where dst is the buffer of the slot from the
+    previous round of the ring (None at first) and timer is a StageLaps that records durations of its stages, and
+    returns the processed frame. Durations of the returned frame are in stage_durations after read.
+    """
 
-    def __init__(self):
+    LATEST = 'latest'
+    LOSSLESS = 'lossless'
+    AUTO = 'auto'
+
+    def __init__(self, buffer_size=4, policy=AUTO, preprocess=None):
         self.ret = None
         self.frame = None
         self.timestamp = None
+        # Monotonic capture time of the returned frame, for measuring delays
+        self.clock = None
+        # Durations of preprocessing stages of the returned frame in seconds, None without preprocess
+        self.stage_durations = None
         self.video = None
         self.running = False
+        self.finished = False
+        self.thread = None
+
+        # Ring needs one buffer for capture, one held by the reader and at least one ready frame
+        self.buffer_size = max(buffer_size, 3)
+        self.policy = policy
+        self.preprocess = preprocess
+        # Decoded frame before preprocessing and durations of its stages, only used by the capture thread
+        self.raw = None
+        self.preprocess_laps = StageLaps()
+        self.buffers = [None] * self.buffer_size
+        self.sequences = [0] * self.buffer_size
+        self.timestamps = [None] * self.buffer_size
+        self.clocks = [None] * self.buffer_size
+        self.durations = [None] * self.buffer_size
+        self.condition = threading.Condition()
+        self.write_slot = -1
+        self.held_slot = None
+        self.last_sequence = 0
+        self.read_sequence = 0
+
+        self.captured = 0
+        self.dropped = 0
+        self.duplicates = 0
         return
 
     def __del__(self):
-        if self.video.isOpened():
+        if self.video is not None and self.video.isOpened():
             self.video.release()
         return
 
     def start(self, src):
-        self.timestamp = time.time()
+        if self.policy == self.AUTO:
+            # Files are read as fast as they are processed, cameras deliver frames at their own rate
+            self.policy = self.LOSSLESS if isinstance(src, str) and not src.isdigit() and '://' not in src \
+                else self.LATEST
+
         # Initialize the video camera stream and read the first frame
         self.video = cv2.VideoCapture(src)
         if not self.video.isOpened():
             # Camera failed
             raise IOError("Couldn't open video file or webcam.")
-        self.ret, self.frame = self.video.read()
-        if not self.ret:
+        if not self.capture():
             self.video.release()
             raise IOError("Couldn't open video frame.")
         self.running = True
 
         # Start the thread to read frames from the video stream
-        t = threading.Thread(target=self.update, args=())
-        t.daemon = True
-        t.start()
+        self.thread = threading.Thread(target=self.update, args=())
+        self.thread.daemon = True
+        self.thread.start()
         return self
 
+    def next_write_slot(self):
+        """Returns the next slot in the ring that is not held by the reader, or None if capture has to wait"""
+        slot = (self.write_slot + 1) % self.buffer_size
+        if slot == self.held_slot:
+            slot = (slot + 1) % self.buffer_size
+        if self.policy == self.LOSSLESS and self.sequences[slot] > self.read_sequence:
+            return None
+        return slot
+
+    def capture(self):
+        """Reads one frame into the ring.
+        Returns:
+            bool: False when the stream ended
+        """
+        with self.condition:
+            slot = self.next_write_slot()
+            while slot is None and self.running:
+                self.condition.wait(0.1)
+                slot = self.next_write_slot()
+            if slot is None:
+                return False
+            # Mark the buffer as invalid while it is being written
+            self.sequences[slot] = 0
+            self.write_slot = slot
+
+        if self.preprocess is None:
+            ret, frame = self.video.read(self.buffers[slot])
+        else:
+            ret, self.raw = self.video.read(self.raw)
+        timestamp = time.time()
+        clock = time.perf_counter()
+        if not ret:
+            return False
+        durations = None
+        if self.preprocess is not None:
+            self.preprocess_laps.start()
+            frame = self.preprocess(self.raw, self.buffers[slot], self.preprocess_laps)
+            durations = self.preprocess_laps.durations
+
+        with self.condition:
+            self.buffers[slot] = frame
+            self.captured += 1
+            self.last_sequence += 1
+            self.sequences[slot] = self.last_sequence
+            self.timestamps[slot] = timestamp
+            self.clocks[slot] = clock
+            self.durations[slot] = durations
+            self.condition.notify_all()
+        return True
+
     def update(self):
         try:
             # Keep looping infinitely until the stream is closed
             while self.running:
-                self.timestamp = time.time()
                 #  Read the next frame from the stream
-                self.ret, self.frame = self.video.read()
+                if not self.capture():
+                    break
         except:
             import traceback
             traceback.print_exc()
-            self.running = False
         finally:
+            with self.condition:
+                self.running = False
+                self.finished = True
+                self.condition.notify_all()
             # If the thread indicator variable is set, stop the thread
             self.video.release()
         return
 
-    def read(self):
-        # Return the frame most recently read
-        return self.frame, self.timestamp
+    def next_read_slot(self):
+        """Returns slot of the frame that read should return next, or None if there is no new frame"""
+        if self.policy == self.LOSSLESS:
+            wanted = self.read_sequence + 1
+            for slot, sequence in enumerate(self.sequences):
+                if sequence == wanted:
+                    return slot
+            return None
+        newest = max(range(self.buffer_size), key=lambda i: self.sequences[i])
+        return newest if self.sequences[newest] > self.read_sequence else None
+
+    def read(self, timeout=None):
+        """Returns the next frame with its capture timestamp.
+        The returned frame is a buffer of the ring and stays valid until the next call to read.
+        Args:
+            timeout (float): seconds to wait for a new frame, None waits until a frame arrives or the stream ends
+        Returns:
+            Tuple[np.ndarray, float]: frame and timestamp, the last frame again if no new frame arrived in time and
+                (None, None) when the stream ended
+        """
+        with self.condition:
+            slot = self.next_read_slot()
+            if slot is None and not self.finished and timeout != 0:
+                self.condition.wait_for(lambda: self.next_read_slot() is not None or self.finished, timeout)
+                slot = self.next_read_slot()
+
+            if slot is None:
+                if self.finished:
+                    self.ret, self.frame, self.timestamp, self.clock = False, None, None, None
+                    self.stage_durations = None
+                else:
+                    self.duplicates += 1
+                return self.frame, self.timestamp
+
+            sequence = self.sequences[slot]
+            self.dropped += sequence - self.read_sequence - 1
+            self.read_sequence = sequence
+            self.held_slot = slot
+            self.ret, self.frame, self.timestamp = True, self.buffers[slot], self.timestamps[slot]
+            self.clock = self.clocks[slot]
+            self.stage_durations = self.durations[slot]
+            # Capture may be waiting for the reader to free a buffer
+            self.condition.notify_all()
+            return self.frame, self.timestamp
 
     def stop(self):
-        self.running = False
-        if self.video.isOpened():
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        if self.video is not None and self.video.isOpened():
             self.video.release()
         return
@@ -59,3 +59,20 @@ def create_guide_text(name):
         'Mark ' + name + ' Field Bottom Right Corner',
         'Mark ' + name + ' Field Bottom Left Corner'
     ]
+
+
+def draw_objects(frame, ids, centers, tops):
+    """Draws tracked objects as an arrow from center to top with the object id"""
+    for object_id, center, top in zip(ids, centers, tops):
+        center = (int(center[0]), int(center[1]))
+        cv2.arrowedLine(frame, center, (int(top[0]), int(top[1])), (0, 255, 0), 2, cv2.LINE_AA, 0, 0.3)
+        cv2.putText(
+            frame,
+            str(object_id),
+            (center[0] + 8, center[1] - 8),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.6,
+            (0, 255, 0),
+            2,
+            cv2.LINE_AA
+        )
@@ -0,0 +1,79 @@
+"""Tests for CalibrationBundle saving and loading"""
+import multiprocessing
+import os
+
+import numpy as np
+import yaml
+
+from sledilnik.Tracker import Tracker
+from sledilnik.classes.CalibrationBundle import CalibrationBundle
+from sledilnik.classes.Field import Field
+from sledilnik.classes.Point import Point
+
+
+def create_bundle(seed):
+    rng = np.random.default_rng(seed)
+    map1 = rng.integers(0, 64, (48, 64, 2)).astype(np.int16)
+    maps = {(64, 48): (map1, np.zeros((48, 64), np.uint16), (0, 0, 64, 48))}
+    fields = {'field': Field(Point(0, 0), Point(10, 0), Point(10, 10), Point(0, 10))}
+    return CalibrationBundle(np.eye(3), [(0, 0), (10, 0), (10, 10), (0, 10)], fields, 'key', maps)
+
+
+def save_repeatedly(path, seed, times=20):
+    bundle = create_bundle(seed)
+    for _ in range(times):
+        bundle.save(path)
+    return seed
+
+
+def saves_new_maps(config_path):
+    tracker = Tracker(config_path, None)
+    tracker.load_fields()
+    return tracker.undistorter.on_new_maps is not None
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / 'fields.npz')
+    bundle = create_bundle(0)
+    bundle.save(path)
+
+    loaded = CalibrationBundle.load(path)
+
+    assert np.array_equal(loaded.transformation_matrix, bundle.transformation_matrix)
+    assert loaded.fields_corners == [[0, 0], [10, 0], [10, 10], [0, 10]]
+    assert loaded.fields['field'].to_tuple() == bundle.fields['field'].to_tuple()
+    assert loaded.undistort_key == 'key'
+    map1, map2, roi = loaded.undistort_maps[(64, 48)]
+    assert np.array_equal(map1, bundle.undistort_maps[(64, 48)][0]) and roi == (0, 0, 64, 48)
+
+
+def test_save_from_several_processes_at_once(tmp_path):
+    path = str(tmp_path / 'fields.npz')
+    # Bundle mapped by this process while others replace the file
+    create_bundle(0).save(path)
+    mapped = CalibrationBundle.load(path).undistort_maps[(64, 48)][0]
+
+    with multiprocessing.Pool(4) as pool:
+        seeds = pool.starmap(save_repeatedly, [(path, seed) for seed in range(8)])
+
+    assert sorted(seeds) == list(range(8))
+    assert os.listdir(tmp_path) == ['fields.npz']
+    loaded = CalibrationBundle.load(path).undistort_maps[(64, 48)][0]
+    assert any(np.array_equal(loaded, create_bundle(seed).undistort_maps[(64, 48)][0]) for seed in range(8))
+    assert np.array_equal(mapped, create_bundle(0).undistort_maps[(64, 48)][0])
+
+
+def test_only_main_process_saves_new_maps(tmp_path):
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tracker_config.yaml')
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config['undistort'] = True
+    config['fields_path'] = str(tmp_path / 'fields.npz')
+    config_path = str(tmp_path / 'tracker_config.yaml')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f)
+    create_bundle(0).save(config['fields_path'])
+
+    with multiprocessing.Pool(1) as pool:
+        assert not pool.apply(saves_new_maps, (config_path,))
+    assert saves_new_maps(config_path)
@@ -0,0 +1,65 @@
+"""Tests for DetectionGate"""
+import os
+
+import numpy as np
+import yaml
+
+from sledilnik.classes.DetectionGate import DetectionGate
+from sledilnik.classes.KalmanFilterBank import KalmanFilterBank
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tracker_config.yaml')
+
+
+def create_gate_and_bank(objects, frame_counter):
+    """Bank with objects given as {id: (x, y, frames since last seen)}"""
+    with open(CONFIG, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    gate = DetectionGate(config['pos_limit_x'], config['pos_limit_y'], **config['detection_gate'])
+    bank = KalmanFilterBank(config['kalman_filter'])
+    for object_id, (x, y, lost) in objects.items():
+        slot = bank.add(object_id, (x, y, x + 20, y))
+        bank.last_seen[slot] = frame_counter - lost
+    return gate, bank
+
+
+def detections(rows):
+    """Ids and positions of detections given as (id, x, y)"""
+    ids = np.array([row[0] for row in rows], np.int64)
+    positions = np.array([(x, y, x + 20, y) for _, x, y in rows], float).reshape(-1, 4)
+    return ids, positions
+
+
+def test_jump_larger_than_max_speed_is_rejected():
+    gate, bank = create_gate_and_bank({1: (1000, 500, 1), 2: (2000, 500, 1), 3: (3000, 500, 3)}, 10)
+    # Object 1 moves within max_speed, 2 jumps by 400, 3 was not seen for 3 frames and may move 3 * max_speed
+    ids, positions = detections([(1, 1100, 500), (2, 2400, 500), (3, 3400, 500)])
+
+    kept_ids, kept_positions, index = gate.filter(ids, positions, bank, bank.active_slots(), 10)
+
+    assert kept_ids.tolist() == [1, 3]
+    assert kept_positions[:, 0].tolist() == [1100, 3400]
+    assert bank.ids[bank.active_slots()[index]].tolist() == [1, 3]
+    assert gate.rejected == 1
+
+
+def test_only_closest_detection_of_each_id_is_kept():
+    gate, bank = create_gate_and_bank({1: (1000, 500, 1)}, 10)
+    # Id 1 is tracked, so its closest detection is kept, id 5 is new, so its first detection is kept
+    ids, positions = detections([(1, 1060, 500), (5, 300, 300), (1, 1010, 500), (5, 200, 200), (1, 1030, 500)])
+
+    kept_ids, kept_positions, index = gate.filter(ids, positions, bank, bank.active_slots(), 10)
+
+    assert kept_ids.tolist() == [5, 1]
+    assert kept_positions[:, 0].tolist() == [300, 1010]
+    assert index.tolist() == [-1, 0]
+    assert gate.duplicates == 3 and gate.rejected == 0
+
+
+def test_detections_outside_limits_are_dropped():
+    gate, bank = create_gate_and_bank({}, 10)
+    ids, positions = detections([(1, -100, 500), (2, 1000, 500), (3, 1000, 2500)])
+
+    kept_ids, _, index = gate.filter(ids, positions, bank, bank.active_slots(), 10)
+
+    assert kept_ids.tolist() == [2] and index.tolist() == [-1]
+    assert gate.out_of_limits == 2
@@ -0,0 +1,57 @@
+"""Round-trip tests for the detection log format"""
+import os
+
+import numpy as np
+
+from sledilnik.classes.DetectionLog import DetectionLogReader, DetectionLogWriter
+
+
+def corners_of(count, offset):
+    return tuple(np.arange(8, dtype=np.float32).reshape(1, 4, 2) + offset + 10 * i for i in range(count))
+
+
+def write_log(path, frames):
+    writer = DetectionLogWriter(path, (720, 1280, 3))
+    for frame_index, timestamp, corners, ids in frames:
+        writer.append(frame_index, timestamp, corners, ids)
+    writer.close()
+
+
+def test_write_read_round_trip(tmp_path):
+    path = str(tmp_path / 'match.detlog')
+    frames = [
+        (1, 0.0, corners_of(2, 0.5), np.array([[4], [9]], np.int32)),
+        (2, None, (), None),
+        (3, 0.0667, corners_of(1, 100.25), np.array([[4]], np.int32)),
+    ]
+    write_log(path, frames)
+
+    reader = DetectionLogReader(path)
+
+    assert reader.frame_shape == (720, 1280) and reader.frame().shape == (720, 1280)
+    records = list(reader)
+    assert [(frame_index, timestamp) for frame_index, timestamp, _, _ in records] == [(1, 0.0), (2, None), (3, 0.0667)]
+    for (_, _, corners, ids), (_, _, expected_corners, expected_ids) in zip(records, frames):
+        assert ids.tolist() == ([] if expected_ids is None else expected_ids.reshape(-1).tolist())
+        assert np.array_equal(corners, np.asarray(expected_corners, np.float32).reshape(-1, 4, 2))
+
+
+def test_incomplete_last_record_is_ignored(tmp_path):
+    path = str(tmp_path / 'match.detlog')
+    write_log(path, [(1, 0.0, corners_of(1, 0), np.array([[4]])), (2, 0.033, corners_of(3, 0), np.array([1, 2, 3]))])
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 5)
+
+    records = list(DetectionLogReader(path))
+
+    assert len(records) == 1 and records[0][3].tolist() == [4]
+
+
+def test_restart_starts_new_log(tmp_path):
+    path = str(tmp_path / 'match.detlog')
+    write_log(path, [(1, 0.0, (), None), (2, 0.033, (), None)])
+    write_log(path, [(1, 0.0, (), None)])
+
+    assert sorted(os.listdir(tmp_path)) == ['match.1.detlog', 'match.detlog']
+    assert len(DetectionLogReader(str(tmp_path / 'match.1.detlog'))) == 2
+    assert [record[0] for record in DetectionLogReader(path)] == [1]
@@ -0,0 +1,48 @@
+"""Tests for FramePreprocessor with a region of interest"""
+import os
+
+import cv2
+import numpy as np
+import yaml
+
+from sledilnik.classes.FramePreprocessor import FramePreprocessor
+from sledilnik.classes.Undistorter import Undistorter
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tracker_config.yaml')
+ROI = (100, 50, 400, 300)
+
+
+def frames(count):
+    rng = np.random.default_rng(0)
+    return [rng.integers(1, 255, (600, 800, 3), np.uint8) for _ in range(count)]
+
+
+def check_ring(preprocessor, expected):
+    """Feeds frames through a ring of buffers reused like VideoStreamer does, starting with stale white buffers"""
+    x0, y0, x1, y1 = ROI
+    first, *rest = frames(7)
+    ring = [preprocessor(first, None)]
+    ring += [np.full_like(ring[0], 255), np.full_like(ring[0], 255)]
+    for i, frame in enumerate(rest, 1):
+        slot = i % len(ring)
+        ring[slot] = out = preprocessor(frame, ring[slot])
+        outside = out.copy()
+        outside[y0:y1, x0:x1] = 0
+        assert not outside.any()
+        assert np.array_equal(out[y0:y1, x0:x1], expected(frame)[y0:y1, x0:x1])
+
+
+def test_outside_roi_is_black_in_reused_buffers():
+    check_ring(
+        FramePreprocessor(roi_function=lambda frame: ROI),
+        lambda frame: cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    )
+
+
+def test_outside_roi_is_black_in_reused_buffers_with_undistortion():
+    with open(CONFIG, 'r', encoding='utf-8') as f:
+        undistorter = Undistorter(yaml.safe_load(f)['camera'])
+    check_ring(
+        FramePreprocessor(undistorter, lambda frame: ROI),
+        lambda frame: undistorter.undistort(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    )
@@ -0,0 +1,103 @@
+"""Tests that KalmanFilterBank matches a Kalman filter run for each object on its own"""
+import os
+
+import numpy as np
+import pytest
+import yaml
+
+from sledilnik.classes.KalmanFilterBank import KalmanFilterBank
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tracker_config.yaml')
+
+
+def load_config(steady_state_gain):
+    with open(CONFIG, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)['kalman_filter']
+    config['steady_state_gain'] = steady_state_gain
+    return config
+
+
+class ReferenceFilter:
+    """Filter of a single object, as ObjectTracker computed it before the bank"""
+
+    def __init__(self, position, config):
+        dt = config['dt']
+        self.q = np.array([[position[0]], [position[1]], [0], [0], [0], [0]], float)
+        self.q2 = np.array([[position[2]], [position[3]], [0], [0], [0], [0]], float)
+        self.ez = np.array([[config['measurement_noise_x'], 0], [0, config['measurement_noise_y']]])
+        self.ex = np.array(
+            [
+                [dt ** 5 / 20, 0, dt ** 4 / 8, 0, dt ** 3 / 6, 0],
+                [0, dt ** 5 / 20, 0, dt ** 4 / 8, 0, dt ** 3 / 6],
+                [dt ** 4 / 8, 0, dt ** 3 / 3, 0, dt ** 2 / 2, 0],
+                [0, dt ** 4 / 8, 0, dt ** 3 / 3, 0, dt ** 2 / 2],
+                [dt ** 3 / 6, 0, dt ** 2 / 2, 0, dt, 0],
+                [0, dt ** 3 / 6, 0, dt ** 2 / 2, 0, dt]
+            ]
+        ) * config['acc_noise_mag'] ** 2 / 3
+        self.p = self.ex
+        self.a = np.array(
+            [
+                [1, 0, dt, 0, dt ** 2 / 2, 0],
+                [0, 1, 0, dt, 0, dt ** 2 / 2],
+                [0, 0, 1, 0, dt, 0],
+                [0, 0, 0, 1, 0, dt],
+                [0, 0, 0, 0, 1, 0],
+                [0, 0, 0, 0, 0, 1]
+            ]
+        )
+        self.c = np.eye(2, 6)
+        self.bounding_box = tuple(position)
+
+    def update_state(self, position):
+        self.q = self.a @ self.q
+        self.q2 = self.a @ self.q2
+        self.p = self.a @ self.p @ self.a.T + self.ex
+        k = self.p @ self.c.T @ np.linalg.inv(self.c @ self.p @ self.c.T + self.ez)
+        if position is not None:
+            self.q = self.q + k @ (np.array([[position[0]], [position[1]]]) - self.c @ self.q)
+            self.q2 = self.q2 + k @ (np.array([[position[2]], [position[3]]]) - self.c @ self.q2)
+        self.p = (np.eye(6) - k @ self.c) @ self.p
+        if position is None:
+            self.bounding_box = (self.q[0, 0], self.q[1, 0], self.q2[0, 0], self.q2[1, 0])
+        else:
+            self.bounding_box = tuple(position)
+
+
+@pytest.mark.parametrize('steady_state_gain', [True, False])
+def test_bank_matches_per_object_filters(steady_state_gain):
+    config = load_config(steady_state_gain)
+    bank = KalmanFilterBank(config, capacity=2)
+    rng = np.random.default_rng(4)
+    references = {}
+    slots = {}
+
+    for frame in range(300):
+        # Objects appear at different frames, so their filters have different ages, and one is removed
+        if frame % 40 == 0 and frame < 200:
+            object_id = frame // 40
+            position = (500.0 * object_id, 300.0, 500.0 * object_id + 20, 300.0)
+            references[object_id] = ReferenceFilter(position, config)
+            slots[object_id] = bank.add(object_id, position)
+        if frame == 150:
+            bank.remove(slots.pop(1))
+            del references[1]
+
+        ids = sorted(slots)
+        measured = np.array([(frame + object_id) % 7 != 0 for object_id in ids])
+        positions = np.zeros((len(ids), 4))
+        for i, object_id in enumerate(ids):
+            x = 500.0 * object_id + 3.0 * frame + rng.normal(0, 0.5)
+            y = 300.0 + 200 * np.sin(frame / 30) + rng.normal(0, 0.5)
+            positions[i] = (x, y, x + 20, y + rng.normal(0, 0.5))
+            references[object_id].update_state(positions[i] if measured[i] else None)
+        bank.update(np.array([slots[object_id] for object_id in ids]), positions, measured)
+
+        for object_id in ids:
+            reference, slot = references[object_id], slots[object_id]
+            assert np.abs(bank.q[slot] - reference.q).max() < 1e-7
+            assert np.abs(bank.q2[slot] - reference.q2).max() < 1e-7
+            assert np.abs(bank.bounding_box[slot] - reference.bounding_box).max() < 1e-7
+
+    # Gains were taken from the cache once covariances converged
+    assert not steady_state_gain or bank.converged_age is not None
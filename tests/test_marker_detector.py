@@ -0,0 +1,37 @@
+"""Regression tests for MarkerDetector search windows"""
+import os
+
+import cv2.aruco as aruco
+import numpy as np
+import yaml
+
+from sledilnik.classes.MarkerDetector import MarkerDetector
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tracker_config.yaml')
+
+
+def create_detector():
+    with open(CONFIG, 'r', encoding='utf-8') as f:
+        return MarkerDetector(yaml.safe_load(f)['aruco_detector'])
+
+
+def test_detect_windows_skips_windows_clipped_at_frame_edge():
+    frame = np.full((1080, 1920), 255, np.uint8)
+    marker = np.pad(aruco.generateImageMarker(aruco.getPredefinedDictionary(aruco.DICT_4X4_100), 7, 40), 15,
+                    constant_values=255)
+    frame[500:570, 900:970] = marker
+    # Windows of objects predicted beyond the right and bottom edge, zero wide or zero high after clipping
+    windows = [(1920, 400, 1920, 600), (800, 1080, 1000, 1080), (850, 450, 1020, 620)]
+
+    corners, ids = create_detector().detect_windows(frame, windows)
+
+    assert ids is not None and ids.reshape(-1).tolist() == [7]
+    assert np.allclose(np.asarray(corners).reshape(4, 2).mean(axis=0), (934.5, 534.5), atol=1.0)
+
+
+def test_detect_windows_without_valid_windows():
+    frame = np.full((1080, 1920), 255, np.uint8)
+
+    corners, ids = create_detector().detect_windows(frame, [(0, 0, 0, 100), (1920, 1080, 1920, 1080)])
+
+    assert corners == () and ids is None
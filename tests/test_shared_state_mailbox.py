@@ -0,0 +1,86 @@
+"""Round-trip tests for SharedStateMailbox"""
+import multiprocessing
+import os
+
+import yaml
+
+from sledilnik.classes.KalmanFilterBank import KalmanFilterBank
+from sledilnik.classes.SharedStateMailbox import SharedStateMailbox
+from sledilnik.classes.TrackerLiveData import TrackerLiveData
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tracker_config.yaml')
+
+
+def create_live_data(count):
+    with open(CONFIG, 'r', encoding='utf-8') as f:
+        bank = KalmanFilterBank(yaml.safe_load(f)['kalman_filter'])
+    for i in range(count):
+        bank.add(10 + i, (100.0 * i, 50.0, 100.0 * i + 20, 50.0))
+    data = TrackerLiveData({}, bank)
+    data.timestamp = 3.25
+    data.delay = 0.01
+    return data
+
+
+def read_in_child(mailbox):
+    snapshot = mailbox.read(timeout=5)
+    result = (snapshot.seq, snapshot.objects['id'].tolist(), snapshot.timestamp)
+    mailbox.close()
+    return result
+
+
+def test_publish_read_round_trip():
+    mailbox = SharedStateMailbox(capacity=8)
+    try:
+        data = create_live_data(3)
+        mailbox.publish(data)
+
+        snapshot = mailbox.read(timeout=0)
+
+        assert snapshot.seq == 1 and mailbox.published == 1
+        assert snapshot.objects['id'].tolist() == [10, 11, 12]
+        assert snapshot.objects['x'].tolist() == [0.0, 100.0, 200.0]
+        assert snapshot.objects['x_top'].tolist() == [20.0, 120.0, 220.0]
+        assert (snapshot.timestamp, snapshot.delay) == (3.25, 0.01)
+        # Nothing new was published
+        assert mailbox.read(timeout=0.01) is None
+    finally:
+        mailbox.close()
+
+
+def test_reader_counts_overwritten_records_and_capacity_truncates():
+    mailbox = SharedStateMailbox(capacity=2)
+    try:
+        data = create_live_data(3)
+        for _ in range(4):
+            mailbox.publish(data)
+
+        snapshot = mailbox.read()
+
+        assert snapshot.seq == 4 and len(snapshot) == 2
+        assert int(mailbox.header['truncated']) == 1
+        assert mailbox.received == 1 and mailbox.overwritten == 3
+    finally:
+        mailbox.close()
+
+
+def test_reader_waits_while_record_is_written():
+    mailbox = SharedStateMailbox(capacity=4)
+    try:
+        mailbox.publish(create_live_data(1))
+        # Odd sequence counter marks a record that is being written
+        mailbox.header['seq'] = int(mailbox.header['seq']) + 1
+
+        assert mailbox.read(timeout=0.01) is None
+    finally:
+        mailbox.close()
+
+
+def test_read_from_another_process():
+    mailbox = SharedStateMailbox(capacity=4)
+    try:
+        mailbox.publish(create_live_data(2))
+        with multiprocessing.Pool(1) as pool:
+            assert pool.apply(read_in_child, (mailbox,)) == (1, [10, 11], 3.25)
+    finally:
+        mailbox.close()
@@ -0,0 +1,124 @@
+"""Round-trip tests for keyframe and delta encoding of snapshots"""
+import os
+import socket
+import time
+
+import numpy as np
+import yaml
+
+from sledilnik.classes.KalmanFilterBank import KalmanFilterBank
+from sledilnik.classes.SnapshotDelta import DeltaDecoder, DeltaEncoder
+from sledilnik.classes.SnapshotPublisher import KIND_DELTA, KIND_FIELDS, MESSAGE_HEADER, SnapshotPublisher
+from sledilnik.classes.TrackerLiveData import TrackerLiveData
+from sledilnik.classes.TrackerSnapshot import SNAPSHOT_DTYPE, TrackerSnapshot
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tracker_config.yaml')
+
+
+def create_snapshot(seq, positions):
+    """Snapshot with objects given as {id: (x, y)}"""
+    objects = np.zeros(len(positions), SNAPSHOT_DTYPE)
+    objects['id'] = list(positions)
+    objects['x'] = [x for x, _ in positions.values()]
+    objects['y'] = [y for _, y in positions.values()]
+    return TrackerSnapshot(objects, seq / 30, 0.001, seq)
+
+
+def stream():
+    """Frames with small and large moves, a new object and a removed one"""
+    return [
+        create_snapshot(1, {1: (0, 0), 2: (100, 100), 3: (500, 500)}),
+        create_snapshot(2, {1: (0.5, 0), 2: (110, 100), 3: (500, 500)}),
+        create_snapshot(3, {1: (1.2, 0), 2: (120, 100), 3: (500, 500), 7: (900, 10)}),
+        create_snapshot(4, {1: (1.2, 0), 7: (905, 10)}),
+        create_snapshot(5, {1: (40, 0), 7: (905, 10), 2: (0, 2000)}),
+    ]
+
+
+def test_deltas_rebuild_snapshots():
+    encoder = DeltaEncoder(keyframe_interval=0, position_threshold=1.0)
+    decoder = DeltaDecoder()
+    sizes = []
+    for snapshot in stream():
+        message = encoder.encode(snapshot)
+        sizes.append(len(message))
+        decoded = decoder.decode(message)
+
+        assert decoded.seq == snapshot.seq and decoded.timestamp == snapshot.timestamp
+        expected = snapshot.objects[np.argsort(snapshot.objects['id'])]
+        assert decoded.objects['id'].tolist() == expected['id'].tolist()
+        # Objects that moved less than the threshold since they were last sent may lag by up to the threshold
+        assert np.hypot(decoded.objects['x'] - expected['x'], decoded.objects['y'] - expected['y']).max() <= 1.0
+
+    assert decoder.keyframes == 1 and decoder.deltas == 4
+    # Second frame only sends object 2
+    assert sizes[1] == DeltaEncoder.HEADER.size + SNAPSHOT_DTYPE.itemsize
+
+
+def test_decoder_joining_mid_stream_waits_for_keyframe():
+    encoder = DeltaEncoder(keyframe_interval=3)
+    messages = [encoder.encode(snapshot) for snapshot in stream()]
+    decoder = DeltaDecoder()
+
+    # Messages 1 and 2 are deltas, message 3 is the next keyframe
+    assert decoder.decode(messages[1]) is None
+    assert decoder.decode(messages[2]) is None
+    assert decoder.decode(messages[3]).objects['id'].tolist() == [1, 7]
+    assert decoder.decode(messages[4]).objects['id'].tolist() == [1, 2, 7]
+
+
+def test_decoder_that_missed_a_delta_waits_for_keyframe():
+    encoder = DeltaEncoder(keyframe_interval=0)
+    messages = [encoder.encode(snapshot) for snapshot in stream()]
+    decoder = DeltaDecoder()
+    decoder.decode(messages[0])
+
+    assert decoder.decode(messages[2]) is None
+    assert not decoder.synced and decoder.out_of_sync == 1
+
+
+def read_message(connection):
+    header = b''
+    while len(header) < MESSAGE_HEADER.size:
+        header += connection.recv(MESSAGE_HEADER.size - len(header))
+    length, kind = MESSAGE_HEADER.unpack(header)
+    payload = b''
+    while len(payload) < length - 1:
+        payload += connection.recv(length - 1 - len(payload))
+    return kind, payload
+
+
+def test_subscriber_joining_mid_stream_first_gets_keyframe():
+    with open(CONFIG, 'r', encoding='utf-8') as f:
+        bank = KalmanFilterBank(yaml.safe_load(f)['kalman_filter'])
+    slot = bank.add(5, (0.0, 0.0, 10.0, 0.0))
+    data = TrackerLiveData({}, bank)
+    publisher = SnapshotPublisher(port=0, encoder=DeltaEncoder(keyframe_interval=0)).start()
+    try:
+        # Stream is already running before the subscriber connects
+        for i in range(5):
+            bank.bounding_box[slot, 0] = 10.0 * i
+            publisher.publish(data)
+        with socket.create_connection((publisher.host, publisher.port), timeout=5) as connection:
+            deadline = time.monotonic() + 5
+            while not publisher.metrics() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            for i in range(5, 8):
+                bank.bounding_box[slot, 0] = 10.0 * i
+                publisher.publish(data)
+
+            kind, _ = read_message(connection)
+            assert kind == KIND_FIELDS
+            decoder = DeltaDecoder()
+            keyframes = []
+            positions = []
+            for _ in range(3):
+                kind, payload = read_message(connection)
+                assert kind == KIND_DELTA
+                keyframes.append(DeltaEncoder.HEADER.unpack_from(payload)[2])
+                positions.append(float(decoder.decode(payload).objects['x'][0]))
+
+        assert keyframes == [1, 0, 0]
+        assert positions == [50.0, 60.0, 70.0]
+    finally:
+        publisher.close()
@@ -0,0 +1,64 @@
+"""Round-trip tests for the message framing of SnapshotPublisher and SnapshotClient"""
+import os
+import time
+
+import yaml
+
+from sledilnik.classes.KalmanFilterBank import KalmanFilterBank
+from sledilnik.classes.SnapshotClient import SnapshotClient, SyncSnapshotClient, _SubscriberProtocol
+from sledilnik.classes.SnapshotPublisher import KIND_FIELDS, KIND_SNAPSHOT, SnapshotPublisher, encode_message
+from sledilnik.classes.TrackerLiveData import TrackerLiveData
+from sledilnik.classes.TrackerSnapshot import TrackerSnapshot
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tracker_config.yaml')
+
+
+def create_live_data(count):
+    with open(CONFIG, 'r', encoding='utf-8') as f:
+        bank = KalmanFilterBank(yaml.safe_load(f)['kalman_filter'])
+    for i in range(count):
+        bank.add(10 + i, (100.0 * i, 50.0, 100.0 * i + 20, 50.0))
+    data = TrackerLiveData({}, bank)
+    data.timestamp = 3.25
+    return data
+
+
+def test_messages_split_at_every_byte():
+    data = create_live_data(2)
+    first = TrackerSnapshot.from_live_data(data, 1).encode()
+    second = TrackerSnapshot.from_live_data(data, 2).encode()
+    stream = (encode_message(KIND_FIELDS, b'{"a": 1}') + encode_message(KIND_SNAPSHOT, first)
+              + encode_message(KIND_SNAPSHOT, second))
+    client = SnapshotClient()
+    protocol = _SubscriberProtocol(client)
+
+    for i in range(len(stream)):
+        protocol.data_received(stream[i:i + 1])
+
+    assert client.fields == {'a': 1}
+    assert client.latest == second and client.received == 2 and client.skipped == 1
+    assert len(protocol.buffer) == 0
+
+
+def test_publish_to_client_round_trip():
+    data = create_live_data(3)
+    publisher = SnapshotPublisher(port=0).start()
+    client = None
+    try:
+        client = SyncSnapshotClient(port=publisher.port)
+        deadline = time.monotonic() + 5
+        while not publisher.metrics() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        publisher.publish(data)
+
+        snapshot = client.read(timeout=5)
+
+        expected = TrackerSnapshot.from_live_data(data, 1)
+        assert snapshot.seq == 1 and snapshot.timestamp == 3.25
+        assert snapshot.objects.tobytes() == expected.objects.tobytes()
+        assert client.fields == data.fields_to_json()
+        assert publisher.metrics()[0]['sent'] == 1
+    finally:
+        if client is not None:
+            client.close()
+        publisher.close()
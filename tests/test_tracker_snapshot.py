@@ -0,0 +1,52 @@
+"""Round-trip tests for the TrackerSnapshot binary codec"""
+import numpy as np
+import pytest
+
+from sledilnik.classes.TrackerSnapshot import SNAPSHOT_DTYPE, TrackerSnapshot
+
+
+def create_snapshot(count, timestamp=12.5, delay=0.004, seq=7):
+    objects = np.zeros(count, SNAPSHOT_DTYPE)
+    objects['id'] = np.arange(count) + 3
+    objects['x'] = np.linspace(0, 3000, count)
+    objects['y'] = np.linspace(2000, 0, count)
+    objects['x_top'] = objects['x'] + 20
+    objects['y_top'] = objects['y']
+    objects['dir'] = np.linspace(-np.pi, np.pi, count)
+    objects['vx'] = 1.5
+    objects['lost_frames'] = np.arange(count) % 3
+    objects['timestamp'] = timestamp if timestamp is not None else np.nan
+    objects['fields'] = np.arange(count) % 4
+    return TrackerSnapshot(objects, timestamp, delay, seq)
+
+
+def test_encode_decode_round_trip():
+    snapshot = create_snapshot(5)
+
+    decoded = TrackerSnapshot.decode(snapshot.encode())
+
+    assert decoded.objects.tobytes() == snapshot.objects.tobytes()
+    assert (decoded.timestamp, decoded.delay, decoded.seq) == (12.5, 0.004, 7)
+    assert decoded.to_json({'a': {}, 'b': {}}) == snapshot.to_json({'a': {}, 'b': {}})
+
+
+def test_missing_timestamp_and_empty_snapshot():
+    decoded = TrackerSnapshot.decode(create_snapshot(0, timestamp=None, delay=None).encode())
+
+    assert len(decoded) == 0
+    assert decoded.timestamp is None and decoded.delay is None
+
+
+def test_decoded_rows_are_read_only_views():
+    decoded = TrackerSnapshot.decode(create_snapshot(2).encode())
+
+    with pytest.raises(ValueError):
+        decoded.objects['x'][0] = 1
+
+
+def test_decode_rejects_other_data():
+    encoded = bytearray(create_snapshot(1).encode())
+    encoded[:4] = b'XXXX'
+
+    with pytest.raises(ValueError):
+        TrackerSnapshot.decode(bytes(encoded))
@@ -0,0 +1,43 @@
+"""Tests for TrajectoryWriter"""
+import os
+
+import numpy as np
+
+from sledilnik.classes.TrackerSnapshot import SNAPSHOT_DTYPE, TrackerSnapshot
+from sledilnik.classes.TrajectoryWriter import TRAJECTORY_DTYPE, TrajectoryWriter
+
+
+def snapshot(frame_index, count):
+    objects = np.zeros(count, SNAPSHOT_DTYPE)
+    objects['id'] = np.arange(count)
+    objects['x'] = frame_index * 10 + np.arange(count)
+    return TrackerSnapshot(objects, float(frame_index))
+
+
+def test_full_chunks_are_streamed_to_part_file(tmp_path):
+    path = str(tmp_path / 'match.npz')
+    writer = TrajectoryWriter(path, chunk_size=4, metadata={'fps': 30.0})
+    for frame_index in range(3):
+        writer.append(frame_index, snapshot(frame_index, 3))
+
+    # 9 rows, two full chunks are on disk before close
+    part = np.fromfile(path + '.part', TRAJECTORY_DTYPE)
+    assert len(part) == 8
+    assert part['frame'].tolist() == [0, 0, 0, 1, 1, 1, 2, 2]
+
+    writer.close()
+    assert os.listdir(tmp_path) == ['match.npz']
+    with np.load(path) as saved:
+        assert saved['frame'].tolist() == [0, 0, 0, 1, 1, 1, 2, 2, 2]
+        assert saved['x'].tolist() == [0, 1, 2, 10, 11, 12, 20, 21, 22]
+        assert int(saved['frames']) == 3 and float(saved['fps']) == 30.0
+
+
+def test_close_without_rows(tmp_path):
+    path = str(tmp_path / 'empty.npz')
+    writer = TrajectoryWriter(path)
+    writer.append(0, snapshot(0, 0))
+    writer.close()
+
+    with np.load(path) as saved:
+        assert len(saved['id']) == 0 and int(saved['frames']) == 1
@@ -0,0 +1,41 @@
+"""Tests for Undistorter map caching"""
+import multiprocessing
+import os
+
+import numpy as np
+import yaml
+
+from sledilnik.classes.Undistorter import Undistorter
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tracker_config.yaml')
+
+
+def camera_config():
+    with open(CONFIG, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)['camera']
+
+
+def get_maps_repeatedly(cache_dir, times=10):
+    """Builds or loads maps with a new undistorter each time, like processes starting at the same time"""
+    for _ in range(times):
+        map1, _, _ = Undistorter(camera_config(), cache_dir).get_maps(320, 240)
+    return map1.shape
+
+
+def test_cached_maps_match_built_maps(tmp_path):
+    built = Undistorter(camera_config(), str(tmp_path)).get_maps(320, 240)
+    loaded = Undistorter(camera_config(), str(tmp_path)).load_cached(320, 240)
+
+    assert loaded is not None
+    assert np.array_equal(built[0], loaded[0]) and np.array_equal(built[1], loaded[1]) and built[2] == loaded[2]
+
+
+def test_processes_never_load_partly_written_cache(tmp_path):
+    cache_dir = str(tmp_path)
+    undistorter = Undistorter(camera_config(), cache_dir)
+
+    with multiprocessing.Pool(4) as pool:
+        shapes = pool.map(get_maps_repeatedly, [cache_dir] * 8)
+
+    assert shapes == [(240, 320, 2)] * 8
+    assert os.listdir(cache_dir) == [os.path.basename(undistorter.cache_path(320, 240))]